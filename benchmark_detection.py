@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Detection Profile Benchmark
+
+Compares the DETECTION_PROFILES payloads (see detection_pipeline.py) on
+synthetic desktop screenshots with known element positions.
+
+Offline (default, no API key or display needed) it measures per profile:
+- prep time: grid rendering + JPEG encoding of the payload
+- upload size and estimated upload time at --uplink-mbps
+- grid resolution: screen pixels per fine grid cell
+- localization: whether each element can still be found in the image that
+  is actually sent (template match on the decoded JPEG, mapped back to
+  screen coordinates), i.e. whether the payload keeps enough detail
+
+With --live every element is also sent to Gemini and the answer is scored
+against the element's box (hit rate and model latency).
+
+Usage:
+    uv run python benchmark_detection.py
+    uv run python benchmark_detection.py --size 1920x1080 --screens 5
+    uv run python benchmark_detection.py --live --profiles minimal balanced
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from detection_pipeline import (
+    DETECTION_PROFILES, render_detection_images, detection_prompt, parse_coordinates,
+)
+
+BUTTON_LABELS = [
+    "Submit", "Cancel", "Save", "Open", "Search", "Settings", "Export", "Delete",
+    "Next", "Back", "Login", "Sign up", "Download", "Share", "Refresh", "Close",
+]
+BUTTON_COLORS = [
+    (215, 120, 40), (60, 160, 60), (50, 50, 200), (150, 150, 150),
+    (180, 90, 160), (40, 170, 200), (90, 90, 90), (200, 200, 60),
+]
+
+
+def synthetic_screen(seed, width=2560, height=1440, buttons=8):
+    """
+    Draw a desktop-like screenshot with windows, text and labelled buttons.
+
+    Args:
+        seed: Random seed (same seed, same screen)
+        width, height: Screenshot size in pixels
+        buttons: Number of labelled buttons to place
+
+    Returns:
+        (img, elements): BGR image and a list of
+        {"name": str, "box": (x0, y0, x1, y1)} ground-truth elements
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), (110, 80, 50), dtype=np.uint8)
+
+    # Menu bar and a dock
+    cv2.rectangle(img, (0, 0), (width, 28), (235, 235, 235), -1)
+    for i, word in enumerate(["File", "Edit", "View", "Window", "Help"]):
+        cv2.putText(img, word, (20 + i * 80, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (30, 30, 30), 1, cv2.LINE_AA)
+    cv2.rectangle(img, (width // 2 - 400, height - 70), (width // 2 + 400, height - 8), (200, 200, 200), -1)
+    for i in range(12):
+        cx = width // 2 - 360 + i * 65
+        cv2.circle(img, (cx, height - 39), 24, tuple(int(c) for c in rng.integers(40, 230, 3)), -1)
+
+    # A few overlapping windows full of text lines
+    for _ in range(4):
+        w = int(rng.integers(width // 4, width // 2))
+        h = int(rng.integers(height // 4, height // 2))
+        x = int(rng.integers(0, width - w))
+        y = int(rng.integers(40, height - h - 80))
+        cv2.rectangle(img, (x, y), (x + w, y + h), (248, 248, 248), -1)
+        cv2.rectangle(img, (x, y), (x + w, y + 30), (220, 220, 220), -1)
+        cv2.rectangle(img, (x, y), (x + w, y + h), (160, 160, 160), 1)
+        for row in range(y + 50, y + h - 10, 22):
+            words = " ".join(
+                "".join(chr(int(c)) for c in rng.integers(97, 123, int(rng.integers(2, 9))))
+                for _ in range(int(rng.integers(3, 10)))
+            )
+            cv2.putText(img, words, (x + 12, row), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (60, 60, 60), 1, cv2.LINE_AA)
+
+    # Labelled buttons on top, not overlapping each other
+    elements = []
+    labels = rng.permutation(BUTTON_LABELS)[:buttons]
+    attempts = 0
+    while len(elements) < len(labels) and attempts < 500:
+        attempts += 1
+        label = str(labels[len(elements)])
+        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+        bw, bh = tw + 32, th + 20
+        x0 = int(rng.integers(10, width - bw - 10))
+        y0 = int(rng.integers(40, height - bh - 80))
+        box = (x0, y0, x0 + bw, y0 + bh)
+        if any(not (box[2] + 10 < e["box"][0] or e["box"][2] + 10 < box[0] or
+                    box[3] + 10 < e["box"][1] or e["box"][3] + 10 < box[1]) for e in elements):
+            continue
+        color = BUTTON_COLORS[len(elements) % len(BUTTON_COLORS)]
+        cv2.rectangle(img, (box[0], box[1]), (box[2], box[3]), color, -1)
+        cv2.putText(img, label, (x0 + 16, y0 + th + 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                    (255, 255, 255), 1, cv2.LINE_AA)
+        elements.append({"name": f"{label} button", "box": box})
+
+    return img, elements
+
+
+def locate_in_payload(img, payload, box):
+    """
+    Find a ground-truth element in the image that is actually uploaded.
+
+    The element's pixels are cut from the native screenshot, scaled like the
+    payload, and template-matched against the decoded fine-grid JPEG. Every
+    profile sends a fine-grid image and the model is told to read
+    coordinates off it, so all profiles are compared on the same kind of
+    image. The best match is mapped back to screen coordinates.
+
+    Returns:
+        (x, y) screen coordinates of the matched element center
+    """
+    scale = payload["scale"]
+    _, _, data = payload["images"][payload["kinds"].index("fine_grid")]
+    sent = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+    x0, y0, x1, y1 = box
+    patch = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+    if scale != 1.0:
+        patch = cv2.resize(patch, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    scores = cv2.matchTemplate(sent, patch, cv2.TM_CCOEFF_NORMED)
+    _, _, _, (mx, my) = cv2.minMaxLoc(scores)
+    ph, pw = patch.shape[:2]
+    return int(round((mx + pw / 2) / scale)), int(round((my + ph / 2) / scale))
+
+
+def inside(x, y, box):
+    return box[0] <= x <= box[2] and box[1] <= y <= box[3]
+
+
+def ask_gemini(client, model, payload, name, fine_step):
+    """Send one detection request; returns ((x, y) in screen pixels or None, latency seconds)."""
+    from google.genai import types
+
+    contents = [types.Part.from_bytes(data=data, mime_type="image/jpeg") for _, _, data in payload["images"]]
+    contents.append(types.Part.from_text(text=detection_prompt(name, payload, fine_step)))
+
+    start = time.perf_counter()
+    response = client.models.generate_content(model=model, contents=contents)
+    latency = time.perf_counter() - start
+
+    coordinates = parse_coordinates(response.text or "")
+    if coordinates is None:
+        return None, latency
+    x, y = coordinates
+    return (int(round(x / payload["scale"])), int(round(y / payload["scale"]))), latency
+
+
+def benchmark_profile(name, screens, args, client=None):
+    """Run every screen/element through one profile and aggregate the metrics."""
+    profile = DETECTION_PROFILES[name]
+    prep_times, upload_bytes = [], []
+    local_hits = local_total = 0
+    local_errors = []
+    live_hits = live_total = 0
+    live_latencies = []
+
+    for img, elements in screens:
+        # Warm the grid cache once, then time the steady state
+        render_detection_images(img, profile)
+        runs = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            payload = render_detection_images(img, profile)
+            runs.append(time.perf_counter() - start)
+        prep_times.append(statistics.median(runs))
+        upload_bytes.append(sum(len(data) for _, _, data in payload["images"]))
+
+        for element in elements:
+            box = element["box"]
+            cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+            x, y = locate_in_payload(img, payload, box)
+            local_total += 1
+            local_hits += inside(x, y, box)
+            local_errors.append(((x - cx) ** 2 + (y - cy) ** 2) ** 0.5)
+
+            if client is not None:
+                answer, latency = ask_gemini(client, args.model, payload, element["name"], profile["fine_step"])
+                live_total += 1
+                live_latencies.append(latency)
+                if answer is not None and inside(answer[0], answer[1], box):
+                    live_hits += 1
+
+    mean_bytes = statistics.mean(upload_bytes)
+    result = {
+        "profile": name,
+        "images": len(profile["images"]),
+        "prep_ms": statistics.median(prep_times) * 1000,
+        "upload_kb": mean_bytes / 1024,
+        "upload_ms": mean_bytes * 8 / (args.uplink_mbps * 1e6) * 1000,
+        "grid_px": profile["fine_step"] / payload["scale"],
+        "local_hit": local_hits / local_total if local_total else 0.0,
+        "local_err_px": statistics.median(local_errors) if local_errors else 0.0,
+    }
+    if client is not None:
+        result["model_hit"] = live_hits / live_total if live_total else 0.0
+        result["model_ms"] = statistics.median(live_latencies) * 1000 if live_latencies else 0.0
+    return result
+
+
+def print_table(results):
+    columns = [
+        ("profile", "{:<13}"), ("images", "{:>6}"), ("prep_ms", "{:>8.1f}"), ("upload_kb", "{:>10.0f}"),
+        ("upload_ms", "{:>10.0f}"), ("grid_px", "{:>8.1f}"), ("local_hit", "{:>10.0%}"),
+        ("local_err_px", "{:>13.1f}"), ("model_hit", "{:>10.0%}"), ("model_ms", "{:>9.0f}"),
+    ]
+    columns = [(key, fmt) for key, fmt in columns if key in results[0]]
+    widths = [len(fmt.format(results[0][key])) for key, fmt in columns]
+    print("  ".join(key.rjust(w) if i else key.ljust(w) for i, ((key, _), w) in enumerate(zip(columns, widths))))
+    for result in results:
+        print("  ".join(fmt.format(result[key]) for key, fmt in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detection profiles")
+    parser.add_argument("--profiles", nargs="+", default=list(DETECTION_PROFILES),
+                        choices=list(DETECTION_PROFILES))
+    parser.add_argument("--size", default="2560x1440", help="synthetic screen size, WIDTHxHEIGHT")
+    parser.add_argument("--screens", type=int, default=3, help="number of synthetic screens")
+    parser.add_argument("--repeat", type=int, default=5, help="timed payload builds per screen")
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="uplink bandwidth for upload_ms")
+    parser.add_argument("--live", action="store_true", help="also query Gemini (needs GOOGLE_API_KEY)")
+    parser.add_argument("--model", default="models/gemini-2.5-pro", help="model for --live")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    screens = [synthetic_screen(seed, width, height) for seed in range(args.screens)]
+
+    client = None
+    if args.live:
+        from dotenv import load_dotenv
+        from google import genai
+        load_dotenv()
+        if not os.getenv("GOOGLE_API_KEY"):
+            print("❌ --live needs GOOGLE_API_KEY")
+            return 1
+        client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+
+    print(f"📊 {args.screens} synthetic {width}x{height} screens, "
+          f"{sum(len(e) for _, e in screens)} elements, uplink {args.uplink_mbps:g} Mbit/s\n")
+    results = [benchmark_profile(name, screens, args, client) for name in args.profiles]
+    print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
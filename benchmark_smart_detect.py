@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Offline Benchmark for smart_detect_screen_coordinates
+
+Runs the detection path that ships over a corpus of saved screenshots with
+ground-truth element boxes: main_file._prepare_detection_request (detection
+cache, template fast path, grid rendering, encoding),
+_generate_detection_sync (including the hedging race) and
+_advance_detection (stage driver, result mapping). Only two things are
+swapped out:
+
+- the screen grab: each screenshot is handed in as a CapturedFrame with a
+  matching one-monitor ScreenLayout, so capture time is not measured
+- the Gemini client: a ReplayClient registered in main_file.genai_clients
+  answers from benchmarks/recorded_responses.json and sleeps for the
+  recorded latency. Record the answers once with --record (needs
+  GOOGLE_API_KEY).
+
+Stages without a recording are answered by an oracle that returns the
+ground-truth center in the coordinates of the image it was shown. Oracle
+answers check the pipeline itself (scaling, cropping, mapping back) and say
+nothing about model accuracy: such elements are left out of hit_rate (n/a
+when nothing was recorded), and any oracle answer makes the run exit 1
+unless --allow-oracle is given.
+
+With --hedge every mode/profile also gets a "+hedge" row run with
+DETECTION_HEDGING on, so the fast model's graded answers race the slow
+model exactly as in main_file. Compare its hit_rate and model_ms with the
+unhedged row to judge the acceptance threshold (--min-confidence).
+
+Importing main_file needs its dependencies (pyaudio, pynput, pyautogui,
+google-genai) and a display session for the input libraries.
+
+Reported per mode/profile (medians per element):
+- local: fast-path lookups and request assembly; grid and encode time
+- upload (payload size at --uplink-mbps), model (wall time of the model
+  calls) and parse time
+- upload size, model calls and hit rate (answer inside the element box)
+- pipeline: share of oracle-answered elements mapped back inside their box
+- fast_wins: share of hedged stages settled by the fast model
+- repeat_ms / repeat_local: an immediate second detection of the same
+  element, and the share answered by the detection cache or template store
+
+Usage:
+    uv run python benchmark_smart_detect.py --record              # fill recordings from Gemini
+    uv run python benchmark_smart_detect.py --modes full roi --profiles balanced max_accuracy
+    uv run python benchmark_smart_detect.py --min-hit-rate 0.9    # exit 1 below this hit rate
+    uv run python benchmark_smart_detect.py --allow-oracle         # pipeline check without recordings
+    uv run python benchmark_smart_detect.py --hedge --record      # fast model + confidence gate
+    uv run python benchmark_smart_detect.py --generate-corpus     # rebuild the synthetic corpus
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import cv2
+
+from detection_pipeline import DETECTION_PROFILE, DETECTION_PROFILES, HEDGE_MIN_CONFIDENCE, in_request_image
+
+BENCHMARK_DIR = Path(__file__).parent / "benchmarks"
+CORPUS_DIR = BENCHMARK_DIR / "corpus"
+GROUND_TRUTH_FILE = CORPUS_DIR / "ground_truth.json"
+RECORDINGS_FILE = BENCHMARK_DIR / "recorded_responses.json"
+
+# Synthetic corpus written by --generate-corpus: (width, height, seed)
+CORPUS_SCREENS = [(2560, 1440, 0), (2560, 1440, 1), (1920, 1080, 2), (1440, 900, 3)]
+
+STAGES = ["local", "grid", "encode", "upload", "model", "parse"]
+
+# Placeholder key for replay runs: main_file refuses to detect without one,
+# but no request ever leaves the ReplayClient
+OFFLINE_API_KEY = "offline-benchmark"
+
+
+def generate_corpus():
+    """Write the synthetic screenshots and their ground truth to benchmarks/corpus."""
+    from benchmark_detection import synthetic_screen
+
+    CORPUS_DIR.mkdir(parents=True, exist_ok=True)
+    screens = []
+    for width, height, seed in CORPUS_SCREENS:
+        img, elements = synthetic_screen(seed, width, height)
+        name = f"synthetic_{width}x{height}_{seed}.png"
+        cv2.imwrite(str(CORPUS_DIR / name), img, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+        screens.append({"file": name, "elements": [
+            {"name": e["name"], "box": list(e["box"])} for e in elements
+        ]})
+    GROUND_TRUTH_FILE.write_text(json.dumps({"screens": screens}, indent=2) + "\n")
+    print(f"✅ Wrote {len(screens)} screenshots to {CORPUS_DIR}")
+
+
+def load_corpus():
+    """
+    Load the ground truth file.
+
+    Real screenshots can be added by dropping a PNG into benchmarks/corpus
+    and listing it with its element boxes ([x0, y0, x1, y1], screen pixels).
+    """
+    if not GROUND_TRUTH_FILE.exists():
+        raise FileNotFoundError(f"{GROUND_TRUTH_FILE} not found, run with --generate-corpus")
+    return json.loads(GROUND_TRUTH_FILE.read_text())["screens"]
+
+
+def recording_key(screen, request, model):
+    stats = request["stats"]
+    return f"{screen}|{request['prompt']}|{stats['mode']}|{stats['profile']}|{request['stage']}|{model}"
+
+
+class ReplayClient:
+    """
+    Stand-in for genai.Client on the sync detection path.
+
+    Registered in main_file.genai_clients, so _generate_detection_sync calls
+    client.models.generate_content() on it like on the real client. The
+    benchmark sets element (screen file, ground-truth box) and request (the
+    stage being answered) before each call. Answers come from the
+    recordings, then from Gemini (--record), then from the oracle.
+    """
+
+    def __init__(self, recordings_file=RECORDINGS_FILE, live_client=None):
+        self.recordings_file = Path(recordings_file)
+        self.recordings = {}
+        if self.recordings_file.exists():
+            self.recordings = json.loads(self.recordings_file.read_text())
+        self.live_client = live_client
+        self.models = self
+        self.element = None
+        self.request = None
+        self.sources = set()
+        self.replayed = 0
+        self.oracle = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents):
+        screen, box = self.element
+        request = self.request
+        key = recording_key(screen, request, model)
+        entry = self.recordings.get(key)
+        if entry is not None:
+            source, answer = "replay", entry["text"]
+            time.sleep(entry["latency_ms"] / 1000)
+        elif self.live_client is not None:
+            source = "live"
+            start = time.perf_counter()
+            response = self.live_client.models.generate_content(model=model, contents=contents)
+            answer = (response.text or "").strip()
+            with self._lock:
+                self.recordings[key] = {"text": answer, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+        else:
+            source, answer = "oracle", self._oracle_answer(request, box, contents[-1].text)
+
+        with self._lock:
+            self.sources.add(source)
+            self.replayed += source == "replay"
+            self.recorded += source == "live"
+            self.oracle += source == "oracle"
+        return SimpleNamespace(text=answer, usage_metadata=None)
+
+    @staticmethod
+    def _oracle_answer(request, box, text):
+        left, top = request["offset"]
+        cx = ((box[0] + box[2]) / 2 - left) * request["scale"]
+        cy = ((box[1] + box[3]) / 2 - top) * request["scale"]
+        if not in_request_image(request, cx, cy):
+            return "I cannot find that element in this image."
+        answer = f"x={int(round(cx))}, y={int(round(cy))}"
+        return answer + ", confidence=100" if "confidence=NUMBER" in text else answer
+
+    def save(self):
+        if self.recorded:
+            self.recordings_file.parent.mkdir(parents=True, exist_ok=True)
+            self.recordings_file.write_text(json.dumps(self.recordings, indent=2, sort_keys=True) + "\n")
+
+
+def corpus_frame(mf, img):
+    """Wrap a corpus screenshot as a primary-monitor capture with a 1:1 layout."""
+    height, width = img.shape[:2]
+    bgra = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    bgra.flags.writeable = False
+    monitor = {"left": 0, "top": 0, "width": width, "height": height}
+    frame = mf.CapturedFrame(bgra, monitor, mf.PRIMARY_MONITOR, time.monotonic())
+    layout = mf.ScreenLayout((monitor, dict(monitor)), (1.0, 1.0), (width, height), 0)
+    return frame, layout
+
+
+def detect(mf, client, frame, layout, screen, element, mode, profile, uplink_mbps):
+    """
+    Detect one element through main_file's detection path.
+
+    The detection cache and template store are cleared first, so the model
+    is asked; a second detection right after measures the fast path.
+
+    Returns:
+        dict with the result, per-stage timings, upload bytes, model calls,
+        the answer sources used and the stages the fast model won
+    """
+    mf.detection_cache.clear()
+    mf.template_store.clear()
+    client.element = (screen, element["box"])
+    client.sources = set()
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    start = time.perf_counter()
+    result, request = mf._prepare_detection_request(element["name"], frame, layout, profile=profile, mode=mode)
+    prepare_ms = (time.perf_counter() - start) * 1000
+    if request is None:
+        raise RuntimeError(f"Detection of {element['name']!r} returned before the model call: {result}")
+    stats = request["stats"]
+    timings["local"] = prepare_ms - stats["timings"]["grid_ms"] - stats["timings"]["encode_ms"]
+
+    while request is not None:
+        stage_bytes = sum(len(data) for _, _, data in request["images"])
+        timings["upload"] += stage_bytes * 8 / (uplink_mbps * 1e6) * 1000
+        client.request = request
+        start = time.perf_counter()
+        response = mf._generate_detection_sync(request)
+        timings["model"] += (time.perf_counter() - start) * 1000
+
+        # Building the fine stage renders and encodes; those land in grid/encode
+        render_ms = stats["timings"]["grid_ms"] + stats["timings"]["encode_ms"]
+        start = time.perf_counter()
+        result, request = mf._advance_detection(request, response)
+        render_ms = stats["timings"]["grid_ms"] + stats["timings"]["encode_ms"] - render_ms
+        timings["parse"] += (time.perf_counter() - start) * 1000 - render_ms
+
+    timings["grid"] = stats["timings"]["grid_ms"]
+    timings["encode"] = stats["timings"]["encode_ms"]
+
+    start = time.perf_counter()
+    repeat, _ = mf._prepare_detection_request(element["name"], frame, layout, profile=profile, mode=mode)
+    repeat_ms = (time.perf_counter() - start) * 1000
+
+    box = element["box"]
+    # The layout is 1:1, so the global point is the screenshot pixel
+    hit = "x" in result and box[0] <= result["x"] <= box[2] and box[1] <= result["y"] <= box[3]
+    return {
+        "hit": hit,
+        "timings": timings,
+        "upload_bytes": stats["upload_bytes"],
+        "model_calls": stats["model_calls"],
+        "sources": set(client.sources),
+        "fast_wins": stats.get("models", []).count(mf.HEDGE_FAST_MODEL),
+        "repeat_ms": repeat_ms,
+        "repeat_local": repeat is not None and repeat.get("source") in ("cache", "template"),
+    }
+
+
+def run_benchmark(mf, client, corpus, modes, profiles, uplink_mbps, hedge=None):
+    """
+    Benchmark every mode/profile combination over the whole corpus.
+
+    With hedge (model, delay, min_confidence), each combination gets a
+    second row with DETECTION_HEDGING on.
+    """
+    frames = []
+    for screen in corpus:
+        img = cv2.imread(str(CORPUS_DIR / screen["file"]), cv2.IMREAD_COLOR)
+        if img is None:
+            raise FileNotFoundError(f"Cannot read {CORPUS_DIR / screen['file']}")
+        frames.append((screen, *corpus_frame(mf, img)))
+
+    results = []
+    for mode in modes:
+        for profile in profiles:
+            for row_hedge in ([None, hedge] if hedge else [None]):
+                results.append(benchmark_row(mf, client, frames, mode, profile, uplink_mbps, row_hedge))
+    return results
+
+
+def benchmark_row(mf, client, frames, mode, profile, uplink_mbps, hedge):
+    """One result row: every corpus element detected with one mode/profile."""
+    # Same switches as the DETECTION_HEDGING / HEDGE_* environment variables
+    mf.DETECTION_HEDGING = hedge is not None
+    if hedge:
+        mf.HEDGE_FAST_MODEL = hedge["model"]
+        mf.HEDGE_DELAY = hedge["delay"]
+        mf.HEDGE_MIN_CONFIDENCE = hedge["min_confidence"]
+
+    # Warm-up pass so cached grid overlays are not billed to the first element
+    mf.detection_cache.clear()
+    mf.template_store.clear()
+    mf._prepare_detection_request("warm-up", frames[0][1], frames[0][2], profile=profile, mode=mode)
+
+    runs = [
+        detect(mf, client, frame, layout, screen["file"], element, mode, profile, uplink_mbps)
+        for screen, frame, layout in frames
+        for element in screen["elements"]
+    ]
+    row = {"mode": mode + ("+hedge" if hedge else ""), "profile": profile, "elements": len(runs)}
+    for stage in STAGES:
+        row[f"{stage}_ms"] = statistics.median(r["timings"][stage] for r in runs)
+    row["total_ms"] = statistics.median(sum(r["timings"].values()) for r in runs)
+    row["upload_kb"] = statistics.mean(r["upload_bytes"] for r in runs) / 1024
+    row["calls"] = statistics.mean(r["model_calls"] for r in runs)
+    # Hit rate over model answers only; oracle answers only check the pipeline
+    answered = [r for r in runs if "oracle" not in r["sources"]]
+    oracle = [r for r in runs if "oracle" in r["sources"]]
+    row["hit_rate"] = sum(r["hit"] for r in answered) / len(answered) if answered else None
+    row["oracle"] = len(oracle)
+    row["pipeline"] = sum(r["hit"] for r in oracle) / len(oracle) if oracle else None
+    row["fast_wins"] = (sum(r["fast_wins"] for r in runs) / sum(r["model_calls"] for r in runs)
+                        if hedge else None)
+    row["repeat_ms"] = statistics.median(r["repeat_ms"] for r in runs)
+    row["repeat_local"] = sum(r["repeat_local"] for r in runs) / len(runs)
+    return row
+
+
+def print_table(results):
+    columns = ["mode", "profile", "local_ms", "grid_ms", "encode_ms", "upload_ms", "model_ms",
+               "parse_ms", "total_ms", "upload_kb", "calls", "hit_rate", "oracle", "pipeline", "fast_wins",
+               "repeat_ms", "repeat_local"]
+    header = "  ".join(f"{c:>10}" if i > 1 else f"{c:<13}" for i, c in enumerate(columns))
+    print(header)
+    for row in results:
+        cells = []
+        for i, c in enumerate(columns):
+            value = row[c]
+            if i <= 1:
+                cells.append(f"{value:<13}")
+            elif c in ("hit_rate", "pipeline", "fast_wins", "repeat_local"):
+                cells.append(f"{value:>10.0%}" if value is not None else f"{'n/a':>10}")
+            elif c in ("oracle",):
+                cells.append(f"{value:>10d}")
+            elif c == "calls":
+                cells.append(f"{value:>10.1f}")
+            else:
+                cells.append(f"{value:>10.2f}" if value < 100 else f"{value:>10.0f}")
+        print("  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for coordinate detection")
+    parser.add_argument("--modes", nargs="+", default=["full", "roi"], choices=["full", "roi"])
+    parser.add_argument("--profiles", nargs="+", default=[DETECTION_PROFILE], choices=list(DETECTION_PROFILES))
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="uplink bandwidth for upload_ms")
+    parser.add_argument("--responses", default=str(RECORDINGS_FILE), help="recorded responses file")
+    parser.add_argument("--record", action="store_true", help="query Gemini for missing recordings and save them")
+    parser.add_argument("--hedge", action="store_true", help="add hedged rows (fast model with confidence gate)")
+    parser.add_argument("--hedge-model", default="models/gemini-2.5-flash", help="fast model for --hedge")
+    parser.add_argument("--hedge-delay", type=float, default=1.5, help="seconds before the slow model starts")
+    parser.add_argument("--min-confidence", type=int, default=HEDGE_MIN_CONFIDENCE,
+                        help="confidence grade a fast answer needs to win")
+    parser.add_argument("--min-hit-rate", type=float, default=None,
+                        help="exit with status 1 if any row's hit rate is below this")
+    parser.add_argument("--allow-oracle", action="store_true",
+                        help="do not fail on oracle answers (pipeline check only)")
+    parser.add_argument("--generate-corpus", action="store_true", help="rebuild the synthetic corpus and exit")
+    args = parser.parse_args()
+
+    if args.generate_corpus:
+        generate_corpus()
+        return 0
+
+    live_client = None
+    if args.record:
+        from dotenv import load_dotenv
+        from google import genai
+        load_dotenv()
+        if not os.getenv("GOOGLE_API_KEY"):
+            print("❌ --record needs GOOGLE_API_KEY")
+            return 1
+        live_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    else:
+        os.environ["GOOGLE_API_KEY"] = OFFLINE_API_KEY
+
+    import main_file as mf
+
+    # Detection prints its progress; keep the table readable
+    logging.getLogger('VoiceAssistant').setLevel(logging.ERROR)
+    client = ReplayClient(args.responses, live_client=live_client)
+    mf.genai_clients.register(client, os.environ["GOOGLE_API_KEY"])
+
+    corpus = load_corpus()
+    print(f"📊 {len(corpus)} screenshots, {sum(len(s['elements']) for s in corpus)} elements, "
+          f"uplink {args.uplink_mbps:g} Mbit/s\n")
+
+    hedge = None
+    if args.hedge:
+        hedge = {"model": args.hedge_model, "delay": args.hedge_delay, "min_confidence": args.min_confidence}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = run_benchmark(mf, client, corpus, args.modes, args.profiles, args.uplink_mbps, hedge)
+    print_table(results)
+    print(f"\nModel answers: {client.replayed} replayed, {client.recorded} recorded live, {client.oracle} oracle")
+    client.save()
+
+    oracle_elements = sum(r["oracle"] for r in results)
+    if oracle_elements:
+        print(f"\n⚠️  {oracle_elements} of {sum(r['elements'] for r in results)} elements were answered by the "
+              f"ORACLE, not a model: their rows say nothing about model accuracy and are left out of hit_rate.")
+        if not args.allow_oracle:
+            print(f"❌ Missing recordings. Record them with --record (needs GOOGLE_API_KEY) into {args.responses}, "
+                  f"or pass --allow-oracle for a pipeline-only check.")
+            return 1
+    if any(r["pipeline"] is not None and r["pipeline"] < 1 for r in results):
+        print("❌ Oracle answers were not mapped back inside their element box")
+        return 1
+    if args.min_hit_rate is not None:
+        if any(r["hit_rate"] is None for r in results):
+            print("❌ --min-hit-rate needs recorded model answers in every row")
+            return 1
+        if any(r["hit_rate"] < args.min_hit_rate for r in results):
+            print(f"❌ Hit rate below {args.min_hit_rate:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Text Injection Benchmark
+
+Measures end-to-end throughput of the two type_text strategies in
+input_devices.py: per-character typing and clipboard paste.
+
+A small Tk window with a text box is opened and focused. For every text
+length and strategy the text box is cleared, the text is injected from a
+worker thread (as type_text does from tool_executor), and the clock stops
+when the text box holds the full text. Reported per run:
+- chars/sec, from the start of injection until the text has arrived
+- call time: how long the injection call blocks (for paste this includes
+  the settle delay before the clipboard is restored)
+- whether the text arrived intact (synthetic typing can drop characters)
+- for paste, whether the previous clipboard contents were restored
+
+Needs a display plus keyboard-control permission (Accessibility on macOS).
+Keep the benchmark window focused while it runs.
+
+Usage:
+    uv run python benchmark_typing.py
+    uv run python benchmark_typing.py --lengths 16 64 256 1024 --repeat 5
+"""
+
+import argparse
+import queue
+import random
+import statistics
+import sys
+import threading
+import time
+import tkinter as tk
+
+import input_devices
+from input_devices import paste_text, type_characters
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog while voice assistant types "
+    "long paragraphs into forms editors and chat boxes without dropping characters"
+).split()
+ARRIVAL_TIMEOUT = 60.0
+
+
+def sample_text(length, seed):
+    """Deterministic text of exactly `length` characters (words, spaces, punctuation)."""
+    rng = random.Random(seed)
+    text = ""
+    while len(text) < length:
+        text += rng.choice(WORDS) + rng.choice([" ", " ", " ", ", ", ". "])
+    return text[:length]
+
+
+class TypingTarget:
+    """
+    Tk text box the injected keystrokes land in.
+
+    Tk must only be touched from the main thread, so the worker thread asks
+    for a reset through a queue and waits for the text to arrive on an
+    event; the main thread polls the text box.
+    """
+
+    def __init__(self):
+        self.root = tk.Tk()
+        self.root.title("benchmark_typing - keep this window focused")
+        self.text = tk.Text(self.root, width=100, height=30)
+        self.text.pack(fill="both", expand=True)
+        self.requests = queue.Queue()
+        self.expected = None
+        self.final = ""
+        self.arrived_at = None
+        self.arrived = threading.Event()
+        self.ready = threading.Event()
+
+    def reset(self, expected):
+        """Called from the worker: clear and focus the text box, then wait until done."""
+        self.arrived.clear()
+        self.ready.clear()
+        self.requests.put(expected)
+        self.ready.wait()
+
+    def content(self):
+        return self.text.get("1.0", "end-1c")
+
+    def finish(self):
+        """Called from the worker: close the window once every run is done."""
+        self.requests.put(None)
+
+    def poll(self):
+        try:
+            expected = self.requests.get_nowait()
+            if expected is None:
+                self.root.destroy()
+                return
+            self.text.delete("1.0", "end")
+            self.root.focus_force()
+            self.text.focus_set()
+            self.expected = expected
+            self.ready.set()
+        except queue.Empty:
+            pass
+        if self.expected is not None:
+            content = self.content()
+            if len(content) >= len(self.expected):
+                self.arrived_at = time.perf_counter()
+                self.final = content
+                self.expected = None
+                self.arrived.set()
+        self.root.after(2, self.poll)
+
+
+def run_benchmark(target, args, results):
+    time.sleep(1.0)  # let the window come up and take focus
+    inject = {"type": type_characters, "paste": paste_text}
+
+    for length in args.lengths:
+        for strategy in args.strategies:
+            if strategy == "paste" and input_devices.pyperclip is None:
+                continue
+            rates, call_times, intact, restored = [], [], 0, 0
+            for run in range(args.repeat):
+                text = sample_text(length, seed=run)
+                sentinel = f"clipboard-before-{length}-{run}"
+                if strategy == "paste":
+                    input_devices.pyperclip.copy(sentinel)
+
+                target.reset(text)
+                start = time.perf_counter()
+                inject[strategy](text)
+                call_times.append(time.perf_counter() - start)
+                arrived = target.arrived.wait(ARRIVAL_TIMEOUT)
+
+                rates.append(length / (target.arrived_at - start) if arrived else 0.0)
+                intact += arrived and target.final == text
+                if strategy == "paste":
+                    restored += input_devices.pyperclip.paste() == sentinel
+
+            result = {
+                "strategy": strategy,
+                "chars": length,
+                "chars_per_sec": statistics.median(rates),
+                "call_ms": statistics.median(call_times) * 1000,
+                "intact": f"{intact}/{args.repeat}",
+            }
+            if strategy == "paste":
+                result["restored"] = f"{restored}/{args.repeat}"
+            results.append(result)
+            print(f"  {strategy:<6} {length:>6} chars: {result['chars_per_sec']:>8.0f} chars/s, "
+                  f"call {result['call_ms']:.0f} ms, "
+                  f"intact {result['intact']}" + (f", clipboard restored {result['restored']}"
+                                                  if "restored" in result else ""))
+
+    target.finish()
+
+
+def print_table(results):
+    print()
+    print(f"{'strategy':<8}  {'chars':>6}  {'chars/s':>8}  {'call_ms':>8}  {'intact':>6}  {'restored':>8}")
+    for r in results:
+        print(f"{r['strategy']:<8}  {r['chars']:>6}  {r['chars_per_sec']:>8.0f}  {r['call_ms']:>8.0f}  "
+              f"{r['intact']:>6}  {r.get('restored', '-'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark type_text injection strategies")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[16, 64, 256, 1024])
+    parser.add_argument("--strategies", nargs="+", default=["type", "paste"], choices=["type", "paste"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per length and strategy")
+    args = parser.parse_args()
+
+    if input_devices.pyperclip is None and "paste" in args.strategies:
+        print("⚠️ pyperclip is not installed, skipping the paste strategy")
+
+    print(f"📊 Injecting {', '.join(map(str, args.lengths))} chars x {args.repeat} runs "
+          f"(auto pastes from {input_devices.TYPE_PASTE_MIN_CHARS} chars)\n")
+    target = TypingTarget()
+    results = []
+    worker = threading.Thread(target=run_benchmark, args=(target, args, results), daemon=True)
+    target.root.after(0, target.poll)
+    target.root.after(0, worker.start)
+    target.root.mainloop()
+
+    if results:
+        print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
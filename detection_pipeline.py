@@ -0,0 +1,688 @@
+"""
+Screen-image side of coordinate detection.
+
+Everything here depends only on OpenCV and NumPy (no audio, input devices or
+Gemini client), so it can be imported on a headless machine by the
+benchmark scripts as well as by main_file.py:
+
+- encode_jpeg: in-memory JPEG encoding
+- GridOverlayCache: pre-rendered coordinate grid overlays
+- DETECTION_PROFILES: which images, at which resolution and JPEG quality,
+  are sent to the model for a detection request
+- parse_coordinates: reading "x=..., y=..." back out of the model's answer
+- acceptable_detection: whether a hedged fast-model answer (graded with
+  confidence=...) may win over the slow model
+- build_detection_request / build_fine_request / to_screen: the model
+  request stages ("full", or "coarse" then "fine") and the mapping of the
+  answer back to screen pixels
+- advance_detection: the stage driver shared by
+  main_file.py and benchmark_smart_detect.py, turning each model answer
+  into the next request or a final outcome
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger('VoiceAssistant')
+
+
+def encode_jpeg(img, quality=95):
+    """
+    Encode a BGR image to JPEG entirely in memory.
+    
+    Replaces the cv2.imwrite + open().read() round-trip: the encoded buffer
+    goes straight into types.Part.from_bytes. The default quality matches
+    cv2.imwrite so the payload sent to Gemini is unchanged.
+    
+    Args:
+        img: BGR numpy array
+        quality: JPEG quality 0-100 (default: 95)
+    
+    Returns:
+        bytes containing the encoded JPEG
+    """
+    ok, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return buffer.tobytes()
+
+
+class GridOverlayCache:
+    """
+    Cache of pre-rendered coordinate grid overlays.
+    
+    A grid overlay depends only on (width, height, step, colors), so each one
+    is rendered once with the same cv2.line/cv2.putText calls as the original
+    draw_grid, into a BGR layer plus an alpha mask. Applying it to a capture
+    is then a single vectorized blend instead of thousands of text renders.
+    
+    Features:
+    - LRU eviction bounded by max_entries
+    - Cached "grid on solid background" images (e.g. the pure grid reference)
+    - Automatic invalidation when the monitor geometry changes
+    - Thread-safe (tools may run on worker threads)
+    """
+    
+    def __init__(self, max_entries=16):
+        """
+        Args:
+            max_entries: Maximum number of overlays/backgrounds kept in memory
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._geometry = None
+        self._lock = threading.Lock()
+    
+    def invalidate(self):
+        """Drop every cached overlay."""
+        with self._lock:
+            self._entries.clear()
+    
+    def notify_geometry(self, width, height):
+        """
+        Record the current monitor geometry, clearing the cache if it changed.
+        
+        Args:
+            width: Capture width in pixels
+            height: Capture height in pixels
+        """
+        with self._lock:
+            if self._geometry is not None and self._geometry != (width, height):
+                logger.info(
+                    f"Monitor geometry changed {self._geometry} -> {(width, height)}, "
+                    f"clearing {len(self._entries)} cached grid overlays"
+                )
+                self._entries.clear()
+            self._geometry = (width, height)
+    
+    def apply(self, base_img, step, color=(90, 90, 90), label_color=(255, 255, 255)):
+        """
+        Return a copy of base_img with the grid overlay blended on top.
+        
+        Args:
+            base_img: BGR numpy array
+            step: Grid spacing in pixels
+            color: BGR color of the grid lines
+            label_color: BGR color of the coordinate labels
+        
+        Returns:
+            New BGR numpy array (base_img is not modified)
+        """
+        h, w = base_img.shape[:2]
+        layer, inverse_alpha = self._overlay(w, h, step, color, label_color)
+        # result = layer + base * (1 - alpha), as two saturating SIMD passes
+        result = cv2.multiply(base_img, inverse_alpha, scale=1.0 / 255)
+        return cv2.add(result, layer, dst=result)
+    
+    def on_background(self, width, height, step, color=(0, 0, 0),
+                      label_color=(0, 0, 0), background=255):
+        """
+        Return the grid drawn on a solid background, rendered once per key.
+        
+        The returned array is shared and read-only.
+        """
+        key = ("background", width, height, step, tuple(color), tuple(label_color), background)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        
+        image = self.apply(
+            np.full((height, width, 3), background, dtype=np.uint8),
+            step, color, label_color
+        )
+        image.flags.writeable = False
+        self._store(key, image)
+        return image
+    
+    def _overlay(self, width, height, step, color, label_color):
+        key = ("overlay", width, height, step, tuple(color), tuple(label_color))
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        
+        overlay = self._render(width, height, step, color, label_color)
+        self._store(key, overlay)
+        return overlay
+    
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    @staticmethod
+    def _render(width, height, step, color, label_color):
+        """
+        Render grid lines and labels into a premultiplied BGR layer and alpha.
+        
+        Every primitive is drawn twice: in color onto a black layer and in
+        white onto a coverage map. Compositing layer + base * (1 - alpha)
+        then reproduces drawing directly on the capture, anti-aliasing included.
+        """
+        layer = np.zeros((height, width, 3), dtype=np.uint8)
+        coverage = np.zeros((height, width), dtype=np.uint8)
+        
+        def line(p1, p2):
+            cv2.line(layer, p1, p2, color, 1)
+            cv2.line(coverage, p1, p2, 255, 1)
+        
+        def label(text, org):
+            cv2.putText(layer, text, org, cv2.FONT_HERSHEY_SIMPLEX, 0.4, label_color, 1)
+            cv2.putText(coverage, text, org, cv2.FONT_HERSHEY_SIMPLEX, 0.4, 255, 1)
+        
+        # Vertical lines, labelled at top and bottom
+        for x in range(0, width, step):
+            line((x, 0), (x, height))
+            label(str(x), (x + 2, 15))
+            label(str(x), (x + 2, height - 5))
+        
+        # Horizontal lines, labelled at left and right
+        for y in range(0, height, step):
+            line((0, y), (width, y))
+            label(str(y), (5, y + 12))
+            label(str(y), (width - 40, y + 12))
+        
+        inverse_alpha = cv2.cvtColor(255 - coverage, cv2.COLOR_GRAY2BGR)
+        layer.flags.writeable = False
+        inverse_alpha.flags.writeable = False
+        return layer, inverse_alpha
+
+
+# Global grid overlay cache shared by all detection calls
+grid_cache = GridOverlayCache()
+
+
+COORDINATE_PATTERNS = [
+    r'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)',  # x=123, y=456
+    r'x\s*:\s*(\d+)\s*,\s*y\s*:\s*(\d+)',  # x:123, y:456
+    r'\((\d+)\s*,\s*(\d+)\)',               # (123, 456)
+    r'(\d+)\s*,\s*(\d+)',                   # 123, 456
+    r'x\s*=\s*(\d+).*y\s*=\s*(\d+)',       # x=123 ... y=456
+]
+
+# Phrases the model uses when it cannot see the requested element
+NOT_FOUND_PHRASES = ["cannot", "can't", "unable", "not found", "don't see", "couldn't"]
+
+
+def parse_coordinates(text):
+    """
+    Extract an (x, y) pair from a model response.
+    
+    Tries each of COORDINATE_PATTERNS in order, from the strict
+    "x=NUMBER, y=NUMBER" format down to a bare "NUMBER, NUMBER".
+    
+    Returns:
+        tuple (x, y) of ints, or None if no pattern matched
+    """
+    for pattern in COORDINATE_PATTERNS:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return int(match.group(1)), int(match.group(2))
+    return None
+
+
+
+# Hedged detection (see main_file.py) lets the fast model's answer win only if
+# the model also grades it: the fast model is asked to append
+# confidence=NUMBER (0-100), and an answer below HEDGE_MIN_CONFIDENCE, or
+# without a grade, goes to the slow model instead. A point that merely parses
+# and lies inside the image is not evidence that it is on the right element.
+HEDGE_MIN_CONFIDENCE = int(os.getenv("HEDGE_MIN_CONFIDENCE", "80"))
+CONFIDENCE_PATTERN = r'confidence\s*[=:]\s*(\d+)'
+
+
+def confidence_prompt(text, prompt):
+    """Extend a stage's instruction text with the request for a confidence grade."""
+    return f"""{text}
+
+CONFIDENCE (overrides the format above):
+After the coordinates, add how certain you are that the point is on "{prompt}" as a number from 0 to 100.
+Respond in this EXACT format: x=NUMBER, y=NUMBER, confidence=NUMBER
+If you are guessing, the element is partly hidden, or several elements match, use a low number."""
+
+
+def parse_confidence(text):
+    """Extract the confidence=NUMBER grade (0-100) from an answer, or None."""
+    match = re.search(CONFIDENCE_PATTERN, text, re.IGNORECASE)
+    return min(int(match.group(1)), 100) if match else None
+
+
+def acceptable_detection(request, text, min_confidence=None):
+    """
+    Decide whether a model answer may settle a hedged detection stage.
+    
+    Args:
+        request: The request the model answered
+        text: The model's answer text
+        min_confidence: Required confidence grade (None: no grade required,
+            for the slow model's answers)
+    
+    Returns:
+        True if the answer has coordinates inside the image the model was
+        shown and, when required, a confidence of at least min_confidence
+    """
+    coordinates = parse_coordinates(text)
+    if coordinates is None or not in_request_image(request, *coordinates):
+        return False
+    if min_confidence is None:
+        return True
+    confidence = parse_confidence(text)
+    return confidence is not None and confidence >= min_confidence
+
+
+# Detection profiles select the image payload of a full-screen detection
+# request. Grid labels are drawn after downscaling, so they stay legible and
+# the model answers in image pixels, which are mapped back by 1 / scale.
+#
+# - images: any of "original", "fine_grid", "coarse_grid", "pure_grid"
+# - max_side: longest image side in pixels (None keeps native resolution)
+# - fine_step: fine grid spacing in image pixels
+# - quality: JPEG quality
+#
+# max_accuracy is the original four-image, full-resolution payload. The
+# defaults are justified by benchmark_detection.py (see README).
+DETECTION_PROFILES = {
+    "minimal": {
+        "images": ("fine_grid",),
+        "max_side": 1600,
+        "fine_step": 10,
+        "quality": 80,
+    },
+    "balanced": {
+        "images": ("original", "fine_grid"),
+        "max_side": 1920,
+        "fine_step": 10,
+        "quality": 85,
+    },
+    "max_accuracy": {
+        "images": ("original", "fine_grid", "coarse_grid", "pure_grid"),
+        "max_side": None,
+        "fine_step": 10,
+        "quality": 95,
+    },
+}
+
+COARSE_GRID_STEP = 50
+
+# The default is the original four-image payload; the smaller profiles are
+# opt-in until model-level hit rates (benchmark_detection.py --live,
+# benchmark_smart_detect.py with recordings) show they are as accurate.
+BASELINE_PROFILE = "max_accuracy"
+DETECTION_PROFILE = os.getenv("DETECTION_PROFILE", BASELINE_PROFILE).lower()
+
+
+def get_detection_profile(name=None):
+    """
+    Look up a detection profile by name.
+    
+    Args:
+        name: Profile name (default: DETECTION_PROFILE); unknown names fall
+              back to BASELINE_PROFILE with a warning
+    
+    Returns:
+        (name, profile dict)
+    """
+    name = (name or DETECTION_PROFILE).lower()
+    if name not in DETECTION_PROFILES:
+        logger.warning(f"⚠️  Unknown detection profile '{name}', using '{BASELINE_PROFILE}'")
+        name = BASELINE_PROFILE
+    return name, DETECTION_PROFILES[name]
+
+
+def render_detection_images(img, profile):
+    """
+    Build the image payload of a full-screen detection request.
+    
+    Args:
+        img: BGR screenshot at native resolution
+        profile: Entry of DETECTION_PROFILES
+    
+    Returns:
+        dict with:
+        - images: list of (file name, description, JPEG bytes) in send order
+        - kinds: image kind of each entry ("original", "fine_grid", ...)
+        - scale: image pixels per screen pixel
+        - width, height: size of the images sent
+        - grid_ms, encode_ms: time spent rendering overlays and encoding
+    """
+    started = time.perf_counter()
+    height, width = img.shape[:2]
+    scale = 1.0
+    if profile["max_side"] and max(width, height) > profile["max_side"]:
+        scale = profile["max_side"] / max(width, height)
+        img = cv2.resize(img, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        height, width = img.shape[:2]
+    
+    step = profile["fine_step"]
+    rendered = []
+    for kind in profile["images"]:
+        if kind == "original":
+            rendered.append(("screen_original.jpg",
+                             "Original screen (no grid)",
+                             img))
+        elif kind == "fine_grid":
+            rendered.append((f"screen_fine_grid_{step}px.jpg",
+                             f"Fine grid overlay ({step}px spacing) - use this for PRECISE coordinate detection",
+                             grid_cache.apply(img, step=step, color=(70, 70, 70))))
+        elif kind == "coarse_grid":
+            rendered.append((f"screen_coarse_grid_{COARSE_GRID_STEP}px.jpg",
+                             f"Coarse grid overlay ({COARSE_GRID_STEP}px spacing) - use this for general location context",
+                             grid_cache.apply(img, step=COARSE_GRID_STEP, color=(100, 100, 100))))
+        elif kind == "pure_grid":
+            rendered.append((f"grid_pure_{step}px.jpg",
+                             f"Pure grid reference ({step}px) - use this to understand the coordinate system",
+                             grid_cache.on_background(width, height, step=step, color=(0, 0, 0), label_color=(0, 0, 0))))
+        else:
+            raise ValueError(f"Unknown detection image kind: {kind}")
+    rendered_at = time.perf_counter()
+    
+    images = [(name, description, encode_jpeg(image, profile["quality"]))
+              for name, description, image in rendered]
+    encoded_at = time.perf_counter()
+    
+    return {
+        "images": images,
+        "kinds": list(profile["images"]),
+        "scale": scale,
+        "width": width,
+        "height": height,
+        "grid_ms": (rendered_at - started) * 1000,
+        "encode_ms": (encoded_at - rendered_at) * 1000,
+    }
+
+
+def detection_prompt(prompt, payload, fine_step):
+    """Build the instruction text that accompanies a full-screen payload."""
+    listing = "\n".join(
+        f"{i}. {description}" for i, (_, description, _) in enumerate(payload["images"], 1)
+    )
+    return f"""Analyze these images to find the EXACT coordinates of: "{prompt}"
+
+Images provided:
+{listing}
+
+INSTRUCTIONS:
+- Locate the CENTER POINT of the target element "{prompt}"
+- Use the {fine_step}px fine grid for maximum precision
+- Read the coordinate labels on the grid axes carefully
+- The screen dimensions are {payload['width']}x{payload['height']} pixels
+
+RESPONSE FORMAT (CRITICAL):
+You MUST respond with coordinates in this EXACT format:
+x=NUMBER, y=NUMBER
+
+Example: x=450, y=320
+
+Do not include any other text, explanations, or formatting. Just the coordinates."""
+
+
+# Coarse-to-fine ("roi") detection: the model first finds the rough region on
+# a downscaled screenshot, then pinpoints the element in a zoomed crop of
+# that region. DETECTION_MODE is "full" (one request with the
+# DETECTION_PROFILE payload), "roi", or "auto" (roi when the monitor is
+# larger than ROI_AUTO_MIN_PIXELS). roi costs two sequential model calls,
+# so "full" stays the default until measurements show roi is faster and at
+# least as accurate (benchmark_smart_detect.py --record, then --modes).
+DETECTION_MODE = os.getenv("DETECTION_MODE", "full").lower()
+ROI_AUTO_MIN_PIXELS = 1920 * 1200
+ROI_COARSE_MAX_SIDE = 1280   # long side of the downscaled overview
+ROI_COARSE_GRID_STEP = 50
+ROI_WIDTH = 480              # crop size in screen pixels
+ROI_HEIGHT = 320
+ROI_ZOOM = 2.0
+ROI_FINE_GRID_STEP = 20      # in zoomed pixels, i.e. 10 screen pixels at 2x
+
+
+def detection_mode(width, height, mode=None):
+    """Resolve a detection mode ("full", "roi" or "auto"; default DETECTION_MODE) for a screen size."""
+    mode = (mode or DETECTION_MODE).lower()
+    if mode in ("full", "roi"):
+        return mode
+    return "roi" if width * height > ROI_AUTO_MIN_PIXELS else "full"
+
+
+def roi_bounds(cx, cy, width, height, roi_width=ROI_WIDTH, roi_height=ROI_HEIGHT):
+    """
+    Place a roi_width x roi_height window centered on (cx, cy).
+    
+    The window is shifted (not shrunk) to stay on screen, so every crop has
+    the same size and reuses the same cached grid overlay.
+    
+    Returns:
+        (left, top, w, h) in screen pixels
+    """
+    w = min(roi_width, width)
+    h = min(roi_height, height)
+    left = min(max(int(cx) - w // 2, 0), width - w)
+    top = min(max(int(cy) - h // 2, 0), height - h)
+    return left, top, w, h
+
+
+def build_detection_request(prompt, img, started=None, profile=None, mode=None):
+    """
+    Build the first model request for detecting `prompt` on a screenshot.
+    
+    A request is a plain dict: the images and text to send plus what is
+    needed to map the answer back to the screen ("offset", "scale") and to
+    build a follow-up stage. Its "stats" dict is shared by all stages of
+    one detection and accumulates upload bytes, model calls and per-stage
+    timings.
+    
+    Args:
+        prompt: Description of the element to find
+        img: BGR screenshot at native resolution
+        started: time.perf_counter() when detection began (default: now)
+        profile: Detection profile name (default: DETECTION_PROFILE)
+        mode: "full", "roi" or "auto" (default: DETECTION_MODE)
+    
+    Returns:
+        Request dict for the "full" or "coarse" stage
+    """
+    if started is None:
+        started = time.perf_counter()
+    height, width = img.shape[:2]
+    profile_name, profile = get_detection_profile(profile)
+    stats = {
+        "mode": detection_mode(width, height, mode),
+        "profile": profile_name,
+        "upload_bytes": 0,
+        "prompt_tokens": 0,
+        "model_calls": 0,
+        "started": started,
+        "timings": {"grid_ms": 0.0, "encode_ms": 0.0},
+    }
+    if stats["mode"] == "roi":
+        return _build_coarse_request(prompt, img, profile, stats)
+    
+    payload = render_detection_images(img, profile)
+    stats["timings"]["grid_ms"] += payload["grid_ms"]
+    stats["timings"]["encode_ms"] += payload["encode_ms"]
+    stats["upload_bytes"] += sum(len(data) for _, _, data in payload["images"])
+    return {
+        "prompt": prompt,
+        "stage": "full",
+        "images": payload["images"],
+        "text": detection_prompt(prompt, payload, profile["fine_step"]),
+        "width": width,
+        "height": height,
+        "image_width": payload["width"],
+        "image_height": payload["height"],
+        "offset": (0, 0),
+        "scale": payload["scale"],
+        "quality": profile["quality"],
+        "stats": stats,
+    }
+
+
+def _build_coarse_request(prompt, img, profile, stats):
+    """First roi stage: one downscaled screenshot with a coarse grid."""
+    rendered_at = time.perf_counter()
+    height, width = img.shape[:2]
+    scale = min(1.0, ROI_COARSE_MAX_SIDE / max(width, height))
+    if scale < 1.0:
+        small = cv2.resize(img, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    else:
+        small = img
+    small_height, small_width = small.shape[:2]
+    overview = grid_cache.apply(small, step=ROI_COARSE_GRID_STEP, color=(100, 100, 100))
+    encoded_at = time.perf_counter()
+    overview_bytes = encode_jpeg(overview, quality=min(profile["quality"], 85))
+    stats["timings"]["grid_ms"] += (encoded_at - rendered_at) * 1000
+    stats["timings"]["encode_ms"] += (time.perf_counter() - encoded_at) * 1000
+    stats["upload_bytes"] += len(overview_bytes)
+    
+    coarse_prompt = f"""Find the approximate location of: "{prompt}"
+
+The image is a {small_width}x{small_height} screenshot with a {ROI_COARSE_GRID_STEP}px grid overlay.
+Read the coordinate labels on the grid axes to locate the CENTER POINT of "{prompt}".
+
+RESPONSE FORMAT (CRITICAL):
+You MUST respond with coordinates in this EXACT format:
+x=NUMBER, y=NUMBER
+
+Do not include any other text, explanations, or formatting. Just the coordinates."""
+    
+    return {
+        "prompt": prompt,
+        "stage": "coarse",
+        "images": [("roi_coarse.jpg", "Downscaled screen with coarse grid", overview_bytes)],
+        "text": coarse_prompt,
+        "img": img,
+        "width": width,
+        "height": height,
+        "image_width": small_width,
+        "image_height": small_height,
+        "offset": (0, 0),
+        "scale": scale,
+        "quality": profile["quality"],
+        "stats": stats,
+    }
+
+
+def build_fine_request(coarse, rough_x, rough_y):
+    """
+    Second roi stage: a zoomed crop around the coarse answer with a fine grid.
+    
+    Args:
+        coarse: The "coarse" stage request
+        rough_x, rough_y: The model's answer in overview image pixels
+    
+    Returns:
+        Request dict for the "fine" stage
+    """
+    stats = coarse["stats"]
+    rendered_at = time.perf_counter()
+    img = coarse["img"]
+    width, height = coarse["width"], coarse["height"]
+    rough_x = min(max(rough_x, 0), coarse["image_width"] - 1)
+    rough_y = min(max(rough_y, 0), coarse["image_height"] - 1)
+    left, top, w, h = roi_bounds(rough_x / coarse["scale"], rough_y / coarse["scale"], width, height)
+    
+    roi = img[top:top + h, left:left + w]
+    zoomed = cv2.resize(roi, None, fx=ROI_ZOOM, fy=ROI_ZOOM, interpolation=cv2.INTER_CUBIC)
+    zoomed_height, zoomed_width = zoomed.shape[:2]
+    fine = grid_cache.apply(zoomed, step=ROI_FINE_GRID_STEP, color=(70, 70, 70))
+    encoded_at = time.perf_counter()
+    zoomed_bytes = encode_jpeg(zoomed, coarse["quality"])
+    fine_bytes = encode_jpeg(fine, coarse["quality"])
+    stats["timings"]["grid_ms"] += (encoded_at - rendered_at) * 1000
+    stats["timings"]["encode_ms"] += (time.perf_counter() - encoded_at) * 1000
+    stats["upload_bytes"] += len(zoomed_bytes) + len(fine_bytes)
+    
+    fine_prompt = f"""Find the EXACT location of: "{coarse['prompt']}"
+
+Images provided (both are the same {zoomed_width}x{zoomed_height} zoomed-in region of the screen):
+1. Region without grid
+2. Region with a {ROI_FINE_GRID_STEP}px grid overlay - use this for PRECISE coordinate detection
+
+INSTRUCTIONS:
+- Locate the CENTER POINT of the target element
+- Read the coordinate labels on the grid axes carefully
+- Coordinates are pixels of these images, not of the whole screen
+
+RESPONSE FORMAT (CRITICAL):
+You MUST respond with coordinates in this EXACT format:
+x=NUMBER, y=NUMBER
+
+Do not include any other text, explanations, or formatting. Just the coordinates."""
+    
+    return {
+        "prompt": coarse["prompt"],
+        "stage": "fine",
+        "images": [
+            ("roi_zoomed.jpg", "Zoomed region", zoomed_bytes),
+            ("roi_fine_grid.jpg", "Zoomed region with fine grid", fine_bytes),
+        ],
+        "text": fine_prompt,
+        "width": width,
+        "height": height,
+        "image_width": zoomed_width,
+        "image_height": zoomed_height,
+        "offset": (left, top),
+        "scale": ROI_ZOOM,
+        "quality": coarse["quality"],
+        "stats": stats,
+    }
+
+
+def in_request_image(request, x, y):
+    """True if (x, y) lies inside the image the model was shown for this stage."""
+    return 0 <= x < request["image_width"] and 0 <= y < request["image_height"]
+
+
+def to_screen(request, x, y):
+    """Map model image coordinates of a final-stage request to screen pixels."""
+    left, top = request["offset"]
+    x = min(left + int(round(x / request["scale"])), request["width"] - 1)
+    y = min(top + int(round(y / request["scale"])), request["height"] - 1)
+    return x, y
+
+
+def advance_detection(request, text):
+    """
+    Consume the model's answer for one detection stage.
+    
+    This is the single stage driver: main_file.py and the benchmark both
+    call it, so they always parse, chain and map answers the same way.
+    
+    Args:
+        request: The request the model answered
+        text: The model's answer text
+    
+    Returns:
+        (outcome, next_request): None and the next stage's request (after a
+        coarse stage), or a final outcome dict and None. The outcome has
+        "text" plus either "point" (capture pixels) and "coordinates" (image
+        pixels), or "failure": "unparseable", "not_found" or "out_of_bounds"
+    """
+    request["stats"]["model_calls"] += 1
+    coordinates = parse_coordinates(text)
+    if coordinates is None:
+        failure = "not_found" if any(p in text.lower() for p in NOT_FOUND_PHRASES) else "unparseable"
+        return {"failure": failure, "text": text}, None
+    if request["stage"] == "coarse":
+        return None, build_fine_request(request, *coordinates)
+    if not in_request_image(request, *coordinates):
+        return {"failure": "out_of_bounds", "text": text, "coordinates": coordinates}, None
+    return {"point": to_screen(request, *coordinates), "coordinates": coordinates, "text": text}, None
+
@@ -0,0 +1,257 @@
+"""
+Keyboard side of the input tools.
+
+One long-lived pynput keyboard controller and one key-name table, shared by
+press_key, press_key_combination and type_text in main_file.py:
+
+- keyboard_controller: created once at import, reused for every keystroke
+- KEYS: frozen table of key names (with common aliases) -> pynput keys
+- PRIMARY_MODIFIER: Cmd on macOS, Ctrl elsewhere (platform looked up once)
+- compile_keys / play: key specs parsed once into cached press/release
+  sequences, so repeated shortcuts and macros do not rebuild anything
+- inject_text: types short strings key by key and pastes long ones through
+  the clipboard (restoring what was there before)
+"""
+
+import logging
+import os
+import platform
+import time
+from functools import lru_cache
+from types import MappingProxyType
+
+from pynput import keyboard
+
+try:
+    import pyperclip
+except ImportError:  # declared in pyproject.toml; without it text is always typed
+    pyperclip = None
+
+logger = logging.getLogger('VoiceAssistant')
+
+SYSTEM = platform.system().lower()
+IS_MACOS = SYSTEM == "darwin"
+PRIMARY_MODIFIER = keyboard.Key.cmd if IS_MACOS else keyboard.Key.ctrl
+
+# Long-lived controller (creating one per call costs a platform connection)
+keyboard_controller = keyboard.Controller()
+
+
+def _build_key_table():
+    """Canonical key names and aliases -> pynput keys."""
+    Key = keyboard.Key
+    table = {
+        "space": Key.space,
+        "enter": Key.enter,
+        "shift": Key.shift,
+        "ctrl": Key.ctrl,
+        "alt": Key.alt,
+        "cmd": Key.cmd,
+        "tab": Key.tab,
+        "esc": Key.esc,
+        "up": Key.up,
+        "down": Key.down,
+        "left": Key.left,
+        "right": Key.right,
+        "backspace": Key.backspace,
+        "delete": Key.delete,
+        "home": Key.home,
+        "end": Key.end,
+        "page_up": Key.page_up,
+        "page_down": Key.page_down,
+        "caps_lock": Key.caps_lock,
+    }
+    table.update({f"f{n}": getattr(Key, f"f{n}") for n in range(1, 13)})
+    # "mod" is the platform's shortcut modifier (Cmd on macOS, Ctrl elsewhere)
+    table["mod"] = PRIMARY_MODIFIER
+
+    aliases = {
+        "return": "enter",
+        "control": "ctrl",
+        "option": "alt",
+        "command": "cmd",
+        "meta": "cmd",
+        "super": "cmd",
+        "win": "cmd",
+        "escape": "esc",
+        "del": "delete",
+        "pageup": "page_up",
+        "pagedown": "page_down",
+        "arrowup": "up",
+        "arrowdown": "down",
+        "arrowleft": "left",
+        "arrowright": "right",
+    }
+    table.update({alias: table[name] for alias, name in aliases.items()})
+    return table
+
+
+KEYS = MappingProxyType(_build_key_table())
+
+# Canonical names, for error messages and tool descriptions
+KEY_NAMES = (
+    "space", "enter", "shift", "ctrl", "alt", "cmd", "tab", "esc", "up", "down", "left", "right",
+    "backspace", "delete", "home", "end", "page_up", "page_down", "caps_lock", "f1-f12", "mod",
+)
+
+
+def resolve_key(name):
+    """
+    Map a key name to a pynput key.
+
+    Named keys are case-insensitive and surrounding whitespace is ignored
+    (" a" is "a"); a single character is sent as that character.
+
+    Raises:
+        ValueError: for an unknown multi-character name
+    """
+    stripped = name.strip()
+    if len(stripped) == 1:
+        return stripped
+    if len(name) == 1:
+        return name  # a lone space or other whitespace character
+    key = KEYS.get(stripped.lower())
+    if key is not None:
+        return key
+    raise ValueError(f"Unknown key '{name}'. Available special keys: {', '.join(KEY_NAMES)}")
+
+
+@lru_cache(maxsize=256)
+def compile_keys(keys):
+    """
+    Parse a key spec into a press/release event sequence (cached).
+
+    All keys but the last are held in order, the last is tapped, then the
+    held keys are released in reverse order: ("cmd", "shift", "s") gives
+    press cmd, press shift, press s, release s, release shift, release cmd.
+
+    Args:
+        keys: Tuple of key names (a single key is a one-element tuple)
+
+    Returns:
+        Tuple of (is_press, key) events
+    """
+    if not keys:
+        raise ValueError("No keys provided")
+    resolved = [resolve_key(name) for name in keys]
+    held, last = resolved[:-1], resolved[-1]
+    return (
+        tuple((True, key) for key in held)
+        + ((True, last), (False, last))
+        + tuple((False, key) for key in reversed(held))
+    )
+
+
+def play(events, controller=keyboard_controller):
+    """
+    Send a compiled event sequence.
+
+    Keys still held when an event fails are released before the error is
+    re-raised, so a failed shortcut never leaves a modifier stuck down.
+    """
+    down = []
+    try:
+        for is_press, key in events:
+            if is_press:
+                controller.press(key)
+                down.append(key)
+            else:
+                controller.release(key)
+                down.remove(key)
+    except Exception:
+        for key in reversed(down):
+            try:
+                controller.release(key)
+            except Exception:
+                logger.warning(f"Could not release key {key} after a failed key sequence")
+        raise
+
+
+def tap(*keys):
+    """Press a key or shortcut: tap("enter"), tap("mod", "a")."""
+    play(compile_keys(keys))
+
+
+def type_characters(text, controller=keyboard_controller):
+    """Type text one synthetic key event per character."""
+    controller.type(text)
+
+
+# Text injection. "auto" pastes text of at least TYPE_PASTE_MIN_CHARS
+# characters through the clipboard (one keystroke instead of one synthetic
+# event per character) and types anything shorter. "type" always types,
+# for fields that block paste; "paste" always pastes.
+TYPE_STRATEGY = os.getenv("TYPE_STRATEGY", "auto").lower()
+TYPE_PASTE_MIN_CHARS = int(os.getenv("TYPE_PASTE_MIN_CHARS", "64"))
+# Seconds the target app gets to read the clipboard before it is restored
+PASTE_SETTLE_DELAY = float(os.getenv("PASTE_SETTLE_DELAY", "0.15"))
+TEXT_STRATEGIES = ("auto", "type", "paste")
+
+PASTE = compile_keys(("mod", "v"))
+
+
+def choose_text_strategy(text, strategy=None):
+    """
+    Pick how to inject text: "type" or "paste".
+
+    Args:
+        text: Text to inject
+        strategy: "auto", "type" or "paste" (default: TYPE_STRATEGY)
+    """
+    strategy = (strategy or TYPE_STRATEGY).lower()
+    if strategy not in TEXT_STRATEGIES:
+        raise ValueError(f"Unknown text strategy '{strategy}'. Use one of: {', '.join(TEXT_STRATEGIES)}")
+    if strategy == "type" or pyperclip is None:
+        return "type"
+    if strategy == "paste":
+        return "paste"
+    return "paste" if len(text) >= TYPE_PASTE_MIN_CHARS else "type"
+
+
+def paste_text(text, controller=keyboard_controller):
+    """
+    Paste text through the clipboard, then restore the previous clipboard.
+
+    Only text clipboard contents can be saved and restored; anything else
+    (an image, files) is replaced by the restored text.
+
+    Raises:
+        pyperclip.PyperclipException: if the clipboard cannot be written
+            (raised before any key is sent, so the caller can fall back)
+    """
+    try:
+        saved = pyperclip.paste()
+    except Exception as e:
+        logger.warning(f"Could not read the clipboard before pasting, it will not be restored: {e}")
+        saved = None
+
+    pyperclip.copy(text)
+    try:
+        play(PASTE, controller)
+        time.sleep(PASTE_SETTLE_DELAY)
+    finally:
+        if saved is not None:
+            try:
+                pyperclip.copy(saved)
+            except Exception as e:
+                logger.warning(f"Could not restore the clipboard after pasting: {e}")
+
+
+def inject_text(text, strategy=None, controller=keyboard_controller):
+    """
+    Enter text at the cursor with the chosen strategy.
+
+    If pasting fails before the paste keystroke (clipboard unavailable, e.g.
+    no xclip on Linux), the text is typed instead.
+
+    Returns:
+        The strategy actually used: "type" or "paste"
+    """
+    if choose_text_strategy(text, strategy) == "paste":
+        try:
+            paste_text(text, controller)
+            return "paste"
+        except pyperclip.PyperclipException as e:
+            logger.warning(f"Clipboard paste unavailable, typing instead: {e}")
+    type_characters(text, controller)
+    return "type"
@@ -39,9 +39,21 @@ import sys
 import traceback
 import logging
 import json
+import random
+import re
+import time
+import math
+import inspect
+import queue
+import threading
+import concurrent.futures
+from collections import OrderedDict, deque
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import wraps, partial
 
 import cv2
+import numpy as np
 import pyaudio
 import PIL.Image
 import mss
@@ -88,12 +100,16 @@ CHUNK_SIZE = 1024
 MODEL = "gemini-2.5-flash-native-audio-preview-09-2025"
 
 DEFAULT_MODE = "screen"
+
+# Debug screenshots are off by default. Enable with --save-screenshots or
+# SAVE_DEBUG_SCREENSHOTS=true to have detection/quiz captures written to disk.
+SAVE_DEBUG_SCREENSHOTS = os.getenv("SAVE_DEBUG_SCREENSHOTS", "false").lower() in ("1", "true", "yes")
 from pynput import mouse
-from pynput import keyboard
-import pyautogui
-import mss
-import numpy as np
-import cv2
+from input_devices import KEY_NAMES, TEXT_STRATEGIES, compile_keys, inject_text, play, tap
+from detection_pipeline import (
+    encode_jpeg, grid_cache, build_detection_request, advance_detection,
+    acceptable_detection, confidence_prompt, HEDGE_MIN_CONFIDENCE,
+)
 client = genai.Client(api_key=GOOGLE_API_KEY)
 
 # Global mouse controller for reliability (avoids creating new instances)
@@ -250,8 +266,6 @@ class VoiceAssistantLogger:
             actual: Tuple of (x, y) actual final coordinates
             success: Boolean indicating if movement was accurate
         """
-        import math
-        
         # Calculate error distance
         error_distance = math.sqrt(
             (actual[0] - target[0])**2 + 
@@ -316,23 +330,198 @@ class VoiceAssistantLogger:
 logger = VoiceAssistantLogger(debug_mode=False)
 
 
-def retry_with_backoff(max_retries=3, initial_delay=0.5):
+# Error classes that are worth retrying. Auth, not found, unparseable answers
+# and bad requests fail the same way every time. "unknown" (an exception
+# classify_error cannot place) is still retried, as every error was before
+# errors were classified.
+RETRYABLE_ERROR_CLASSES = frozenset({"rate_limit", "timeout", "server", "network", "unknown"})
+RETRY_MAX_DELAY = 8.0         # cap for one backoff sleep (seconds)
+RETRY_AFTER_MAX = 30.0        # give up instead of honoring longer Retry-After hints
+
+# Retry budget. Every retried function gets its own budget, so a rate-limit
+# burst in one tool cannot use up the retries of every other caller. Within
+# RETRY_BUDGET_WINDOW seconds a function may retry while its retries stay
+# below max(RETRY_BUDGET_MIN, RETRY_BUDGET_RATIO * its calls).
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN = int(os.getenv("RETRY_BUDGET_MIN", "3"))
+RETRY_BUDGET_WINDOW = float(os.getenv("RETRY_BUDGET_WINDOW", "60.0"))
+
+
+def classify_error(error):
+    """
+    Sort an exception into a coarse error class for retry decisions.
+    
+    Uses the HTTP status code when the exception carries one (google-genai
+    APIError.code, or .status_code), then falls back to the exception type
+    and message.
+    
+    Returns:
+        One of "rate_limit", "timeout", "server", "network", "auth",
+        "not_found", "invalid_request" or "unknown"
+    """
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    if isinstance(code, int):
+        if code == 429:
+            return "rate_limit"
+        if code in (401, 403):
+            return "auth"
+        if code == 404:
+            return "not_found"
+        if code in (408, 504):
+            return "timeout"
+        if code >= 500:
+            return "server"
+        if code >= 400:
+            return "invalid_request"
+    
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, concurrent.futures.TimeoutError)):
+        return "timeout"
+    if isinstance(error, ConnectionError):
+        return "network"
+    
+    text = str(error).lower()
+    if any(word in text for word in ("429", "quota", "rate limit", "resource_exhausted", "too many requests")):
+        return "rate_limit"
+    if any(word in text for word in ("unauthorized", "authentication", "permission", "api key", "api_key")):
+        return "auth"
+    if any(word in text for word in ("timeout", "timed out", "deadline")):
+        return "timeout"
+    if any(word in text for word in ("unavailable", "internal error", "503", "500", "overloaded")):
+        return "server"
+    if any(word in text for word in ("connection", "network", "ssl")):
+        return "network"
+    return "unknown"
+
+
+def retry_after_hint(error):
+    """
+    Extract a server-provided retry delay from an exception, if any.
+    
+    Checks a retry_after attribute, a Retry-After response header (seconds
+    or HTTP date) and a google.rpc RetryInfo "retryDelay" in the message.
+    
+    Returns:
+        Delay in seconds, or None
+    """
+    hint = getattr(error, "retry_after", None)
+    if hint is not None:
+        try:
+            return max(0.0, float(hint))
+        except (TypeError, ValueError):
+            pass
+    
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    when = parsedate_to_datetime(value)
+                    return max(0.0, when.timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+    
+    match = re.search(r"retry[ _-]?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class RetryableError(Exception):
+    """
+    Raised by a function wrapped in retry_with_backoff to report a failure
+    that came back as a value (e.g. an error dict) rather than an exception.
+    
+    Attributes:
+        error_class: Class as returned by classify_error
+        retry_after: Server retry hint in seconds, or None
+        payload: The original result, returned to the caller if retries run out
+    """
+    
+    def __init__(self, message, error_class="unknown", retry_after=None, payload=None):
+        super().__init__(message)
+        self.error_class = error_class
+        self.retry_after = retry_after
+        self.payload = payload
+
+
+class RetryBudget:
+    """
+    Cap on retries, as a share of recent calls.
+    
+    Within a sliding window, retries are allowed while they stay below
+    max(min_retries, ratio * calls). A failing dependency therefore costs at
+    most ~ratio extra load instead of multiplying every call by max_retries.
+    """
+    
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, min_retries=RETRY_BUDGET_MIN,
+                 window=RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+        self.denied = 0
+    
+    def _trim(self, now):
+        for events in (self._calls, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+    
+    def record_call(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._calls.append(now)
+    
+    def try_acquire(self):
+        """Reserve one retry; False if the budget is exhausted."""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= max(self.min_retries, self.ratio * len(self._calls)):
+                self.denied += 1
+                return False
+            self._retries.append(now)
+            return True
+
+
+
+def retry_with_backoff(max_retries=3, initial_delay=0.5, max_delay=RETRY_MAX_DELAY,
+                       retry_on=RETRYABLE_ERROR_CLASSES, budget=None):
     """
     Decorator for retrying failed operations with exponential backoff.
     
     Implements automatic retry logic for functions that may fail transiently.
-    Uses exponential backoff strategy: delay doubles after each failed attempt.
+    Works on both plain functions (the retry sleep blocks the calling worker
+    thread) and coroutine functions (the sleep is asyncio.sleep, so the
+    event loop keeps running).
     
     Features:
-    - Configurable maximum retry attempts
-    - Exponential backoff delay (doubles each retry)
+    - Configurable maximum number of attempts
+    - Exponential backoff with full jitter: sleep is uniform in
+      [0, min(max_delay, initial_delay * 2**attempt)]
+    - Only errors whose class (see classify_error) is in retry_on are
+      retried; auth, not-found and parse errors fail immediately
+    - Retry-After hints are honored (longer than RETRY_AFTER_MAX: give up)
+    - A RetryBudget per decorated function caps its retries
     - Detailed logging of retry attempts
     - Preserves original function metadata
-    - Re-raises the last exception if all retries fail
+    - Re-raises the last exception if all attempts fail
     
     Args:
-        max_retries: Maximum number of retry attempts (default: 3)
-        initial_delay: Initial delay in seconds before first retry (default: 0.5)
+        max_retries: Maximum number of attempts, including the first (default: 3)
+        initial_delay: Base delay in seconds for the first retry (default: 0.5)
+        max_delay: Upper bound for a single backoff sleep
+        retry_on: Error classes that may be retried
+        budget: RetryBudget to draw from (default: a new budget for this
+                function; pass one budget to several functions to share it)
     
     Returns:
         Decorator function that wraps the target function with retry logic
@@ -344,58 +533,93 @@ def retry_with_backoff(max_retries=3, initial_delay=0.5):
             pass
     """
     def decorator(func):
+        func_budget = budget if budget is not None else RetryBudget()
+        
+        def next_delay(e, attempt):
+            """Seconds to wait before the next attempt, or None to stop."""
+            error_class = getattr(e, "error_class", None) or classify_error(e)
+            context = {
+                "attempt": attempt + 1,
+                "max_retries": max_retries,
+                "error_class": error_class,
+                "function": func.__name__,
+            }
+            if error_class not in retry_on:
+                logger.log_error(
+                    error_type=f"{func.__name__}_not_retried",
+                    error_message=str(e),
+                    context=context
+                )
+                return None
+            if attempt >= max_retries - 1:
+                logger.logger.error(
+                    f"❌ {func.__name__} failed after {max_retries} attempts. "
+                    f"Final error: {str(e)}"
+                )
+                return None
+            
+            hint = getattr(e, "retry_after", None)
+            if hint is None:
+                hint = retry_after_hint(e)
+            if hint is not None and hint > RETRY_AFTER_MAX:
+                logger.logger.error(
+                    f"❌ {func.__name__}: server asked to retry after {hint:.0f}s, giving up"
+                )
+                return None
+            if not func_budget.try_acquire():
+                logger.logger.error(f"❌ {func.__name__}: retry budget exhausted, not retrying")
+                return None
+            
+            delay = random.uniform(0, min(max_delay, initial_delay * (2 ** attempt)))
+            if hint is not None:
+                delay = max(delay, hint)
+            context["next_delay"] = round(delay, 2)
+            logger.log_error(
+                error_type=f"{func.__name__}_retry",
+                error_message=str(e),
+                context=context
+            )
+            logger.logger.warning(
+                f"⚠️  {func.__name__} failed with {error_class} (attempt {attempt + 1}/{max_retries}). "
+                f"Retrying in {delay:.1f}s..."
+            )
+            return delay
+        
+        def log_success(attempt):
+            if attempt > 0:
+                logger.logger.info(
+                    f"✅ {func.__name__} succeeded on attempt {attempt + 1}/{max_retries}"
+                )
+        
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                func_budget.record_call()
+                for attempt in range(max_retries):
+                    try:
+                        result = await func(*args, **kwargs)
+                        log_success(attempt)
+                        return result
+                    except Exception as e:
+                        delay = next_delay(e, attempt)
+                        if delay is None:
+                            raise
+                        await asyncio.sleep(delay)
+            return async_wrapper
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            delay = initial_delay
-            last_exception = None
-            
+            func_budget.record_call()
             for attempt in range(max_retries):
                 try:
-                    # Attempt to execute the function
                     result = func(*args, **kwargs)
-                    
-                    # Log success if this wasn't the first attempt
-                    if attempt > 0:
-                        logger.logger.info(
-                            f"✅ {func.__name__} succeeded on attempt {attempt + 1}/{max_retries}"
-                        )
-                    
+                    log_success(attempt)
                     return result
-                    
                 except Exception as e:
-                    last_exception = e
-                    
-                    # Log the retry attempt
-                    logger.log_error(
-                        error_type=f"{func.__name__}_retry",
-                        error_message=str(e),
-                        context={
-                            "attempt": attempt + 1,
-                            "max_retries": max_retries,
-                            "next_delay": delay if attempt < max_retries - 1 else None,
-                            "function": func.__name__,
-                            "args": str(args)[:100],  # Truncate long args
-                            "kwargs": str(kwargs)[:100]
-                        }
-                    )
-                    
-                    # If this wasn't the last attempt, wait before retrying
-                    if attempt < max_retries - 1:
-                        logger.logger.warning(
-                            f"⚠️  {func.__name__} failed (attempt {attempt + 1}/{max_retries}). "
-                            f"Retrying in {delay:.1f}s..."
-                        )
-                        time.sleep(delay)
-                        delay *= 2  # Exponential backoff: double the delay
-                    else:
-                        # All retries exhausted
-                        logger.logger.error(
-                            f"❌ {func.__name__} failed after {max_retries} attempts. "
-                            f"Final error: {str(last_exception)}"
-                        )
-            
-            # All retries failed - re-raise the last exception
-            raise last_exception
+                    delay = next_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
         
         return wrapper
     return decorator
@@ -403,9 +627,7 @@ def retry_with_backoff(max_retries=3, initial_delay=0.5):
 
 def capture_screen_sync():
     try:
-        with mss.mss() as sct:
-            monitor = sct.monitors[1]
-            return np.array(sct.grab(monitor))
+        return screen_capture.grab(PRIMARY_MONITOR).bgra
     except Exception as e:
         raise RuntimeError(
             "❌ Screen capture failed! On macOS, grant Screen Recording permission:\n"
@@ -414,130 +636,1275 @@ def capture_screen_sync():
             f"Original error: {e}"
         )
 
-import os
-import time
-import cv2
-import numpy as np
-import threading
-import mss
-from google import genai
-from google.genai import types
-from functools import wraps
-import math
-
 
-def show_quiz_modal(quiz_text):
+class ScreenshotDebugSink:
     """
-    Display quiz in a translucent modal window that can be closed.
-    Must be called from the main thread (macOS requirement).
+    Optional, asynchronous writer for debug screenshots.
+    
+    Tools hand over already-encoded JPEG bytes and return immediately; a
+    daemon thread writes them to disk in the background. When disabled,
+    submit() is a no-op so production runs never touch the filesystem.
     """
-    import tkinter as tk
-    from tkinter import font as tkfont
-
-    # Create the main window
-    root = tk.Tk()
-    root.title("🎯 Quiz Time!")
-
-    # Get screen dimensions
-    screen_width = root.winfo_screenwidth()
-    screen_height = root.winfo_screenheight()
-
-    # Set window size (60% of screen)
-    window_width = int(screen_width * 0.6)
-    window_height = int(screen_height * 0.6)
-
-    # Center window
-    x = (screen_width - window_width) // 2
-    y = (screen_height - window_height) // 2
-    root.geometry(f"{window_width}x{window_height}+{x}+{y}")
-
-    # Make window translucent and always on top
-    root.attributes('-alpha', 0.95)
-    root.attributes('-topmost', True)
-
-    # Colors
-    bg_color = "#2C3E50"
-    text_color = "#ECF0F1"
-    accent_color = "#3498DB"
+    
+    def __init__(self, enabled=False, max_pending=16):
+        """
+        Args:
+            enabled: If True, submitted screenshots are written to disk
+            max_pending: Maximum number of queued batches before new ones are dropped
+        """
+        self.enabled = enabled
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def submit(self, save_dir, files):
+        """
+        Queue a batch of encoded images for writing.
+        
+        Args:
+            save_dir: Directory to write into (created on demand)
+            files: Dict mapping file name to encoded image bytes
+        
+        Returns:
+            save_dir if the batch was queued, None if disabled or the queue is full
+        """
+        if not self.enabled:
+            return None
+        
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((save_dir, files))
+        except queue.Full:
+            logger.logger.warning(f"⚠️  Debug screenshot queue full, dropping {save_dir}")
+            return None
+        return save_dir
+    
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="screenshot-debug-sink", daemon=True
+                )
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            save_dir, files = self._queue.get()
+            try:
+                os.makedirs(save_dir, exist_ok=True)
+                for name, data in files.items():
+                    with open(os.path.join(save_dir, name), "wb") as f:
+                        f.write(data)
+            except Exception as e:
+                logger.log_error(
+                    error_type="debug_screenshot_write_failed",
+                    error_message=str(e),
+                    context={"save_dir": save_dir, "files": list(files)}
+                )
+            finally:
+                self._queue.task_done()
 
-    root.configure(bg=bg_color)
-    content_frame = tk.Frame(root, bg=bg_color, padx=30, pady=20)
-    content_frame.pack(fill=tk.BOTH, expand=True)
 
-    # Title
-    title_font = tkfont.Font(family="Helvetica", size=24, weight="bold")
-    title_label = tk.Label(content_frame, text="🎯 Quiz Time! 🎯",
-                           font=title_font, bg=bg_color, fg=accent_color)
-    title_label.pack(pady=(0, 20))
+# Global debug sink (enabled via SAVE_DEBUG_SCREENSHOTS or --save-screenshots)
+debug_sink = ScreenshotDebugSink(enabled=SAVE_DEBUG_SCREENSHOTS)
 
-    # Quiz text box
-    quiz_font = tkfont.Font(family="Helvetica", size=14)
-    quiz_text_widget = tk.Text(content_frame, font=quiz_font, bg="#34495E",
-                               fg=text_color, wrap=tk.WORD, padx=20, pady=20,
-                               relief=tk.FLAT, highlightthickness=0)
-    quiz_text_widget.pack(fill=tk.BOTH, expand=True, pady=(0, 20))
-    quiz_text_widget.insert(1.0, quiz_text)
-    quiz_text_widget.config(state=tk.DISABLED)
 
-    # Close button
-    def close_window():
-        root.destroy()
+# mss monitor indices. Index 0 is the virtual desktop spanning every display
+# (streamed to the Live session); index 1 is the primary monitor (used for
+# coordinate detection and quizzes).
+VIRTUAL_DESKTOP = 0
+PRIMARY_MONITOR = 1
 
-    button_font = tkfont.Font(family="Helvetica", size=12, weight="bold")
-    close_button = tk.Button(content_frame, text="✖ Close Quiz",
-                             command=close_window, font=button_font,
-                             bg="#E74C3C", fg="white",
-                             activebackground="#C0392B",
-                             activeforeground="white",
-                             relief=tk.FLAT, padx=20, pady=10, cursor="hand2")
-    close_button.pack()
 
-    root.bind('<Escape>', lambda e: close_window())
-    root.mainloop()
+class CapturedFrame:
+    """
+    A single screen grab with its capture metadata.
+    
+    The BGRA pixels are a read-only view over the mss buffer (no copy).
+    Color conversions are computed at most once per frame and shared by
+    every consumer.
+    """
+    
+    __slots__ = ("bgra", "monitor", "monitor_index", "timestamp", "_bgr", "_rgb")
+    
+    def __init__(self, bgra, monitor, monitor_index, timestamp):
+        self.bgra = bgra
+        self.monitor = monitor
+        self.monitor_index = monitor_index
+        self.timestamp = timestamp
+        self._bgr = None
+        self._rgb = None
+    
+    @property
+    def width(self):
+        return self.bgra.shape[1]
+    
+    @property
+    def height(self):
+        return self.bgra.shape[0]
+    
+    @property
+    def age(self):
+        """Seconds since the frame was grabbed."""
+        return time.monotonic() - self.timestamp
+    
+    def bgr(self):
+        """Contiguous, read-only BGR copy for OpenCV consumers (cached)."""
+        if self._bgr is None:
+            bgr = cv2.cvtColor(self.bgra, cv2.COLOR_BGRA2BGR)
+            bgr.flags.writeable = False
+            self._bgr = bgr
+        return self._bgr
+    
+    def rgb(self):
+        """Contiguous, read-only RGB copy for Pillow consumers (cached)."""
+        if self._rgb is None:
+            rgb = cv2.cvtColor(self.bgra, cv2.COLOR_BGRA2RGB)
+            rgb.flags.writeable = False
+            self._rgb = rgb
+        return self._rgb
 
 
-def generate_quiz_from_screen():
+class ScreenCaptureService:
     """
-    Capture the current screen and generate a fun quiz with:
-    - 2 questions about what's visible on screen
-    - 1 fun/creative question for entertainment
-
-    Displays in a translucent modal window if on main thread,
-    otherwise prints to console (safe for async/threaded contexts).
+    Long-lived screen capture service shared by every tool and stream.
+    
+    Replaces the per-call `with mss.mss() as sct` pattern:
+    - One mss handle owned by a dedicated capture thread (mss handles are
+      not thread-safe); every grab runs on that thread, so no handles are
+      left behind on the asyncio or tool worker threads
+    - The most recent frame per monitor, with its timestamp
+    - latest() hands out a recent frame without triggering a new grab
     """
-    import inspect
+    
+    def __init__(self):
+        self.grabs = 0
+        self.reuses = 0
+        self._executor = None
+        self._capture_thread = None
+        self._sct = None
+        self._sct_generation = 0
+        self._frames = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+    
+    def _mark_capture_thread(self):
+        self._capture_thread = threading.get_ident()
+    
+    def _run(self, fn, *args):
+        # Already on the capture thread (e.g. a geometry subscriber): run inline
+        if threading.get_ident() == self._capture_thread:
+            return fn(*args)
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="screen-capture",
+                    initializer=self._mark_capture_thread,
+                )
+            executor = self._executor
+        return executor.submit(fn, *args).result()
+    
+    def _handle(self):
+        # Only called on the capture thread
+        if self._sct is not None and self._sct_generation != self._generation:
+            # mss caches the monitor list per handle; replace it after a
+            # geometry change so grabs use the new layout
+            self._close_handle()
+        if self._sct is None:
+            self._sct = mss.mss()
+            self._sct_generation = self._generation
+        return self._sct
+    
+    def _close_handle(self):
+        sct, self._sct = self._sct, None
+        if sct is not None:
+            try:
+                sct.close()
+            except Exception:
+                pass
+    
+    def reset_layout(self):
+        """Drop buffered frames and renew the mss handle on next use."""
+        with self._lock:
+            self._generation += 1
+            self._frames.clear()
+    
+    def monitors(self):
+        """Return the mss monitor list (index 0 is the virtual desktop)."""
+        return self._run(lambda: [dict(m) for m in self._handle().monitors])
+    
+    def grab(self, monitor_index=PRIMARY_MONITOR):
+        """
+        Grab a new frame and keep it as the monitor's latest frame.
+        
+        Args:
+            monitor_index: mss monitor index (VIRTUAL_DESKTOP or PRIMARY_MONITOR, ...)
+        
+        Returns:
+            CapturedFrame
+        """
+        return self._run(self._grab, monitor_index)
+    
+    def _grab(self, monitor_index):
+        sct = self._handle()
+        monitor = dict(sct.monitors[monitor_index])
+        shot = sct.grab(monitor)
+        
+        # Zero-copy view over the mss buffer
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        bgra.flags.writeable = False
+        frame = CapturedFrame(bgra, monitor, monitor_index, time.monotonic())
+        screen_geometry.observe_frame(frame)
+        
+        with self._lock:
+            self._frames[monitor_index] = frame
+            self.grabs += 1
+        return frame
+    
+    def latest(self, monitor_index=PRIMARY_MONITOR, max_age=None):
+        """
+        Return the most recent frame, grabbing a new one only if needed.
+        
+        Args:
+            monitor_index: mss monitor index
+            max_age: Maximum acceptable frame age in seconds. None accepts any
+                     buffered frame; 0 always grabs.
+        
+        Returns:
+            CapturedFrame
+        """
+        with self._lock:
+            frame = self._frames.get(monitor_index)
+        
+        if frame is not None and (max_age is None or frame.age <= max_age):
+            with self._lock:
+                self.reuses += 1
+            return frame
+        return self.grab(monitor_index)
+    
+    def close(self):
+        """Close the mss handle, stop the capture thread and drop buffered frames."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._frames.clear()
+        if executor is not None:
+            executor.submit(self._close_handle)
+            executor.shutdown(wait=True)
+        self._capture_thread = None
 
-    try:
-        print("[LOG] Starting quiz generation...")
 
-        # Capture screen
-        with mss.mss() as sct:
-            monitor = sct.monitors[1]
-            img = np.array(sct.grab(monitor))
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+# Global capture service. Frames younger than these ages are reused rather
+# than re-grabbed; detection needs a near-live view of the screen.
+screen_capture = ScreenCaptureService()
+DETECTION_FRAME_MAX_AGE = 0.25
+QUIZ_FRAME_MAX_AGE = 1.0
 
-            # Save screenshot
-            save_dir = f"quiz_screens_{int(time.time())}"
-            os.makedirs(save_dir, exist_ok=True)
-            screenshot_path = f"{save_dir}/screen.jpg"
-            cv2.imwrite(screenshot_path, img)
 
-        print(f"[LOG] Screenshot saved at: {screenshot_path}")
+# Screen geometry polling. A background thread compares the logical screen
+# size against the cached layout every GEOMETRY_POLL_INTERVAL seconds; the
+# monitors are only re-enumerated when that check or a capture of an
+# unexpected size says the layout changed.
+GEOMETRY_POLL_INTERVAL = float(os.getenv("GEOMETRY_POLL_INTERVAL", "2.0"))
+GEOMETRY_PROBE_SIZE = 16  # pixels grabbed per monitor to measure its DPI scale
 
-        # Read image for Gemini
-        with open(screenshot_path, "rb") as f:
-            image_bytes = f.read()
 
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("Missing GOOGLE_API_KEY environment variable.")
+class ScreenLayout:
+    """
+    Immutable snapshot of the display configuration.
+    
+    monitors follows mss numbering (index 0 is the virtual desktop, 1 the
+    primary monitor); scales holds the capture pixels per logical point of
+    each monitor (2.0 on Retina, 1.0 on unscaled displays).
+    
+    It also owns the coordinate transforms between the three spaces tools
+    deal with:
+    - capture: pixels of an mss grab of one monitor (what detection measures)
+    - local: logical points relative to that monitor's top-left corner
+    - global: logical points on the virtual desktop (what pynput moves in)
+    """
+    
+    __slots__ = ("monitors", "scales", "logical_size", "version")
+    
+    def __init__(self, monitors, scales, logical_size, version):
+        self.monitors = monitors
+        self.scales = scales
+        self.logical_size = logical_size
+        self.version = version
+    
+    @property
+    def width(self):
+        return self.logical_size[0]
+    
+    @property
+    def height(self):
+        return self.logical_size[1]
+    
+    @property
+    def origin(self):
+        """Top-left corner of the virtual desktop."""
+        return self.monitors[VIRTUAL_DESKTOP]["left"], self.monitors[VIRTUAL_DESKTOP]["top"]
+    
+    def capture_size(self, monitor_index=PRIMARY_MONITOR):
+        """Expected (width, height) in pixels of a capture of one monitor."""
+        monitor = self.monitors[monitor_index]
+        scale = self.scales[monitor_index]
+        return int(round(monitor["width"] * scale)), int(round(monitor["height"] * scale))
+    
+    @property
+    def bounds(self):
+        """(left, top, right, bottom) of the virtual desktop, right/bottom exclusive."""
+        desktop = self.monitors[VIRTUAL_DESKTOP]
+        return (desktop["left"], desktop["top"],
+                desktop["left"] + desktop["width"], desktop["top"] + desktop["height"])
+    
+    def monitor_at(self, x, y):
+        """Index of the monitor containing global point (x, y), or None."""
+        for index in range(1, len(self.monitors)):
+            m = self.monitors[index]
+            if m["left"] <= x < m["left"] + m["width"] and m["top"] <= y < m["top"] + m["height"]:
+                return index
+        return None
+    
+    def contains(self, x, y):
+        """True if global point (x, y) lies on any monitor."""
+        return self.monitor_at(x, y) is not None
+    
+    def capture_to_local(self, monitor_index, x, y):
+        """Capture pixels -> monitor-local logical points."""
+        scale = self.scales[monitor_index]
+        return x / scale, y / scale
+    
+    def local_to_global(self, monitor_index, x, y):
+        """Monitor-local logical points -> global logical points."""
+        monitor = self.monitors[monitor_index]
+        return monitor["left"] + x, monitor["top"] + y
+    
+    def capture_to_global(self, monitor_index, x, y):
+        """Capture pixels of one monitor -> integer global logical points for input."""
+        lx, ly = self.capture_to_local(monitor_index, x, y)
+        gx, gy = self.local_to_global(monitor_index, lx, ly)
+        monitor = self.monitors[monitor_index]
+        # Clamp so rounding never lands just past the monitor's edge
+        gx = min(max(int(round(gx)), monitor["left"]), monitor["left"] + monitor["width"] - 1)
+        gy = min(max(int(round(gy)), monitor["top"]), monitor["top"] + monitor["height"] - 1)
+        return gx, gy
+    
+    def global_to_capture(self, monitor_index, x, y):
+        """Global logical points -> capture pixels of one monitor."""
+        monitor = self.monitors[monitor_index]
+        scale = self.scales[monitor_index]
+        return int(round((x - monitor["left"]) * scale)), int(round((y - monitor["top"]) * scale))
+    
+    def global_to_desktop_capture(self, x, y, frame_width, frame_height):
+        """
+        Global logical points -> pixels of a capture of the whole virtual desktop.
+        
+        The point is mapped through the monitor under it: that monitor's
+        offset inside the desktop capture (from the capture's actual size,
+        not a probe at the desktop corner, which may lie on no monitor) plus
+        the position on the monitor at its own scale.
+        
+        Returns:
+            (x, y) in frame pixels, or None if the point is on no monitor
+        """
+        index = self.monitor_at(x, y)
+        if index is None:
+            return None
+        desktop = self.monitors[VIRTUAL_DESKTOP]
+        monitor = self.monitors[index]
+        scale_x = frame_width / desktop["width"]
+        scale_y = frame_height / desktop["height"]
+        left = (monitor["left"] - desktop["left"]) * scale_x
+        top = (monitor["top"] - desktop["top"]) * scale_y
+        local_x, local_y = self.global_to_capture(index, x, y)
+        return (min(int(round(left + local_x)), frame_width - 1),
+                min(int(round(top + local_y)), frame_height - 1))
+    
+    def same_as(self, other):
+        return (other is not None and self.monitors == other.monitors
+                and self.scales == other.scales and self.logical_size == other.logical_size)
 
-        print("[LOG] Connecting to Gemini API...")
-        quiz_client = genai.Client(api_key=api_key)
 
-        # Generate quiz using Gemini
-        response = quiz_client.models.generate_content(
-            model="models/gemini-2.5-pro",
+class ScreenGeometryService:
+    """
+    Cached monitor layout shared by bounds checks and coordinate mapping.
+    
+    Replaces per-call pyautogui.size() queries. current() returns the cached
+    ScreenLayout without touching the OS. A single "geometry" thread checks
+    the logical screen size every poll_interval seconds (pyautogui's shared
+    display connection, no new mss handle) and re-enumerates the monitors
+    only when it changed, or when invalidate() was called because a capture
+    came back with an unexpected size. DPI scales are re-measured only when
+    the monitor list or logical size changes. Subscribers are called with
+    (old_layout, new_layout) on the geometry thread whenever the layout
+    changes, never from inside a screen grab.
+    """
+    
+    def __init__(self, poll_interval=GEOMETRY_POLL_INTERVAL):
+        """
+        Args:
+            poll_interval: Seconds between logical-size checks
+        """
+        self.poll_interval = poll_interval
+        self.refreshes = 0
+        self.changes = 0
+        self._layout = None
+        self._mismatch = None
+        self._pending = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+    
+    def subscribe(self, callback):
+        """Register callback(old_layout, new_layout), called on every change."""
+        with self._lock:
+            self._listeners.append(callback)
+    
+    def current(self):
+        """Return the cached ScreenLayout (enumerated on first use)."""
+        layout = self._layout
+        if layout is None:
+            layout = self.refresh(reason="startup")
+        self._ensure_poller()
+        return layout
+    
+    def observe_frame(self, frame):
+        """
+        Check a captured frame against the cached layout.
+        
+        Called by ScreenCaptureService for every grab; a size mismatch means
+        the display configuration changed since the last poll. Only flags the
+        geometry thread, so the grab never waits for (or re-enters through)
+        a refresh.
+        """
+        layout = self._layout
+        if layout is None or frame.monitor_index >= len(layout.monitors):
+            return
+        size = (frame.width, frame.height)
+        if size != layout.capture_size(frame.monitor_index):
+            # Refresh once per distinct mismatch, not on every grab
+            mismatch = (layout.version, frame.monitor_index, size)
+            if mismatch != self._mismatch:
+                self._mismatch = mismatch
+                self.invalidate(reason="capture_size")
+    
+    def invalidate(self, reason="manual"):
+        """Ask the geometry thread to re-enumerate the monitors now (non-blocking)."""
+        self._pending = reason
+        self._ensure_poller()
+        self._wake.set()
+    
+    def _ensure_poller(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll, name="geometry", daemon=True)
+                self._thread.start()
+    
+    def _poll(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            reason, self._pending = self._pending, None
+            try:
+                if reason is None:
+                    layout = self._layout
+                    if layout is not None and tuple(pyautogui.size()) == layout.logical_size:
+                        continue
+                    reason = "logical_size"
+                self.refresh(reason)
+            except Exception as e:
+                logger.log_error(
+                    error_type="geometry_poll_failed",
+                    error_message=str(e),
+                    context={"reason": reason}
+                )
+    
+    def refresh(self, reason="manual"):
+        """
+        Re-enumerate the monitors and notify subscribers if anything changed.
+        
+        Opens one short-lived mss handle (mss caches the monitor list per
+        handle, so a long-lived one would never see a new layout); this only
+        happens at startup and after a suspected change.
+        
+        Returns:
+            The up-to-date ScreenLayout
+        """
+        with self._lock:
+            old = self._layout
+            with mss.mss() as sct:
+                monitors = tuple(dict(m) for m in sct.monitors)
+                logical_size = tuple(pyautogui.size())
+                unchanged = old is not None and old.monitors == monitors and old.logical_size == logical_size
+                if unchanged and reason != "capture_size":
+                    scales = old.scales
+                else:
+                    scales = tuple(self._measure_scale(sct, m) for m in monitors)
+            
+            self.refreshes += 1
+            layout = ScreenLayout(monitors, scales, logical_size, (old.version + 1) if old else 1)
+            if layout.same_as(old):
+                return old
+            self._layout = layout
+            listeners = list(self._listeners)
+            if old is not None:
+                self.changes += 1
+        
+        logger.logger.info(
+            f"🖥️ GEOMETRY ({reason}): {len(monitors) - 1} monitor(s), logical {logical_size[0]}x{logical_size[1]}, "
+            f"origin {layout.origin}, scales {', '.join(f'{s:g}' for s in scales[1:])}"
+        )
+        if old is not None:
+            for callback in listeners:
+                try:
+                    callback(old, layout)
+                except Exception as e:
+                    logger.log_error(
+                        error_type="geometry_listener_failed",
+                        error_message=str(e),
+                        context={"version": layout.version}
+                    )
+        return layout
+    
+    @staticmethod
+    def _measure_scale(sct, monitor):
+        """Capture pixels per logical point, from a tiny grab at the monitor's corner."""
+        size = min(GEOMETRY_PROBE_SIZE, monitor["width"], monitor["height"])
+        try:
+            shot = sct.grab({"left": monitor["left"], "top": monitor["top"], "width": size, "height": size})
+            return round(shot.width / size, 3)
+        except Exception:
+            return 1.0
+
+
+# Global geometry service. Grid overlays are sized for one capture geometry,
+# so they are dropped whenever the primary monitor changes.
+screen_geometry = ScreenGeometryService()
+screen_geometry.subscribe(lambda old, new: screen_capture.reset_layout())
+screen_geometry.subscribe(
+    lambda old, new: grid_cache.notify_geometry(*new.capture_size(PRIMARY_MONITOR))
+)
+
+
+def normalize_prompt(prompt):
+    """
+    Normalize an element description for cache lookups.
+    
+    "Click the  Send button!" and "send button" map to the same key.
+    """
+    text = re.sub(r"[^\w\s]", " ", prompt.lower())
+    words = [w for w in text.split() if w not in ("the", "a", "an", "click", "on")]
+    return " ".join(words)
+
+
+def perceptual_hash(gray, hash_size=16):
+    """
+    Difference hash (dHash) of a grayscale image.
+    
+    The image is shrunk to (hash_size + 1) x hash_size and each bit records
+    whether a pixel is brighter than its right neighbour, so the hash is
+    stable under JPEG noise and tiny changes but flips on layout changes.
+    
+    Args:
+        gray: Grayscale numpy array
+        hash_size: Hash edge length; the hash has hash_size**2 bits
+    
+    Returns:
+        int hash
+    """
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def crop_patch(gray, x, y, size):
+    """
+    Crop a size x size patch centred on (x, y), clamped to the image.
+    
+    Returns:
+        (patch, left, top) where (left, top) is the patch origin in gray
+    """
+    h, w = gray.shape[:2]
+    half = size // 2
+    left = min(max(x - half, 0), max(w - size, 0))
+    top = min(max(y - half, 0), max(h - size, 0))
+    return gray[top:top + size, left:left + size].copy(), left, top
+
+
+class DetectionResultCache:
+    """
+    LRU cache of coordinate detection results.
+    
+    Entries are keyed on (normalized prompt, resolution, perceptual hash of
+    the full frame). A lookup accepts any entry for the same prompt and
+    resolution whose hash is within max_hash_distance bits, then verifies it
+    cheaply by template-matching the stored patch in a small window around
+    the cached point before returning it. Entries expire after ttl seconds
+    and the oldest are evicted beyond max_entries.
+    """
+    
+    def __init__(self, max_entries=64, ttl=300.0, max_hash_distance=12,
+                 patch_size=48, search_margin=16, min_match_score=0.9,
+                 min_patch_contrast=8.0):
+        """
+        Args:
+            max_entries: Maximum number of cached results
+            ttl: Seconds before an entry expires
+            max_hash_distance: Maximum Hamming distance between frame hashes
+            patch_size: Edge length of the verification patch in pixels
+            search_margin: Pixels around the cached patch searched during verification
+            min_match_score: Minimum normalized correlation for a verified hit
+            min_patch_contrast: Minimum patch standard deviation worth caching
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_hash_distance = max_hash_distance
+        self.patch_size = patch_size
+        self.search_margin = search_margin
+        self.min_match_score = min_match_score
+        self.min_patch_contrast = min_patch_contrast
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def lookup(self, prompt, gray):
+        """
+        Return a verified cached point for prompt on the current frame.
+        
+        Args:
+            prompt: Element description as passed to detection
+            gray: Grayscale capture of the current screen
+        
+        Returns:
+            dict with 'x', 'y' and 'score', or None on a miss
+        """
+        prompt_key = normalize_prompt(prompt)
+        h, w = gray.shape[:2]
+        frame_hash = perceptual_hash(gray)
+        now = time.monotonic()
+        
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if now - e["created"] > self.ttl]:
+                del self._entries[key]
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if key[:3] == (prompt_key, w, h)
+                and bin(key[3] ^ frame_hash).count("1") <= self.max_hash_distance
+            ]
+        
+        for key, entry in reversed(candidates):
+            point = self._verify(gray, entry)
+            if point is not None:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.hits += 1
+                return point
+            with self._lock:
+                self.rejected += 1
+                self._entries.pop(key, None)
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def store(self, prompt, gray, x, y):
+        """
+        Cache a detection result together with its verification patch.
+        
+        Featureless patches (flat backgrounds) are not cached since they
+        would verify anywhere on the screen.
+        
+        Args:
+            prompt: Element description as passed to detection
+            gray: Grayscale capture the detection ran on
+            x, y: Detected coordinates in capture pixels
+        
+        Returns:
+            bool indicating whether the result was cached
+        """
+        h, w = gray.shape[:2]
+        patch, left, top = crop_patch(gray, x, y, self.patch_size)
+        if patch.size == 0 or float(patch.std()) < self.min_patch_contrast:
+            return False
+        
+        key = (normalize_prompt(prompt), w, h, perceptual_hash(gray))
+        entry = {
+            "x": x,
+            "y": y,
+            "patch": patch,
+            "offset": (x - left, y - top),
+            "created": time.monotonic(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+    
+    def forget(self, prompt):
+        """Drop every cached result for a prompt (e.g. after a wrong click)."""
+        prompt_key = normalize_prompt(prompt)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == prompt_key]:
+                del self._entries[key]
+    
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+    
+    def _verify(self, gray, entry):
+        patch = entry["patch"]
+        ph, pw = patch.shape[:2]
+        h, w = gray.shape[:2]
+        off_x, off_y = entry["offset"]
+        
+        # Search window: the patch's original location plus a margin
+        left = max(entry["x"] - off_x - self.search_margin, 0)
+        top = max(entry["y"] - off_y - self.search_margin, 0)
+        right = min(entry["x"] - off_x + pw + self.search_margin, w)
+        bottom = min(entry["y"] - off_y + ph + self.search_margin, h)
+        window = gray[top:bottom, left:right]
+        if window.shape[0] < ph or window.shape[1] < pw:
+            return None
+        
+        scores = cv2.matchTemplate(window, patch, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+        if score < self.min_match_score:
+            return None
+        return {
+            "x": int(left + best_x + off_x),
+            "y": int(top + best_y + off_y),
+            "score": round(float(score), 3),
+        }
+
+
+# Global detection cache. Repeated requests for the same element on an
+# unchanged screen are answered locally instead of with a Gemini Pro call.
+DETECTION_CACHE_TTL = 300.0
+DETECTION_CACHE_SIZE = 64
+detection_cache = DetectionResultCache(max_entries=DETECTION_CACHE_SIZE, ttl=DETECTION_CACHE_TTL)
+# Cached coordinates are meaningless once the display layout changes
+screen_geometry.subscribe(lambda old, new: detection_cache.clear())
+
+
+class TemplateStore:
+    """
+    Local fast path for re-finding previously detected UI elements.
+    
+    After Gemini locates an element, a patch around the detected point is
+    stored under the normalized prompt. Later requests for the same element
+    first run a multi-scale cv2.matchTemplate search over a downscaled copy
+    of the current capture; Gemini is only called when the best match is
+    weak or ambiguous (e.g. repeated list items), so repeat clicks in the
+    same app resolve locally in tens of milliseconds and work offline.
+    """
+    
+    def __init__(self, max_templates=128, patch_size=64, search_scale=0.5,
+                 scales=(1.0, 0.9, 1.1, 0.8, 1.25), min_score=0.9,
+                 min_peak_margin=0.05, min_patch_contrast=8.0, early_exit_score=0.98):
+        """
+        Args:
+            max_templates: Maximum number of remembered elements (LRU)
+            patch_size: Edge length of the stored patch in pixels
+            search_scale: Downscale factor applied before searching
+            scales: Template scale factors tried during the search
+            min_score: Minimum normalized correlation for a confident match
+            min_peak_margin: Required gap between the best and second-best peak
+            min_patch_contrast: Minimum patch standard deviation worth storing
+            early_exit_score: Stop trying other scales once a match this strong is found
+        """
+        self.max_templates = max_templates
+        self.patch_size = patch_size
+        self.search_scale = search_scale
+        self.scales = scales
+        self.min_score = min_score
+        self.min_peak_margin = min_peak_margin
+        self.min_patch_contrast = min_patch_contrast
+        self.early_exit_score = early_exit_score
+        self.hits = 0
+        self.misses = 0
+        self.low_confidence = 0
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def remember(self, prompt, gray, x, y):
+        """
+        Store the patch around a detected element.
+        
+        Featureless patches (flat backgrounds) are not stored since they
+        would match everywhere.
+        
+        Args:
+            prompt: Element description as passed to detection
+            gray: Grayscale capture the detection ran on
+            x, y: Detected coordinates in capture pixels
+        
+        Returns:
+            bool indicating whether a template was stored
+        """
+        patch, left, top = crop_patch(gray, x, y, self.patch_size)
+        if patch.size == 0 or float(patch.std()) < self.min_patch_contrast:
+            return False
+        
+        key = normalize_prompt(prompt)
+        with self._lock:
+            self._templates[key] = {"patch": patch, "offset": (x - left, y - top)}
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return True
+    
+    def find(self, prompt, gray):
+        """
+        Search the current capture for a remembered element.
+        
+        Args:
+            prompt: Element description as passed to detection
+            gray: Grayscale capture of the current screen
+        
+        Returns:
+            dict with 'x', 'y', 'score' and 'scale', or None if there is no
+            template or the match is not confident
+        """
+        key = normalize_prompt(prompt)
+        with self._lock:
+            entry = self._templates.get(key)
+            if entry is not None:
+                self._templates.move_to_end(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        factor = self.search_scale
+        small = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        
+        best = None
+        for scale in self.scales:
+            template = cv2.resize(
+                entry["patch"], None, fx=factor * scale, fy=factor * scale,
+                interpolation=cv2.INTER_AREA
+            )
+            th, tw = template.shape[:2]
+            if th < 8 or tw < 8 or th > small.shape[0] or tw > small.shape[1]:
+                continue
+            scores = cv2.matchTemplate(small, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, location = cv2.minMaxLoc(scores)
+            if best is None or score > best[0]:
+                best = (score, location, scale, scores, tw, th)
+            if score >= self.early_exit_score:
+                break
+        
+        if best is None or best[0] < self.min_score:
+            with self._lock:
+                self.low_confidence += 1
+            return None
+        
+        score, (match_x, match_y), scale, scores, tw, th = best
+        
+        # Reject ambiguous matches: the runner-up peak outside the best
+        # match must be clearly weaker
+        suppressed = scores.copy()
+        suppressed[max(match_y - th // 2, 0):match_y + th // 2 + 1,
+                   max(match_x - tw // 2, 0):match_x + tw // 2 + 1] = -1.0
+        if suppressed.size and score - float(suppressed.max()) < self.min_peak_margin:
+            with self._lock:
+                self.low_confidence += 1
+            return None
+        
+        # Map the stored point inside the patch back to full-resolution pixels
+        off_x, off_y = entry["offset"]
+        h, w = gray.shape[:2]
+        x = int(round(match_x / factor + off_x * scale))
+        y = int(round(match_y / factor + off_y * scale))
+        with self._lock:
+            self.hits += 1
+        return {
+            "x": min(max(x, 0), w - 1),
+            "y": min(max(y, 0), h - 1),
+            "score": round(float(score), 3),
+            "scale": scale,
+        }
+    
+    def forget(self, prompt):
+        """Drop the template for a prompt (e.g. after a wrong click)."""
+        with self._lock:
+            self._templates.pop(normalize_prompt(prompt), None)
+    
+    def clear(self):
+        """Drop every stored template."""
+        with self._lock:
+            self._templates.clear()
+
+
+# Global template store for the local matchTemplate fast path
+template_store = TemplateStore()
+# Patches were cut at the old resolution/scale and would match at the wrong size
+screen_geometry.subscribe(lambda old, new: template_store.clear())
+
+
+class GenAIClientPool:
+    """
+    Registry of shared genai.Client instances, one per API key.
+    
+    Creating a genai.Client per tool call throws away its HTTP connection
+    pool, so every detection or quiz paid for a fresh TLS handshake. Helper
+    model calls instead fetch a long-lived client from here; the same client
+    serves both the sync API (client.models) and the async API
+    (client.aio.models), keeping connections warm across tool invocations.
+    """
+    
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+    
+    def register(self, client, api_key):
+        """Register an existing client (e.g. the Live session client) for reuse."""
+        with self._lock:
+            self._clients[api_key] = client
+    
+    def get(self, api_key=None):
+        """
+        Return the shared client for api_key, creating it on first use.
+        
+        Args:
+            api_key: Gemini API key (default: GOOGLE_API_KEY from the environment)
+        
+        Raises:
+            ValueError: If no API key is configured
+        """
+        api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("Missing GOOGLE_API_KEY environment variable.")
+        with self._lock:
+            pooled = self._clients.get(api_key)
+            if pooled is None:
+                pooled = self._clients[api_key] = genai.Client(api_key=api_key)
+            return pooled
+
+
+# Shared client pool; the module-level Live session client is reused for
+# helper calls made with the same key
+genai_clients = GenAIClientPool()
+genai_clients.register(client, GOOGLE_API_KEY)
+
+# Model used for coordinate detection
+DETECTION_MODEL = "models/gemini-2.5-pro"
+
+# Hedged detection (DETECTION_HEDGING=true): every detection stage is first
+# sent to HEDGE_FAST_MODEL, which also grades its answer (confidence=0-100,
+# see detection_pipeline.acceptable_detection). If it has not produced an
+# answer graded at least HEDGE_MIN_CONFIDENCE within HEDGE_DELAY seconds, or
+# answers with something unusable, the same request also goes to
+# DETECTION_MODEL; the first acceptable answer wins and the other request is
+# cancelled.
+DETECTION_HEDGING = os.getenv("DETECTION_HEDGING", "false").lower() in ("1", "true", "yes")
+HEDGE_FAST_MODEL = os.getenv("HEDGE_FAST_MODEL", "models/gemini-2.5-flash")
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "1.5"))
+HEDGE_STATS_EVERY = 20  # log win rates every N hedged requests
+
+
+class HedgeStats:
+    """Win counts per model for hedged detection requests."""
+    
+    def __init__(self):
+        self.requests = 0
+        self.hedged = 0        # requests where the slow model was also started
+        self.fast_rejected = 0  # fast answers that were not acceptable
+        self.wins = {}
+        self.no_winner = 0
+        self._lock = threading.Lock()
+    
+    def record(self, winner, hedged, fast_rejected):
+        with self._lock:
+            self.requests += 1
+            self.hedged += hedged
+            self.fast_rejected += fast_rejected
+            if winner is None:
+                self.no_winner += 1
+            else:
+                self.wins[winner] = self.wins.get(winner, 0) + 1
+            if self.requests % HEDGE_STATS_EVERY == 0:
+                logger.logger.info(f"HEDGE: {json.dumps(self.summary())}")
+    
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "fast_rejected": self.fast_rejected,
+            "no_winner": self.no_winner,
+            "win_rates": {
+                model: round(count / self.requests, 3) for model, count in self.wins.items()
+            } if self.requests else {},
+        }
+
+
+hedge_stats = HedgeStats()
+
+# Worker threads for the blocking (sync client) variant of hedging
+hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+
+
+def _acceptable_detection(request, response, model):
+    """True if a response may settle a hedged stage (graded for the fast model)."""
+    min_confidence = HEDGE_MIN_CONFIDENCE if model == HEDGE_FAST_MODEL else None
+    try:
+        return acceptable_detection(request, response.text or "", min_confidence)
+    except Exception:
+        return False
+
+
+class HedgeRace:
+    """
+    Bookkeeping for one hedged detection stage.
+    
+    The async and the blocking path each run their own wait loop (asyncio
+    tasks vs. hedge_executor futures); every decision - which contents a
+    model gets, whether an answer wins, when the slow model joins, what is
+    returned when nothing wins - lives here, so the two cannot drift apart.
+    """
+    
+    def __init__(self, request):
+        self.request = request
+        self.hedged = False
+        self.fast_rejected = False
+        self.fallback = self.fallback_model = None
+        self.last_error = None
+    
+    def contents(self, model):
+        """The fast model gets the graded prompt, the slow one the plain prompt."""
+        return self.request["hedge_contents"] if model == HEDGE_FAST_MODEL else self.request["contents"]
+    
+    def timeout(self, now, hedge_at):
+        """Seconds to wait before the slow model must join (None once it has)."""
+        return None if self.hedged else max(0.0, hedge_at - now)
+    
+    def offer(self, model, finished):
+        """
+        Judge a finished call (a done task or future).
+        
+        Returns:
+            The winning response, or None to keep waiting
+        """
+        try:
+            response = finished.result()
+        except Exception as e:
+            self.last_error = e
+            return None
+        if _acceptable_detection(self.request, response, model):
+            hedge_stats.record(model, self.hedged, self.fast_rejected)
+            self.request["stats"].setdefault("models", []).append(model)
+            return response
+        self.fast_rejected = self.fast_rejected or model == HEDGE_FAST_MODEL
+        self.fallback, self.fallback_model = response, model
+        return None
+    
+    def hedge(self):
+        """The slow model to start now (delay elapsed or fast answer unusable), or None if started."""
+        if self.hedged:
+            return None
+        self.hedged = True
+        return self.request["model"]
+    
+    def finish(self):
+        """
+        Returns:
+            The last response received when neither was acceptable. Raises
+            the last API error if every request failed.
+        """
+        hedge_stats.record(None, self.hedged, self.fast_rejected)
+        if self.fallback is not None:
+            self.request["stats"].setdefault("models", []).append(self.fallback_model)
+            return self.fallback
+        raise self.last_error
+
+
+async def _generate_detection_async(request):
+    """
+    Send one detection stage to Gemini (async client), hedged if enabled.
+    
+    Returns:
+        The model response; with hedging, the one chosen by HedgeRace
+    """
+    models = genai_clients.get().aio.models
+    if not DETECTION_HEDGING:
+        request["stats"].setdefault("models", []).append(request["model"])
+        return await models.generate_content(model=request["model"], contents=request["contents"])
+    
+    race = HedgeRace(request)
+    
+    def launch(model):
+        return asyncio.create_task(models.generate_content(model=model, contents=race.contents(model)))
+    
+    loop = asyncio.get_running_loop()
+    pending = {launch(HEDGE_FAST_MODEL): HEDGE_FAST_MODEL}
+    hedge_at = loop.time() + HEDGE_DELAY
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=race.timeout(loop.time(), hedge_at),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                response = race.offer(pending.pop(task), task)
+                if response is not None:
+                    return response
+            slow = race.hedge()
+            if slow:
+                pending[launch(slow)] = slow
+    finally:
+        for task in pending:
+            task.cancel()
+    return race.finish()
+
+
+def _generate_detection_sync(request):
+    """
+    Blocking counterpart of _generate_detection_async for worker threads.
+    
+    Without hedging the sync client is called directly on the calling
+    thread. With hedging both calls run on hedge_executor threads and are
+    raced with concurrent.futures.wait. A sync call cannot be aborted: a
+    losing request keeps its hedge worker until it returns, and its result
+    is discarded.
+    """
+    models = genai_clients.get().models
+    if not DETECTION_HEDGING:
+        request["stats"].setdefault("models", []).append(request["model"])
+        return models.generate_content(model=request["model"], contents=request["contents"])
+    
+    race = HedgeRace(request)
+    
+    def launch(model):
+        return hedge_executor.submit(models.generate_content, model=model, contents=race.contents(model))
+    
+    pending = {launch(HEDGE_FAST_MODEL): HEDGE_FAST_MODEL}
+    hedge_at = time.monotonic() + HEDGE_DELAY
+    try:
+        while pending:
+            done, _ = concurrent.futures.wait(pending, timeout=race.timeout(time.monotonic(), hedge_at),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                response = race.offer(pending.pop(future), future)
+                if response is not None:
+                    return response
+            slow = race.hedge()
+            if slow:
+                pending[launch(slow)] = slow
+    finally:
+        for future in pending:
+            future.cancel()
+    return race.finish()
+
+
+def show_quiz_modal(quiz_text):
+    """
+    Display quiz in a translucent modal window that can be closed.
+    Must be called from the main thread (macOS requirement).
+    """
+    import tkinter as tk
+    from tkinter import font as tkfont
+
+    # Create the main window
+    root = tk.Tk()
+    root.title("🎯 Quiz Time!")
+
+    # Get screen dimensions
+    screen_width = root.winfo_screenwidth()
+    screen_height = root.winfo_screenheight()
+
+    # Set window size (60% of screen)
+    window_width = int(screen_width * 0.6)
+    window_height = int(screen_height * 0.6)
+
+    # Center window
+    x = (screen_width - window_width) // 2
+    y = (screen_height - window_height) // 2
+    root.geometry(f"{window_width}x{window_height}+{x}+{y}")
+
+    # Make window translucent and always on top
+    root.attributes('-alpha', 0.95)
+    root.attributes('-topmost', True)
+
+    # Colors
+    bg_color = "#2C3E50"
+    text_color = "#ECF0F1"
+    accent_color = "#3498DB"
+
+    root.configure(bg=bg_color)
+    content_frame = tk.Frame(root, bg=bg_color, padx=30, pady=20)
+    content_frame.pack(fill=tk.BOTH, expand=True)
+
+    # Title
+    title_font = tkfont.Font(family="Helvetica", size=24, weight="bold")
+    title_label = tk.Label(content_frame, text="🎯 Quiz Time! 🎯",
+                           font=title_font, bg=bg_color, fg=accent_color)
+    title_label.pack(pady=(0, 20))
+
+    # Quiz text box
+    quiz_font = tkfont.Font(family="Helvetica", size=14)
+    quiz_text_widget = tk.Text(content_frame, font=quiz_font, bg="#34495E",
+                               fg=text_color, wrap=tk.WORD, padx=20, pady=20,
+                               relief=tk.FLAT, highlightthickness=0)
+    quiz_text_widget.pack(fill=tk.BOTH, expand=True, pady=(0, 20))
+    quiz_text_widget.insert(1.0, quiz_text)
+    quiz_text_widget.config(state=tk.DISABLED)
+
+    # Close button
+    def close_window():
+        root.destroy()
+
+    button_font = tkfont.Font(family="Helvetica", size=12, weight="bold")
+    close_button = tk.Button(content_frame, text="✖ Close Quiz",
+                             command=close_window, font=button_font,
+                             bg="#E74C3C", fg="white",
+                             activebackground="#C0392B",
+                             activeforeground="white",
+                             relief=tk.FLAT, padx=20, pady=10, cursor="hand2")
+    close_button.pack()
+
+    root.bind('<Escape>', lambda e: close_window())
+    root.mainloop()
+
+
+def generate_quiz_from_screen():
+    """
+    Capture the current screen and generate a fun quiz with:
+    - 2 questions about what's visible on screen
+    - 1 fun/creative question for entertainment
+
+    Displays in a translucent modal window if on main thread,
+    otherwise prints to console (safe for async/threaded contexts).
+    """
+    import inspect
+
+    try:
+        print("[LOG] Starting quiz generation...")
+
+        # Capture screen (reuses a frame grabbed within the last second)
+        img = screen_capture.latest(PRIMARY_MONITOR, max_age=QUIZ_FRAME_MAX_AGE).bgr()
+
+        # Encode in memory; disk copy only if the debug sink is enabled
+        image_bytes = encode_jpeg(img)
+        screenshot_path = None
+        save_dir = debug_sink.submit(f"quiz_screens_{int(time.time())}", {"screen.jpg": image_bytes})
+        if save_dir:
+            screenshot_path = f"{save_dir}/screen.jpg"
+            print(f"[LOG] Screenshot queued for saving at: {screenshot_path}")
+
+        print("[LOG] Connecting to Gemini API...")
+        quiz_client = genai_clients.get()
+
+        # Generate quiz using Gemini
+        response = quiz_client.models.generate_content(
+            model="models/gemini-2.5-pro",
             contents=[
                 types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
                 types.Part.from_text(
@@ -585,353 +1952,466 @@ Make the questions engaging and fun!"""
         print(traceback.format_exc())
         return {"error": f"Failed to generate quiz: {str(e)}"}
 
-def smart_detect_screen_coordinates(prompt):
+
+def _prepare_detection_request(prompt, frame=None, layout=None, profile=None, mode=None):
     """
-    Enhanced coordinate detection with finer grid and robust parsing.
-    Captures multiple grid perspectives (10px fine, 50px coarse, pure grid)
-    and uses robust coordinate parsing with validation.
+    Capture the screen and build the Gemini request for coordinate detection.
     
-    Returns: dict with 'x', 'y' coordinates or 'error' message with suggestions
+    All CPU work (capture, local fast paths, grid rendering, encoding) happens
+    here so the sync and async detection paths share it.
+    
+    Args:
+        prompt: Description of the UI element to find
+        frame: CapturedFrame to use instead of grabbing the primary monitor
+            (the offline benchmark passes corpus screenshots)
+        layout: ScreenLayout matching frame (default: the cached layout)
+        profile, mode: DETECTION_PROFILE / DETECTION_MODE overrides
+    
+    Returns:
+        (result, request): result is a finished response dict (error or local
+        hit) and request is None, or result is None and request holds the
+        'contents' to send plus the context needed to finish detection
     """
-    import os
-    import time
-    import cv2
-    import numpy as np
-    import re
-    from google import genai
-    from google.genai import types
+    # === Setup ===
+    started = time.perf_counter()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        error_msg = "Google API key is not configured"
+        logger.log_error(
+            error_type="configuration_error",
+            error_message=error_msg,
+            context={"function": "smart_detect_screen_coordinates", "prompt": prompt}
+        )
+        return {
+            "error": error_msg,
+            "user_message": "❌ API key not found. Please set GOOGLE_API_KEY environment variable.",
+            "suggestion": "Check your .env file or environment variables to ensure GOOGLE_API_KEY is set correctly."
+        }, None
 
+    # === Capture Screen ===
     try:
-        # === Setup ===
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            error_msg = "Google API key is not configured"
-            logger.log_error(
-                error_type="configuration_error",
-                error_message=error_msg,
-                context={"function": "smart_detect_screen_coordinates", "prompt": prompt}
-            )
-            return {
-                "error": error_msg,
-                "user_message": "❌ API key not found. Please set GOOGLE_API_KEY environment variable.",
-                "suggestion": "Check your .env file or environment variables to ensure GOOGLE_API_KEY is set correctly."
-            }
-
-        client = genai.Client(api_key=api_key)
-        save_dir = f"screens_{int(time.time())}"
-        os.makedirs(save_dir, exist_ok=True)
-
-        # === Capture Screen ===
-        try:
-            with mss.mss() as sct:
-                monitor = sct.monitors[1]  # Full primary screen
-                img = np.array(sct.grab(monitor))
-                img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        except Exception as screen_error:
-            error_msg = f"Screen capture failed: {str(screen_error)}"
-            logger.log_error(
-                error_type="screen_capture_failed",
-                error_message=error_msg,
-                context={"function": "smart_detect_screen_coordinates", "prompt": prompt}
-            )
-            return {
-                "error": error_msg,
-                "user_message": "❌ Unable to capture screen. Please check screen recording permissions.",
-                "suggestion": "On macOS: System Settings → Privacy & Security → Screen Recording → Enable for your terminal/IDE"
-            }
-            
-        height, width, _ = img.shape
+        if frame is None:
+            frame = screen_capture.latest(PRIMARY_MONITOR, max_age=DETECTION_FRAME_MAX_AGE)
+        img = frame.bgr()
+    except Exception as screen_error:
+        error_msg = f"Screen capture failed: {str(screen_error)}"
+        logger.log_error(
+            error_type="screen_capture_failed",
+            error_message=error_msg,
+            context={"function": "smart_detect_screen_coordinates", "prompt": prompt}
+        )
+        return {
+            "error": error_msg,
+            "user_message": "❌ Unable to capture screen. Please check screen recording permissions.",
+            "suggestion": "On macOS: System Settings → Privacy & Security → Screen Recording → Enable for your terminal/IDE"
+        }, None
         
-        # Save original
-        original_path = f"{save_dir}/screen_original.jpg"
-        cv2.imwrite(original_path, img)
+    height, width, _ = img.shape
+
+    # === Local fast paths: cached result, then template search ===
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    local = detection_cache.lookup(prompt, gray)
+    source = "cache"
+    if local is None:
+        local = template_store.find(prompt, gray)
+        source = "template"
+        if local is not None:
+            detection_cache.store(prompt, gray, local["x"], local["y"])
+    
+    # Every result of this detection maps through the layout of this capture
+    layout = layout or screen_geometry.current()
+    if local is not None:
+        # Caches work in capture pixels; tools move in global logical points
+        x, y = layout.capture_to_global(PRIMARY_MONITOR, local["x"], local["y"])
+        logger.logger.info(
+            f"✅ Found '{prompt}' at ({x}, {y}) via {source} (match score {local['score']})"
+        )
+        return {
+            "x": x,
+            "y": y,
+            "result": f"Found '{prompt}' at coordinates x={x}, y={y}",
+            "screen_width": layout.width,
+            "screen_height": layout.height,
+            "screenshot_dir": None,
+            "source": source
+        }, None
+
+    # === Build the model request (DETECTION_MODE / DETECTION_PROFILE) ===
+    request = build_detection_request(prompt, img, started=started, profile=profile, mode=mode)
+    request["gray"] = gray
+    request["layout"] = layout
+    request["save_dir"] = debug_sink.submit(f"screens_{int(time.time())}", {
+        name: data for name, _, data in request["images"]
+    })
+    if request["save_dir"]:
+        print(f"📸 Debug screenshots queued for saving in: {request['save_dir']}")
+    return None, _with_genai_contents(request)
+
+
+def _with_genai_contents(request):
+    """Attach the Gemini model name and content parts to a pipeline request."""
+    request["model"] = DETECTION_MODEL
+    request["contents"] = [
+        types.Part.from_bytes(data=data, mime_type="image/jpeg")
+        for _, _, data in request["images"]
+    ]
+    request["contents"].append(types.Part.from_text(text=request["text"]))
+    if DETECTION_HEDGING:
+        request["hedge_contents"] = request["contents"][:-1] + [
+            types.Part.from_text(text=confidence_prompt(request["text"], request["prompt"]))
+        ]
+    return request
 
-        def draw_grid(base_img, step, color=(90, 90, 90), label_color=(255, 255, 255)):
-            """Draws grid lines and coordinate labels."""
-            result = base_img.copy()
-            h, w, _ = result.shape
-            
-            # Draw vertical lines
-            for x in range(0, w, step):
-                cv2.line(result, (x, 0), (x, h), color, 1)
-                # Label at top and bottom
-                cv2.putText(result, str(x), (x + 2, 15),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, label_color, 1)
-                cv2.putText(result, str(x), (x + 2, h - 5),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, label_color, 1)
-            
-            # Draw horizontal lines
-            for y in range(0, h, step):
-                cv2.line(result, (0, y), (w, y), color, 1)
-                # Label at left and right
-                cv2.putText(result, str(y), (5, y + 12),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, label_color, 1)
-                cv2.putText(result, str(y), (w - 40, y + 12),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, label_color, 1)
-            
-            return result
 
-        # === Create Multiple Grid Images ===
-        
-        # 1. Fine grid (10px) - for precision
-        fine_grid_path = f"{save_dir}/screen_fine_grid_10px.jpg"
-        fine_grid = draw_grid(img, step=10, color=(70, 70, 70))
-        cv2.imwrite(fine_grid_path, fine_grid)
-        
-        # 2. Coarse grid (50px) - for context
-        coarse_grid_path = f"{save_dir}/screen_coarse_grid_50px.jpg"
-        coarse_grid = draw_grid(img, step=50, color=(100, 100, 100))
-        cv2.imwrite(coarse_grid_path, coarse_grid)
-        
-        # 3. Pure grid only (10px on white background)
-        pure_grid_path = f"{save_dir}/grid_pure_10px.jpg"
-        pure_grid = np.ones_like(img, dtype=np.uint8) * 255
-        pure_grid = draw_grid(pure_grid, step=10, color=(0, 0, 0), label_color=(0, 0, 0))
-        cv2.imwrite(pure_grid_path, pure_grid)
-
-        print(f"📸 Saved images:")
-        print(f"  • Original: {original_path}")
-        print(f"  • Fine grid (10px): {fine_grid_path}")
-        print(f"  • Coarse grid (50px): {coarse_grid_path}")
-        print(f"  • Pure grid: {pure_grid_path}")
-
-        # === Send to Gemini with Enhanced Prompt ===
-        with open(original_path, "rb") as f1, \
-             open(fine_grid_path, "rb") as f2, \
-             open(coarse_grid_path, "rb") as f3, \
-             open(pure_grid_path, "rb") as f4:
-            original_bytes = f1.read()
-            fine_grid_bytes = f2.read()
-            coarse_grid_bytes = f3.read()
-            pure_grid_bytes = f4.read()
-
-        enhanced_prompt = f"""Analyze these images to find the EXACT coordinates of: "{prompt}"
-
-Images provided:
-1. Original screen (no grid)
-2. Fine grid overlay (10px spacing) - use this for PRECISE coordinate detection
-3. Coarse grid overlay (50px spacing) - use this for general location context
-4. Pure grid reference (10px) - use this to understand the coordinate system
-
-INSTRUCTIONS:
-- Locate the CENTER POINT of the target element "{prompt}"
-- Use the 10px fine grid for maximum precision
-- Read the coordinate labels on the grid axes carefully
-- The screen dimensions are {width}x{height} pixels
-
-RESPONSE FORMAT (CRITICAL):
-You MUST respond with coordinates in this EXACT format:
-x=NUMBER, y=NUMBER
-
-Example: x=450, y=320
-
-Do not include any other text, explanations, or formatting. Just the coordinates."""
-
-        # === Send to Gemini with Enhanced Prompt ===
-        try:
-            response = client.models.generate_content(
-                model="models/gemini-2.5-pro",
-                contents=[
-                    types.Part.from_bytes(data=original_bytes, mime_type="image/jpeg"),
-                    types.Part.from_bytes(data=fine_grid_bytes, mime_type="image/jpeg"),
-                    types.Part.from_bytes(data=coarse_grid_bytes, mime_type="image/jpeg"),
-                    types.Part.from_bytes(data=pure_grid_bytes, mime_type="image/jpeg"),
-                    types.Part.from_text(text=enhanced_prompt)
-                ]
-            )
-        except Exception as api_error:
-            error_msg = f"Gemini API call failed: {str(api_error)}"
-            logger.log_error(
-                error_type="api_call_failed",
-                error_message=error_msg,
-                context={
-                    "function": "smart_detect_screen_coordinates",
-                    "prompt": prompt,
-                    "error_type": type(api_error).__name__
-                }
-            )
-            
-            # Provide user-friendly error messages for common API errors
-            if "quota" in str(api_error).lower() or "rate limit" in str(api_error).lower():
-                return {
-                    "error": error_msg,
-                    "user_message": "❌ API quota exceeded or rate limit reached.",
-                    "suggestion": "Wait a few moments and try again. Consider upgrading your API plan if this happens frequently."
-                }
-            elif "timeout" in str(api_error).lower():
-                return {
-                    "error": error_msg,
-                    "user_message": "❌ API request timed out.",
-                    "suggestion": "Check your internet connection and try again. The retry mechanism will automatically attempt this."
-                }
-            elif "authentication" in str(api_error).lower() or "unauthorized" in str(api_error).lower():
-                return {
-                    "error": error_msg,
-                    "user_message": "❌ API authentication failed.",
-                    "suggestion": "Verify your GOOGLE_API_KEY is valid and has the necessary permissions."
-                }
-            else:
-                return {
-                    "error": error_msg,
-                    "user_message": f"❌ API error: {str(api_error)}",
-                    "suggestion": "Try again in a moment. If the problem persists, check the Gemini API status."
-                }
+def _detection_api_error(prompt, api_error):
+    """
+    Build the user-facing error dict for a failed Gemini call.
+    
+    The dict also carries the retry classification ("error_class",
+    "retryable", "retry_after") used by smart_detect_screen_coordinates_with_retry.
+    """
+    error_msg = f"Gemini API call failed: {str(api_error)}"
+    error_class = classify_error(api_error)
+    logger.log_error(
+        error_type="api_call_failed",
+        error_message=error_msg,
+        context={
+            "function": "smart_detect_screen_coordinates",
+            "prompt": prompt,
+            "error_type": type(api_error).__name__,
+            "error_class": error_class
+        }
+    )
+    retry = {
+        "error_class": error_class,
+        "retryable": error_class in RETRYABLE_ERROR_CLASSES,
+        "retry_after": retry_after_hint(api_error),
+    }
+    
+    # Provide user-friendly error messages for common API errors
+    if error_class == "rate_limit":
+        return {
+            "error": error_msg,
+            "user_message": "❌ API quota exceeded or rate limit reached.",
+            "suggestion": "Wait a few moments and try again. Consider upgrading your API plan if this happens frequently.",
+            **retry
+        }
+    elif error_class == "timeout":
+        return {
+            "error": error_msg,
+            "user_message": "❌ API request timed out.",
+            "suggestion": "Check your internet connection and try again. The retry mechanism will automatically attempt this.",
+            **retry
+        }
+    elif error_class == "auth":
+        return {
+            "error": error_msg,
+            "user_message": "❌ API authentication failed.",
+            "suggestion": "Verify your GOOGLE_API_KEY is valid and has the necessary permissions.",
+            **retry
+        }
+    else:
+        return {
+            "error": error_msg,
+            "user_message": f"❌ API error: {str(api_error)}",
+            "suggestion": "Try again in a moment. If the problem persists, check the Gemini API status.",
+            **retry
+        }
 
-        try:
-            text = response.text.strip()
-            print(f"🔍 Model output: {text}")
-        except Exception as response_error:
-            error_msg = f"Failed to extract text from API response: {str(response_error)}"
-            logger.log_error(
-                error_type="response_parsing_failed",
-                error_message=error_msg,
-                context={"function": "smart_detect_screen_coordinates", "prompt": prompt}
-            )
-            return {
-                "error": error_msg,
-                "user_message": "❌ Received invalid response from API.",
-                "suggestion": "Try again with a more specific description of the element you're looking for."
-            }
 
-        # === Robust Coordinate Parsing ===
-        x, y = None, None
-        
-        # Try multiple regex patterns
-        patterns = [
-            r'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)',  # x=123, y=456
-            r'x\s*:\s*(\d+)\s*,\s*y\s*:\s*(\d+)',  # x:123, y:456
-            r'\((\d+)\s*,\s*(\d+)\)',               # (123, 456)
-            r'(\d+)\s*,\s*(\d+)',                   # 123, 456
-            r'x\s*=\s*(\d+).*y\s*=\s*(\d+)',       # x=123 ... y=456
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                x, y = int(match.group(1)), int(match.group(2))
-                print(f"✅ Parsed coordinates: x={x}, y={y}")
-                break
-        
-        if x is None or y is None:
-            error_msg = f"Could not parse coordinates from response: {text}"
-            logger.log_error(
-                error_type="coordinate_parsing_failed",
-                error_message=error_msg,
-                context={
-                    "function": "smart_detect_screen_coordinates",
-                    "prompt": prompt,
-                    "raw_response": text
-                }
-            )
-            
-            # Check if the AI couldn't find the element
-            if any(word in text.lower() for word in ["cannot", "can't", "unable", "not found", "don't see", "couldn't"]):
-                return {
-                    "error": error_msg,
-                    "user_message": f"❌ Could not locate '{prompt}' on screen.",
-                    "suggestion": "Try:\n  • Being more specific (e.g., 'blue Submit button in top-right corner')\n  • Describing visual features (color, size, text)\n  • Mentioning nearby elements for context\n  • Checking if the element is actually visible on screen",
-                    "raw_response": text
-                }
-            else:
-                return {
-                    "error": error_msg,
-                    "user_message": "❌ AI response did not contain valid coordinates.",
-                    "suggestion": "The AI may have misunderstood. Try rephrasing your description to be more specific about what you want to click.",
-                    "raw_response": text
-                }
-        
-        # === Coordinate Validation ===
-        if x < 0 or x >= width or y < 0 or y >= height:
-            error_msg = f"Coordinates ({x}, {y}) are out of screen bounds (0-{width}, 0-{height})"
-            logger.log_error(
-                error_type="coordinates_out_of_bounds",
-                error_message=error_msg,
-                context={
-                    "function": "smart_detect_screen_coordinates",
-                    "prompt": prompt,
-                    "x": x,
-                    "y": y,
-                    "screen_width": width,
-                    "screen_height": height
-                }
-            )
-            return {
-                "error": error_msg,
-                "user_message": f"❌ Detected coordinates ({x}, {y}) are outside screen bounds.",
-                "suggestion": "This is unusual. Try again with a clearer description. The element might be partially off-screen.",
+def _advance_detection(request, response):
+    """
+    Consume the model response for one detection stage.
+    
+    The stage logic itself (parsing, coarse -> fine chaining, mapping back
+    to capture pixels) is detection_pipeline.advance_detection, shared with
+    the offline benchmark; this adds token accounting, debug output and the
+    user-facing result.
+    
+    Returns:
+        (result, next_request): the final result dict and None, or None and
+        the request for the next stage (coarse roi stage -> fine stage)
+    """
+    prompt = request["prompt"]
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "prompt_token_count", None):
+        request["stats"]["prompt_tokens"] += usage.prompt_token_count
+    
+    try:
+        text = response.text.strip()
+        print(f"🔍 Model output: {text}")
+    except Exception as response_error:
+        error_msg = f"Failed to extract text from API response: {str(response_error)}"
+        logger.log_error(
+            error_type="response_parsing_failed",
+            error_message=error_msg,
+            context={"function": "smart_detect_screen_coordinates", "prompt": prompt}
+        )
+        return {
+            "error": error_msg,
+            "user_message": "❌ Received invalid response from API.",
+            "suggestion": "Try again with a more specific description of the element you're looking for."
+        }, None
+    
+    outcome, fine = advance_detection(request, text)
+    if fine is not None:
+        fine["gray"] = request["gray"]
+        fine["layout"] = request["layout"]
+        fine["save_dir"] = request["save_dir"]
+        if fine["save_dir"]:
+            debug_sink.submit(fine["save_dir"], {name: data for name, _, data in fine["images"]})
+        return None, _with_genai_contents(fine)
+    return _finish_detection(request, outcome), None
+
+
+def _detection_failure(request, outcome):
+    """Build the error dict for an answer without usable coordinates."""
+    prompt = request["prompt"]
+    text = outcome["text"]
+    
+    if outcome["failure"] == "out_of_bounds":
+        x, y = outcome["coordinates"]
+        # Screen size in global logical points, like every other result
+        layout = request["layout"]
+        width, height = layout.width, layout.height
+        image_width, image_height = request["image_width"], request["image_height"]
+        error_msg = f"Coordinates ({x}, {y}) are out of image bounds (0-{image_width}, 0-{image_height})"
+        logger.log_error(
+            error_type="coordinates_out_of_bounds",
+            error_message=error_msg,
+            context={
+                "function": "smart_detect_screen_coordinates",
+                "prompt": prompt,
                 "x": x,
                 "y": y,
                 "screen_width": width,
                 "screen_height": height
             }
-        
-        # === Success! ===
-        logger.logger.info(f"✅ Successfully detected '{prompt}' at ({x}, {y})")
+        )
         return {
+            "error": error_msg,
+            "user_message": f"❌ Detected coordinates ({x}, {y}) are outside screen bounds.",
+            "suggestion": "This is unusual. Try again with a clearer description. The element might be partially off-screen.",
             "x": x,
             "y": y,
-            "result": f"Found '{prompt}' at coordinates x={x}, y={y}",
             "screen_width": width,
-            "screen_height": height,
-            "screenshot_dir": save_dir
+            "screen_height": height
+        }
+    
+    error_msg = f"Could not parse coordinates from response: {text}"
+    logger.log_error(
+        error_type="coordinate_parsing_failed",
+        error_message=error_msg,
+        context={
+            "function": "smart_detect_screen_coordinates",
+            "prompt": prompt,
+            "raw_response": text
+        }
+    )
+    
+    # Check if the AI couldn't find the element
+    if outcome["failure"] == "not_found":
+        return {
+            "error": error_msg,
+            "user_message": f"❌ Could not locate '{prompt}' on screen.",
+            "suggestion": "Try:\n  • Being more specific (e.g., 'blue Submit button in top-right corner')\n  • Describing visual features (color, size, text)\n  • Mentioning nearby elements for context\n  • Checking if the element is actually visible on screen",
+            "raw_response": text
         }
+    return {
+        "error": error_msg,
+        "user_message": "❌ AI response did not contain valid coordinates.",
+        "suggestion": "The AI may have misunderstood. Try rephrasing your description to be more specific about what you want to click.",
+        "raw_response": text
+    }
+
+
+def _finish_detection(request, outcome):
+    """
+    Turn the final stage's outcome into the tool result.
+    
+    The point from detection_pipeline is in capture pixels (already mapped
+    back from a scaled or cropped model image). On success the result is
+    also stored in the detection cache and the template store for the local
+    fast paths.
+    """
+    if "failure" in outcome:
+        return _detection_failure(request, outcome)
+    
+    prompt = request["prompt"]
+    print(f"✅ Parsed coordinates: x={outcome['coordinates'][0]}, y={outcome['coordinates'][1]}")
+    
+    # Map capture pixels to the global logical points the mouse tools use
+    capture_x, capture_y = outcome["point"]
+    layout = request["layout"]
+    x, y = layout.capture_to_global(PRIMARY_MONITOR, capture_x, capture_y)
+    
+    # === Success! ===
+    stats = request["stats"]
+    latency_ms = round((time.perf_counter() - stats["started"]) * 1000, 1)
+    logger.logger.info(f"✅ Successfully detected '{prompt}' at ({x}, {y})")
+    logger.logger.info(
+        f"DETECTION_STATS: mode={stats['mode']} profile={stats['profile']} upload_bytes={stats['upload_bytes']} "
+        f"prompt_tokens={stats['prompt_tokens']} model_calls={stats['model_calls']} "
+        f"models={','.join(stats.get('models', []))} latency_ms={latency_ms} "
+        f"grid_ms={stats['timings']['grid_ms']:.1f} encode_ms={stats['timings']['encode_ms']:.1f}"
+    )
+    detection_cache.store(prompt, request["gray"], capture_x, capture_y)
+    template_store.remember(prompt, request["gray"], capture_x, capture_y)
+    return {
+        "x": x,
+        "y": y,
+        "result": f"Found '{prompt}' at coordinates x={x}, y={y}",
+        "screen_width": layout.width,
+        "screen_height": layout.height,
+        "screenshot_dir": request["save_dir"],
+        "source": "model",
+        "mode": stats["mode"],
+        "profile": stats["profile"],
+        "upload_bytes": stats["upload_bytes"],
+        "models": stats.get("models", []),
+        "latency_ms": latency_ms
+    }
+
+
+def _detection_unexpected_error(prompt, e):
+    """Build the catch-all error dict for unexpected detection failures."""
+    error_msg = f"Unexpected error during coordinate detection: {str(e)}"
+    logger.log_error(
+        error_type="coordinate_detection_unexpected_error",
+        error_message=error_msg,
+        context={
+            "function": "smart_detect_screen_coordinates",
+            "prompt": prompt,
+            "error_type": type(e).__name__,
+            "traceback": traceback.format_exc()
+        }
+    )
+    return {
+        "error": error_msg,
+        "user_message": f"❌ Unexpected error: {str(e)}",
+        "suggestion": "This is an unexpected error. Try again, and if it persists, check the logs for details.",
+        "prompt": prompt,
+        "error_class": classify_error(e)
+    }
+
+
+def smart_detect_screen_coordinates(prompt):
+    """
+    Enhanced coordinate detection with finer grid and robust parsing.
+    Sends the screen with grid overlays selected by DETECTION_PROFILE
+    (minimal, balanced, max_accuracy) and uses robust coordinate parsing
+    with validation.
+    
+    On large screens (see DETECTION_MODE) the model is asked twice: once on a
+    downscaled overview for the rough region, then on a zoomed crop of that
+    region; the result is mapped back to screen coordinates.
+    
+    Uses the pooled Gemini client; blocks the calling thread for the model
+    call. See smart_detect_screen_coordinates_async for the awaitable variant.
+    
+    Returns: dict with 'x', 'y' coordinates or 'error' message with suggestions
+    """
+    try:
+        result, request = _prepare_detection_request(prompt)
+        if result is not None:
+            return result
+
+        # === Send to Gemini (one call, or coarse then fine in roi mode) ===
+        while request is not None:
+            try:
+                response = _generate_detection_sync(request)
+            except Exception as api_error:
+                return _detection_api_error(prompt, api_error)
+            result, request = _advance_detection(request, response)
+
+        return result
         
     except Exception as e:
         # Catch-all for any unexpected errors
-        error_msg = f"Unexpected error during coordinate detection: {str(e)}"
-        logger.log_error(
-            error_type="coordinate_detection_unexpected_error",
-            error_message=error_msg,
-            context={
-                "function": "smart_detect_screen_coordinates",
-                "prompt": prompt,
-                "error_type": type(e).__name__,
-                "traceback": traceback.format_exc()
-            }
-        )
-        return {
-            "error": error_msg,
-            "user_message": f"❌ Unexpected error: {str(e)}",
-            "suggestion": "This is an unexpected error. Try again, and if it persists, check the logs for details.",
-            "prompt": prompt
-        }
+        return _detection_unexpected_error(prompt, e)
+
+
+async def smart_detect_screen_coordinates_async(prompt):
+    """
+    Awaitable variant of smart_detect_screen_coordinates.
+    
+    Capture, grid rendering and encoding run in a worker thread; the Gemini
+    call goes through the pooled client's async API
+    (client.aio.models.generate_content), so no thread is held while waiting
+    on the network.
+    
+    Returns: dict with 'x', 'y' coordinates or 'error' message with suggestions
+    """
+    try:
+        result, request = await asyncio.to_thread(_prepare_detection_request, prompt)
+        if result is not None:
+            return result
+
+        while request is not None:
+            try:
+                response = await _generate_detection_async(request)
+            except Exception as api_error:
+                return _detection_api_error(prompt, api_error)
+            result, request = await asyncio.to_thread(_advance_detection, request, response)
+
+        return result
+        
+    except Exception as e:
+        return _detection_unexpected_error(prompt, e)
 
 @retry_with_backoff(max_retries=2, initial_delay=0.5)
-def smart_detect_screen_coordinates_with_retry(prompt):
+async def _smart_detect_or_raise(prompt):
+    """Run one detection attempt, raising RetryableError for error results."""
+    result = await smart_detect_screen_coordinates_async(prompt)
+    if "error" in result:
+        raise RetryableError(
+            result["error"],
+            error_class=result.get("error_class", "detection_failed"),
+            retry_after=result.get("retry_after"),
+            payload=result
+        )
+    return result
+
+
+async def smart_detect_screen_coordinates_with_retry(prompt):
     """
     Coordinate detection with automatic retry logic.
     
-    Wraps smart_detect_screen_coordinates with retry logic to handle
-    transient failures (API timeouts, network issues, etc.).
+    Wraps smart_detect_screen_coordinates_async with retry logic to handle
+    transient failures (API timeouts, rate limits, server errors).
     
     Features:
-    - Automatic retry on failure (up to 2 retries)
-    - Exponential backoff (0.5s, 1.0s)
-    - Detailed logging of retry attempts
+    - Up to 2 attempts, for retryable errors (timeout, 429, 5xx, network,
+      and unclassified errors as before); "element not found", unparseable
+      answers and auth errors return immediately instead of burning more
+      model calls
+    - Full-jitter exponential backoff via asyncio.sleep (the event loop
+      keeps running) and Retry-After hints honored
+    - Shared retry budget across calls
     - Returns same format as smart_detect_screen_coordinates
     
     Args:
         prompt: Description of the UI element to find
     
     Returns:
-        dict with 'x', 'y' coordinates or 'error' message
-    
-    Raises:
-        Exception: If all retry attempts fail
+        dict with 'x', 'y' coordinates or the last 'error' dict
     """
-    result = smart_detect_screen_coordinates(prompt)
-    
-    # Check if the result contains an error
-    if "error" in result:
-        # Raise an exception to trigger retry
-        raise Exception(result["error"])
-    
-    return result
+    try:
+        return await _smart_detect_or_raise(prompt)
+    except RetryableError as e:
+        return e.payload
 
 
 def get_screen_size():
-    """Get the screen size."""
-    return {"width": pyautogui.size()[0], "height": pyautogui.size()[1]}
+    """Get the screen size (primary monitor, logical points) and the monitor layout."""
+    layout = screen_geometry.current()
+    return {
+        "width": layout.width,
+        "height": layout.height,
+        "monitors": [
+            {key: m[key] for key in ("left", "top", "width", "height")} for m in layout.monitors[1:]
+        ],
+    }
 
 def get_mouse_position():
     """Get the mouse position."""
@@ -956,14 +2436,14 @@ def move_mouse_absolute(x, y):
     Returns:
         dict with result message or error details
     """
-    import time
-    
     try:
         # Validate coordinates are reasonable
-        screen_width, screen_height = pyautogui.size()
+        layout = screen_geometry.current()
+        screen_width, screen_height = layout.logical_size
+        left, top, right, bottom = layout.bounds
         
-        if x < 0 or x >= screen_width or y < 0 or y >= screen_height:
-            error_msg = f"Coordinates ({x}, {y}) are out of screen bounds (0-{screen_width}, 0-{screen_height})"
+        if not layout.contains(x, y):
+            error_msg = f"Coordinates ({x}, {y}) are out of screen bounds ({left}-{right}, {top}-{bottom})"
             logger.log_error(
                 error_type="mouse_movement_out_of_bounds",
                 error_message=error_msg,
@@ -975,15 +2455,8 @@ def move_mouse_absolute(x, y):
                 "suggestion": f"Screen size is {screen_width}x{screen_height}. Use coordinates within these bounds."
             }
         
-        start_x, start_y = _MOUSE_CONTROLLER.position
-        steps = 20
-        delay = 0.005
-        
-        for i in range(1, steps + 1):
-            nx = int(start_x + (x - start_x) * i / steps)
-            ny = int(start_y + (y - start_y) * i / steps)
-            _MOUSE_CONTROLLER.position = (nx, ny)
-            time.sleep(delay)
+        # Distance-based linear glide on the input thread
+        motion_engine.move_to(x, y, profile="linear").result()
         
         return {"result": f"Mouse moved smoothly to {(x, y)}"}
         
@@ -1013,6 +2486,126 @@ def smoothstep(t):
     """
     return t * t * (3.0 - 2.0 * t)
 
+
+# Mouse motion timing. Glide duration follows Fitts' law,
+# MOTION_FITTS_A + MOTION_FITTS_B * log2(distance / MOTION_TARGET_WIDTH + 1),
+# capped at MOTION_MAX_DURATION; moves up to MOTION_INSTANT_DISTANCE pixels
+# jump directly. Positions are updated at most every MOTION_FRAME_INTERVAL.
+MOTION_PROFILE = os.getenv("MOTION_PROFILE", "eased").lower()  # instant, linear or eased
+MOTION_FITTS_A = 0.03
+MOTION_FITTS_B = 0.04
+MOTION_TARGET_WIDTH = 20.0
+MOTION_MAX_DURATION = 0.25
+MOTION_INSTANT_DISTANCE = 8
+MOTION_FRAME_INTERVAL = 1 / 120
+MOTION_SETTLE_DELAY = 0.05  # wait before reading the position back for verification
+
+MOTION_EASINGS = {
+    "linear": lambda t: t,
+    "eased": smoothstep,
+}
+
+
+def plan_motion_duration(distance, profile=MOTION_PROFILE):
+    """
+    Glide duration in seconds for a move of `distance` pixels (Fitts-style).
+    
+    Returns 0 for the instant profile and for moves of at most
+    MOTION_INSTANT_DISTANCE pixels.
+    """
+    if profile == "instant" or distance <= MOTION_INSTANT_DISTANCE:
+        return 0.0
+    return min(MOTION_MAX_DURATION,
+               MOTION_FITTS_A + MOTION_FITTS_B * math.log2(distance / MOTION_TARGET_WIDTH + 1))
+
+
+class MotionEngine:
+    """
+    Mouse motion on a dedicated input thread.
+    
+    move_to() queues a move and returns a concurrent.futures.Future at once.
+    The input thread plans the duration from the distance, then drives the
+    cursor against a monotonic deadline: each frame places the cursor where
+    the profile says it should be *now*, so late wakeups (coarse OS timers)
+    skip ahead instead of stretching the move. The mouse tools run on
+    worker threads and wait with future.result().
+    """
+    
+    def __init__(self, controller, frame_interval=MOTION_FRAME_INTERVAL):
+        """
+        Args:
+            controller: pynput mouse controller
+            frame_interval: Minimum time between cursor updates in seconds
+        """
+        self.controller = controller
+        self.frame_interval = frame_interval
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def move_to(self, x, y, profile=None):
+        """
+        Queue a move to (x, y).
+        
+        Args:
+            x, y: Target position in screen coordinates
+            profile: "instant", "linear" or "eased" (default: MOTION_PROFILE)
+        
+        Returns:
+            Future resolving to {"target", "duration", "frames"} once the
+            cursor has reached the target
+        """
+        future = concurrent.futures.Future()
+        self._ensure_worker()
+        self._jobs.put((int(x), int(y), (profile or MOTION_PROFILE).lower(), future))
+        return future
+    
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="motion-engine", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            x, y, profile, future = self._jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._glide(x, y, profile))
+            except Exception as e:
+                future.set_exception(e)
+    
+    def _glide(self, x, y, profile):
+        start_x, start_y = self.controller.position
+        dx, dy = x - start_x, y - start_y
+        duration = plan_motion_duration(math.hypot(dx, dy), profile)
+        easing = MOTION_EASINGS.get(profile)
+        frames = 0
+        
+        if duration > 0 and easing is not None:
+            start = time.monotonic()
+            deadline = start + duration
+            last = (int(start_x), int(start_y))
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                e = easing((now - start) / duration)
+                position = (int(start_x + dx * e), int(start_y + dy * e))
+                if position != last:
+                    self.controller.position = position
+                    last = position
+                    frames += 1
+                time.sleep(max(0.0, min(now + self.frame_interval, deadline) - time.monotonic()))
+        
+        self.controller.position = (x, y)
+        return {"target": (x, y), "duration": round(duration, 4), "frames": frames + 1}
+
+
+# Global motion engine (input thread starts on the first move)
+motion_engine = MotionEngine(_MOUSE_CONTROLLER)
+
 def move_mouse_absolute_validated(x, y):
     """
     Move mouse to absolute coordinates with validation and position verification.
@@ -1040,15 +2633,14 @@ def move_mouse_absolute_validated(x, y):
         - user_message: (optional) user-friendly error explanation
         - suggestion: (optional) suggestion for fixing the issue
     """
-    import time
-    import math
-    
     try:
-        # Get screen dimensions for bounds checking
-        screen_width, screen_height = pyautogui.size()
+        # Get screen dimensions for bounds checking (cached layout)
+        layout = screen_geometry.current()
+        screen_width, screen_height = layout.logical_size
+        left, top, right, bottom = layout.bounds
         
-        # Validate coordinates are within screen bounds
-        if x < 0 or x >= screen_width or y < 0 or y >= screen_height:
+        # Validate coordinates are within screen bounds (any monitor)
+        if not layout.contains(x, y):
             error_msg = f"Coordinates ({x}, {y}) are out of bounds. Screen size: {screen_width}x{screen_height}"
             logger.log_error(
                 error_type="validated_mouse_movement_out_of_bounds",
@@ -1063,34 +2655,15 @@ def move_mouse_absolute_validated(x, y):
                 "message": error_msg,
                 "error": error_msg,
                 "user_message": f"❌ Cannot move to ({x}, {y}) - coordinates are outside screen bounds.",
-                "suggestion": f"Use coordinates within screen bounds: 0-{screen_width} (width), 0-{screen_height} (height). Call get_screen_size() first to check dimensions."
+                "suggestion": f"Use coordinates on a monitor within {left}-{right} (x), {top}-{bottom} (y); the primary screen is 0-{screen_width} by 0-{screen_height}. Call get_screen_size() first to check dimensions."
             }
     
-        # Get starting position
-        start_x, start_y = _MOUSE_CONTROLLER.position
-        
-        # Movement parameters
-        steps = 30  # More steps for smoother movement
-        delay = 0.003  # Slightly faster per-step delay
-        
-        # Perform smooth movement with easing
-        for i in range(1, steps + 1):
-            # Calculate progress (0.0 to 1.0)
-            t = i / steps
-            
-            # Apply smoothstep easing
-            eased_t = smoothstep(t)
-            
-            # Calculate intermediate position
-            nx = int(start_x + (x - start_x) * eased_t)
-            ny = int(start_y + (y - start_y) * eased_t)
-            
-            # Move to intermediate position
-            _MOUSE_CONTROLLER.position = (nx, ny)
-            time.sleep(delay)
+        # Perform smooth movement with easing (duration planned from distance,
+        # run on the input thread against a monotonic deadline)
+        motion_engine.move_to(x, y).result()
         
         # Allow system to settle
-        time.sleep(0.05)
+        time.sleep(MOTION_SETTLE_DELAY)
         
         # Verify final position
         actual_x, actual_y = _MOUSE_CONTROLLER.position
@@ -1099,8 +2672,8 @@ def move_mouse_absolute_validated(x, y):
         # Corrective movement if needed (more than 5 pixels off)
         if error_distance > 5:
             # Direct movement to exact target
-            _MOUSE_CONTROLLER.position = (x, y)
-            time.sleep(0.05)
+            motion_engine.move_to(x, y, profile="instant").result()
+            time.sleep(MOTION_SETTLE_DELAY)
             
             # Re-verify position
             actual_x, actual_y = _MOUSE_CONTROLLER.position
@@ -1235,6 +2808,111 @@ def left_click_mouse_verified(count: int = 1):
             "click_count": 0
         }
 
+def locate_and_click(prompt: str, count: int = 1, button: str = "left"):
+    """
+    Find a UI element and click it in a single tool call.
+    
+    Runs the full click workflow server-side instead of spending one Live
+    model round-trip per step:
+    1. smart_detect_screen_coordinates(prompt)
+    2. move_mouse_absolute_validated(x, y), which verifies the cursor
+       ended within 10px of the target
+    3. click
+    
+    Args:
+        prompt: Description of the UI element to click
+        count: Number of clicks (default: 1, use 2 for double-click)
+        button: "left" or "right" (default: "left")
+    
+    Returns:
+        dict with:
+        - success: bool indicating the element was found and clicked
+        - stage: last workflow stage reached ("detect", "move", "click")
+        - x, y: detected target coordinates (if detection succeeded)
+        - actual: cursor position at click time (if movement ran)
+        - error_distance: distance in pixels between target and cursor
+        - clicked: bool indicating a click was performed
+        - timings: per-stage durations in seconds
+        - error, user_message, suggestion: (optional) details from the failing stage
+    """
+    timings = {}
+    result = {"success": False, "clicked": False, "prompt": prompt, "timings": timings}
+    
+    def fail(stage, details):
+        # A local fast-path answer that led nowhere must not be served again
+        if stage == "move" and detection.get("source") in ("cache", "template"):
+            detection_cache.forget(prompt)
+            template_store.forget(prompt)
+            logger.logger.info(f"🗑️ Dropped cached location of '{prompt}' after a failed {stage}")
+        result["stage"] = stage
+        for key in ("error", "user_message", "suggestion", "raw_response"):
+            if key in details:
+                result[key] = details[key]
+        return result
+    
+    detection = {}
+    buttons = {"left": mouse.Button.left, "right": mouse.Button.right}
+    if button not in buttons:
+        return fail("detect", {
+            "error": f"Unsupported mouse button: {button}",
+            "user_message": f"❌ Cannot click with button '{button}'.",
+            "suggestion": "Use 'left' or 'right'."
+        })
+    
+    # === 1. Detect ===
+    stage_start = time.perf_counter()
+    detection = smart_detect_screen_coordinates(prompt)
+    timings["detect"] = round(time.perf_counter() - stage_start, 3)
+    if "error" in detection:
+        return fail("detect", detection)
+    
+    x, y = detection["x"], detection["y"]
+    result.update({"x": x, "y": y})
+    
+    # === 2. Move (verified: success means the cursor ended within 10px) ===
+    stage_start = time.perf_counter()
+    movement = move_mouse_absolute_validated(x, y)
+    timings["move"] = round(time.perf_counter() - stage_start, 3)
+    result["actual"] = movement.get("actual")
+    result["error_distance"] = movement.get("error_distance")
+    if not movement.get("success"):
+        if "error" not in movement:
+            # Moved, but the cursor did not reach the target
+            movement = {
+                "error": movement.get("message"),
+                "user_message": "❌ The mouse did not reach the target, so I did not click.",
+                "suggestion": "Try again, or use move_mouse_absolute followed by left_click_mouse."
+            }
+        return fail("move", movement)
+    actual_x, actual_y = movement["actual"]
+    
+    # === 3. Click ===
+    stage_start = time.perf_counter()
+    try:
+        _MOUSE_CONTROLLER.click(buttons[button], int(count))
+    except Exception as e:
+        error_msg = f"Click failed: {str(e)}"
+        logger.log_error(
+            error_type="locate_and_click_click_failed",
+            error_message=error_msg,
+            context={"function": "locate_and_click", "prompt": prompt, "button": button, "count": count, "error_type": type(e).__name__}
+        )
+        return fail("click", {
+            "error": error_msg,
+            "user_message": f"❌ Found '{prompt}' but failed to click: {str(e)}",
+            "suggestion": "Check system permissions for mouse control. On macOS: System Settings → Privacy & Security → Accessibility"
+        })
+    timings["click"] = round(time.perf_counter() - stage_start, 3)
+    
+    result.update({
+        "success": True,
+        "clicked": True,
+        "stage": "click",
+        "result": f"{button.capitalize()}-clicked '{prompt}' {int(count)} time(s) at ({actual_x}, {actual_y})",
+        "screenshot_dir": detection.get("screenshot_dir"),
+    })
+    return result
+
 def right_click_mouse(count: int = 1):
     """Right click the mouse button once."""
     _MOUSE_CONTROLLER.click(mouse.Button.right, count)
@@ -1283,28 +2961,9 @@ def press_key(key: str):
     Returns:
         dict with result message or error details
     """
-    special_keys = {
-        "space": keyboard.Key.space,
-        "enter": keyboard.Key.enter,
-        "shift": keyboard.Key.shift,
-        "ctrl": keyboard.Key.ctrl,
-        "alt": keyboard.Key.alt,
-        "cmd": keyboard.Key.cmd,
-        "tab": keyboard.Key.tab,
-        "esc": keyboard.Key.esc,
-        "up": keyboard.Key.up,
-        "down": keyboard.Key.down,
-        "left": keyboard.Key.left,
-        "right": keyboard.Key.right,
-        "backspace": keyboard.Key.backspace,
-        "delete": keyboard.Key.delete,
-    }
-    
     try:
-        if key in special_keys:
-            keyboard.Controller().press(special_keys[key])
-        else:
-            keyboard.Controller().press(key)
+        # Press and release via the shared controller and key table
+        tap(key)
         return {"result": f"pressed the key {key}"}
     except Exception as e:
         error_msg = f"Key press failed: {str(e)}"
@@ -1323,45 +2982,52 @@ def press_key(key: str):
             "suggestion": "Check system permissions for keyboard control. On macOS: System Settings → Privacy & Security → Accessibility"
         }
 
-import platform
-import time
-from pynput import keyboard
+# Key sequences used by type_text, parsed once
+SELECT_ALL = compile_keys(("mod", "a"))
+DELETE = compile_keys(("delete",))
 
-def type_text(text: str, select_all_first: bool = False):
+
+def type_text(text: str, select_all_first: bool = False, method: str = None):
     """
     Type text at the current cursor position with comprehensive error handling.
     If select_all_first is True, will select all existing text (Cmd/Ctrl+A, Delete) before typing.
     
+    Long text is pasted through the clipboard (the previous clipboard text is
+    restored afterwards); short text is typed key by key. See TYPE_STRATEGY
+    and TYPE_PASTE_MIN_CHARS in input_devices.py.
+    
     Args:
         text: The text to type
         select_all_first: If True, select and replace existing text
+        method: "auto", "type" (key by key, for fields that block paste) or
+                "paste"; None (default) uses TYPE_STRATEGY
     
     Returns:
         dict with result message or error details with suggestions
     """
-    _keyboard = keyboard.Controller()
-    system = platform.system().lower()
-
     try:
         if select_all_first:
-            modifier = keyboard.Key.cmd if system == "darwin" else keyboard.Key.ctrl
-
             # Select all (Cmd/Ctrl + A)
-            with _keyboard.pressed(modifier):
-                _keyboard.press('a')
-                _keyboard.release('a')
+            play(SELECT_ALL)
             time.sleep(0.05)
 
             # Delete selected text
-            _keyboard.press(keyboard.Key.delete)
-            _keyboard.release(keyboard.Key.delete)
+            play(DELETE)
             time.sleep(0.05)
 
-        # Type new text
-        _keyboard.type(text)
+        # Type or paste new text
+        started = time.perf_counter()
+        used = inject_text(text, method)
+        elapsed = time.perf_counter() - started
+        logger.logger.info(
+            f"⌨️ TYPE_TEXT: method={used} chars={len(text)} ms={elapsed * 1000:.0f} "
+            f"chars_per_sec={len(text) / elapsed if elapsed > 0 else 0:.0f}"
+        )
 
         return {
-            "result": f"Typed: '{text}'" + (" (replaced existing text)" if select_all_first else "")
+            "result": f"Typed: '{text}'"
+            + (" (pasted)" if used == "paste" else "")
+            + (" (replaced existing text)" if select_all_first else "")
         }
 
     except Exception as e:
@@ -1373,6 +3039,7 @@ def type_text(text: str, select_all_first: bool = False):
                 "function": "type_text",
                 "text_length": len(text),
                 "select_all_first": select_all_first,
+                "method": method,
                 "error_type": type(e).__name__
             }
         )
@@ -1410,20 +3077,6 @@ def press_key_combination(keys: list):
     Returns:
         dict with result message or error details with suggestions
     """
-    _keyboard = keyboard.Controller()
-    special_keys = {
-        "space": keyboard.Key.space,
-        "enter": keyboard.Key.enter,
-        "shift": keyboard.Key.shift,
-        "ctrl": keyboard.Key.ctrl,
-        "alt": keyboard.Key.alt,
-        "cmd": keyboard.Key.cmd,
-        "tab": keyboard.Key.tab,
-        "esc": keyboard.Key.esc,
-        "backspace": keyboard.Key.backspace,
-        "delete": keyboard.Key.delete,
-    }
-    
     try:
         # Validate input
         if not keys or len(keys) == 0:
@@ -1439,25 +3092,9 @@ def press_key_combination(keys: list):
                 "suggestion": "Provide at least one key. Example: ['cmd', 'c'] for copy"
             }
         
-        # Convert string keys to Key objects
-        key_objects = []
-        for key in keys:
-            if key in special_keys:
-                key_objects.append(special_keys[key])
-            else:
-                key_objects.append(key)
-        
-        # Press all keys
-        for key in key_objects[:-1]:
-            _keyboard.press(key)
-        
-        # Press and release the last key
-        _keyboard.press(key_objects[-1])
-        _keyboard.release(key_objects[-1])
-        
-        # Release all modifier keys in reverse order
-        for key in reversed(key_objects[:-1]):
-            _keyboard.release(key)
+        # Hold all keys but the last, tap the last, release in reverse order
+        # (parsed once per distinct combination, then cached)
+        play(compile_keys(tuple(keys)))
         
         return {"result": f"Pressed key combination: {' + '.join(keys)}"}
         
@@ -1477,7 +3114,7 @@ def press_key_combination(keys: list):
         if "permission" in str(e).lower() or "access" in str(e).lower():
             suggestion = "Check system permissions for keyboard control. On macOS: System Settings → Privacy & Security → Accessibility"
         else:
-            suggestion = f"Verify the key combination is valid. Available special keys: {', '.join(special_keys.keys())}"
+            suggestion = f"Verify the key combination is valid. Available special keys: {', '.join(KEY_NAMES)}"
         
         return {
             "error": error_msg,
@@ -1570,10 +3207,73 @@ func_names_dict = {
     "get_mouse_position": get_mouse_position,
     "generate_quiz_from_screen": generate_quiz_from_screen,
     # "get_screen_with_grid": get_screen_with_grid
-    "smart_detect_screen_coordinates": smart_detect_screen_coordinates,
-    "smart_detect_screen_coordinates_with_retry": smart_detect_screen_coordinates_with_retry
+    "smart_detect_screen_coordinates": smart_detect_screen_coordinates_async,
+    "smart_detect_screen_coordinates_with_retry": smart_detect_screen_coordinates_with_retry,
+    "locate_and_click": locate_and_click
 }
 
+# Tools that block the calling thread: synchronous Gemini calls, waits on
+# motion_engine glides and long typing runs. handle_tool_call dispatches these
+# to tool_executor so listen_audio/play_audio/send_realtime keep running.
+# Coroutine tools (smart_detect_screen_coordinates is mapped to its async
+# variant, and the retrying variant is async) are awaited directly; every
+# other tool is a quick
+# pynput/pyautogui call and runs inline on the event loop.
+BLOCKING_TOOLS = frozenset({
+    "move_mouse_absolute",
+    "move_mouse_absolute_validated",
+    "type_text",
+    "select_all_and_replace",
+    "generate_quiz_from_screen",
+    "locate_and_click",
+})
+
+# Queries with no side effects on the mouse, keyboard or screen. Consecutive
+# calls to these within one tool_call batch run concurrently; any other tool
+# drives an input device or opens a window (generate_quiz_from_screen) and
+# acts as an ordering barrier.
+READ_ONLY_TOOLS = frozenset({
+    "get_screen_size",
+    "get_mouse_position",
+    "smart_detect_screen_coordinates",
+    "smart_detect_screen_coordinates_with_retry",
+})
+
+
+def plan_tool_batch(tool_names):
+    """
+    Split a batch of tool calls into ordered execution stages.
+    
+    Consecutive read-only calls are grouped into one stage so they can run in
+    parallel; every input-device call gets a stage of its own, which keeps
+    them serialized in order and guarantees that reads issued after a
+    movement observe its effect.
+    
+    Args:
+        tool_names: Tool names in the order the model issued them
+    
+    Returns:
+        list of stages, each a list of indices into tool_names
+    
+    Example:
+        plan_tool_batch(["get_screen_size", "get_mouse_position", "left_click_mouse", "get_mouse_position"])
+        → [[0, 1], [2], [3]]
+    """
+    stages = []
+    for index, name in enumerate(tool_names):
+        if name in READ_ONLY_TOOLS and stages and stages[-1][1]:
+            stages[-1][0].append(index)
+        else:
+            stages.append(([index], name in READ_ONLY_TOOLS))
+    return [indices for indices, _ in stages]
+
+# Bounded pool for blocking tools; extra calls queue until a worker is free
+TOOL_EXECUTOR_WORKERS = 4
+tool_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=TOOL_EXECUTOR_WORKERS,
+    thread_name_prefix="tool-worker",
+)
+
 
 
 tools = [
@@ -1663,15 +3363,16 @@ Use this for precise mouse positioning before clicking UI elements.""",
         ),
         types.FunctionDeclaration(
             name="press_key",
-            description="Press the given key. key is a string of the key to press. key is a special key or a regular key. special keys are space, enter, shift, ctrl, alt, cmd, tab, esc, up, down, left, right, backspace, delete. regular keys are the keys on the keyboard.",
+            description="Press the given key. key is a string of the key to press. key is a special key or a regular key. special keys are space, enter, shift, ctrl, alt, cmd, tab, esc, up, down, left, right, backspace, delete, home, end, page_up, page_down, f1-f12. regular keys are the keys on the keyboard.",
             parameters=types.Schema(type=types.Type.OBJECT, properties={"key": types.Schema(type=types.Type.STRING)})
         ),
         types.FunctionDeclaration(
             name="type_text",
-            description="Type text at the current cursor position. If select_all_first is True, will select all existing text (Cmd+A) before typing to replace it. Very useful for filling forms or replacing text in input fields.",
+            description="Type text at the current cursor position. If select_all_first is True, will select all existing text (Cmd+A) before typing to replace it. Very useful for filling forms or replacing text in input fields. Long text is pasted via the clipboard for speed.",
             parameters=types.Schema(type=types.Type.OBJECT, properties={
                 "text": types.Schema(type=types.Type.STRING, description="The text to type"),
-                "select_all_first": types.Schema(type=types.Type.BOOLEAN, description="If True, select all text before typing (replaces existing text). Default is False.")
+                "select_all_first": types.Schema(type=types.Type.BOOLEAN, description="If True, select all text before typing (replaces existing text). Default is False."),
+                "method": types.Schema(type=types.Type.STRING, enum=list(TEXT_STRATEGIES), description="Leave unset to use the configured default. 'auto' pastes long text and types short text; 'type' types key by key (use when a field blocks paste); 'paste' always pastes.")
             }, required=["text"])
         ),
         types.FunctionDeclaration(
@@ -1714,7 +3415,7 @@ This function:
 - Uses Gemini 2.5 Pro to analyze and locate the element with high precision
 - Returns precise coordinates with validation
 - Validates coordinates are within screen bounds
-- Saves screenshots for debugging
+- Optionally saves screenshots for debugging (--save-screenshots)
 
 WORKFLOW POSITION:
 This is ALWAYS step 1 before any click operation:
@@ -1748,6 +3449,38 @@ Returns: Dictionary with 'x' and 'y' coordinates, or 'error' message if detectio
                 required=["prompt"]
             )
         ),
+        types.FunctionDeclaration(
+            name="locate_and_click",
+            description="""Find a UI element on screen and click it in ONE call.
+
+PREFERRED for any "click on X" request. Internally performs the whole click workflow:
+1. smart_detect_screen_coordinates(prompt)
+2. validated mouse movement to the detected coordinates
+3. position verification (within 10px)
+4. click
+
+Returns a single structured result: success, stage reached (detect/move/click), detected x/y, actual cursor position, error distance and per-stage timings. On failure, 'stage' tells you which step failed and 'user_message'/'suggestion' explain why; nothing is clicked unless every earlier step succeeded.
+
+Use the same descriptive prompts as smart_detect_screen_coordinates.""",
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "prompt": types.Schema(
+                        type=types.Type.STRING,
+                        description="Detailed description of the UI element to click. Be specific about visual appearance, position, text content, and surrounding context."
+                    ),
+                    "count": types.Schema(
+                        type=types.Type.NUMBER,
+                        description="Number of clicks (default: 1, use 2 for double-click)"
+                    ),
+                    "button": types.Schema(
+                        type=types.Type.STRING,
+                        description="Mouse button to click: 'left' (default) or 'right'"
+                    )
+                },
+                required=["prompt"]
+            )
+        ),
         types.FunctionDeclaration(
             name="generate_quiz_from_screen",
             description="Generate a fun quiz based on what's currently visible on screen! Creates 2 questions about screen content and 1 creative/fun question. Perfect for entertainment, learning, or testing knowledge about what's displayed. The AI will analyze the screen and create engaging questions.",
@@ -1764,9 +3497,21 @@ CONFIG = {"response_modalities": ["AUDIO"], "tools": tools
 ,
     "system_instruction": """You are an assistant that controls the user's mouse and keyboard based on voice commands.
 
-=== CRITICAL WORKFLOW FOR CLICKING UI ELEMENTS ===
+=== CLICKING UI ELEMENTS ===
+
+When the user asks to click on something, call:
+   locate_and_click(prompt="clear description of the element")
+It detects, moves, verifies and clicks in one step. Check 'success' and
+'stage' in the response; if it failed, explain why using 'user_message'
+and offer to retry with a better description.
+
+Use the manual workflow below only when you need something other than a
+plain click at the detected position (e.g. drag, hover, or typing after
+clicking a field).
+
+=== MANUAL WORKFLOW ===
 
-When the user asks to click on something, ALWAYS follow this EXACT sequence:
+When you need the individual steps, follow this EXACT sequence:
 
 1. DETECT COORDINATES:
    - Call: smart_detect_screen_coordinates(prompt="clear description of the element")
@@ -1811,7 +3556,7 @@ If coordinates seem incorrect:
 
 === GENERAL RULES ===
 
-- NEVER guess coordinates - always use smart_detect_screen_coordinates
+- NEVER guess coordinates - always use locate_and_click or smart_detect_screen_coordinates
 - NEVER skip the movement step - mouse must move before clicking
 - ALWAYS verify each step completed successfully
 - ALWAYS provide verbal feedback at each step
@@ -1822,6 +3567,12 @@ If coordinates seem incorrect:
 === TOOL USAGE PATTERNS ===
 
 For "Click on X":
+1. locate_and_click(prompt="X")
+
+For "Double-click on X":
+1. locate_and_click(prompt="X", count=2)
+
+For "Click on X" (manual fallback):
 1. smart_detect_screen_coordinates(prompt="X")
 2. move_mouse_absolute(x, y)
 3. get_mouse_position() [verify]
@@ -1833,36 +3584,764 @@ For "Type in the search box":
 3. left_click_mouse()
 4. type_text(text="...")
 
-For "Scroll down":
-1. scroll_mouse_by(dx=0, dy=-5)  [negative dy = scroll down]
+For "Scroll down":
+1. scroll_mouse_by(dx=0, dy=-5)  [negative dy = scroll down]
+
+For "Copy this text":
+1. press_key_combination(keys=["cmd", "c"])
+
+=== VALIDATION ===
+
+Before executing any action:
+- Confirm you have all required information
+- Verify coordinates are within screen bounds
+- Check that the previous step succeeded
+
+After executing any action:
+- Verify the action completed
+- Check for error messages in the response
+- Confirm the system state is as expected
+
+Remember: Accuracy is more important than speed. Take time to verify each step.
+"""
+}
+
+pya = pyaudio.PyAudio()
+
+# Adaptive screen streaming. The screen is polled at SCREEN_STREAM_MIN_INTERVAL
+# while it is changing; every unchanged poll multiplies the interval by
+# SCREEN_STREAM_BACKOFF up to SCREEN_STREAM_MAX_INTERVAL. Unchanged frames are
+# never encoded or sent.
+SCREEN_STREAM_MIN_INTERVAL = float(os.getenv("SCREEN_STREAM_MIN_INTERVAL", "0.5"))
+SCREEN_STREAM_MAX_INTERVAL = float(os.getenv("SCREEN_STREAM_MAX_INTERVAL", "8.0"))
+SCREEN_STREAM_BACKOFF = float(os.getenv("SCREEN_STREAM_BACKOFF", "1.5"))
+SCREEN_CHANGE_THRESHOLD = float(os.getenv("SCREEN_CHANGE_THRESHOLD", "12.0"))
+SCREEN_STREAM_STATS_EVERY = 60  # log a stats summary every N polls
+
+
+class FrameChangeDetector:
+    """
+    Cheap change detection for the screen stream.
+    
+    Each frame is shrunk to a small grayscale thumbnail and split into tiles;
+    a tile counts as changed when any of its thumbnail pixels differs from
+    the last *sent* frame by more than pixel_threshold. The frame counts as
+    changed when any tile changed, or when the cursor moved
+    (mss captures do not include the cursor; the overlay is drawn by us).
+    Comparing against the last sent frame means slow drifts still accumulate
+    into a change.
+    """
+    
+    def __init__(self, thumb_size=(256, 144), tile_size=16,
+                 pixel_threshold=SCREEN_CHANGE_THRESHOLD, cursor_threshold=4):
+        """
+        Args:
+            thumb_size: (width, height) of the comparison thumbnail
+            tile_size: Tile edge length in thumbnail pixels
+            pixel_threshold: Gray-level difference of a thumbnail pixel that marks its tile changed
+            cursor_threshold: Cursor movement in pixels that counts as a change
+        """
+        self.thumb_size = thumb_size
+        self.tile_size = tile_size
+        self.pixel_threshold = pixel_threshold
+        self.cursor_threshold = cursor_threshold
+        self.last_changed_tiles = 0
+        self._reference = None
+        self._cursor = None
+    
+    def has_changed(self, bgra, cursor=None):
+        """
+        Compare a frame with the last accepted one.
+        
+        Args:
+            bgra: Captured BGRA frame
+            cursor: (x, y) cursor position, or None to ignore the cursor
+        
+        Returns:
+            bool; when True the frame becomes the new reference
+        """
+        thumb = cv2.resize(bgra, self.thumb_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGRA2GRAY).astype(np.int16)
+        
+        if self._reference is None or self._reference.shape != gray.shape:
+            changed = True
+            self.last_changed_tiles = -1
+        else:
+            t = self.tile_size
+            h, w = (gray.shape[0] // t) * t, (gray.shape[1] // t) * t
+            diff = np.abs(gray[:h, :w] - self._reference[:h, :w])
+            tiles = diff.reshape(h // t, t, w // t, t).max(axis=(1, 3))
+            self.last_changed_tiles = int((tiles > self.pixel_threshold).sum())
+            
+            cursor_moved = (
+                cursor is not None and self._cursor is not None
+                and max(abs(cursor[0] - self._cursor[0]), abs(cursor[1] - self._cursor[1])) >= self.cursor_threshold
+            )
+            changed = self.last_changed_tiles > 0 or cursor_moved
+        
+        if changed:
+            self._reference = gray
+            self._cursor = cursor
+        return changed
+    
+    def reset(self):
+        """Forget the reference so the next frame is always sent."""
+        self._reference = None
+        self._cursor = None
+
+
+class ScreenStreamStats:
+    """Counters for the adaptive screen stream."""
+    
+    def __init__(self):
+        self.polls = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.last_frame_bytes = 0
+        self.interval = SCREEN_STREAM_MIN_INTERVAL
+    
+    def record_sent(self, size):
+        self.polls += 1
+        self.frames_sent += 1
+        self.bytes_sent += size
+        self.last_frame_bytes = size
+    
+    def record_skipped(self):
+        # A skipped frame saves roughly what the last sent frame cost
+        self.polls += 1
+        self.frames_skipped += 1
+        self.bytes_saved += self.last_frame_bytes
+    
+    def summary(self):
+        return {
+            "polls": self.polls,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "skip_ratio": round(self.frames_skipped / self.polls, 3) if self.polls else 0.0,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved_estimate": self.bytes_saved,
+            "current_interval_s": round(self.interval, 2),
+        }
+
+
+# Uplink queue sizing: at 1024 frames/16kHz each audio chunk is 64ms, so 32
+# chunks bound the backlog to ~2s before the oldest audio is dropped.
+UPLINK_AUDIO_MAXSIZE = 32
+UPLINK_STATS_EVERY = 500  # log uplink counters every N sent messages
+
+
+class UplinkScheduler:
+    """
+    Prioritized uplink to the Live session, replacing the shared out_queue.
+    
+    - Audio goes into its own bounded FIFO and is always drained first, so a
+      large screenshot never sits ahead of mic chunks. When the FIFO is full
+      the oldest chunk is dropped instead of blocking capture. Control
+      markers (put_control) share the FIFO to stay in order with the audio
+      but are never dropped.
+    - Video (screen or camera frames) uses a single "latest wins" slot: a new
+      frame replaces an unsent one, which is counted as dropped.
+    
+    All methods must be called from the event loop thread.
+    """
+    
+    def __init__(self, audio_maxsize=UPLINK_AUDIO_MAXSIZE):
+        """
+        Args:
+            audio_maxsize: Maximum number of queued audio messages
+        """
+        self.audio_maxsize = audio_maxsize
+        self._audio = deque()
+        self._video = None
+        self._ready = asyncio.Event()
+        self.audio_sent = 0
+        self.audio_dropped = 0
+        self.video_sent = 0
+        self.video_dropped = 0
+        self.max_audio_depth = 0
+    
+    def put_audio(self, msg):
+        """Queue an audio message; drops the oldest audio chunk if the queue is full."""
+        if len(self._audio) >= self.audio_maxsize:
+            for queued in self._audio:
+                if "data" in queued:
+                    self._audio.remove(queued)
+                    self.audio_dropped += 1
+                    break
+        self._audio.append(msg)
+        self.max_audio_depth = max(self.max_audio_depth, len(self._audio))
+        self._ready.set()
+    
+    def put_control(self, msg):
+        """Queue a control marker (no 'data') behind the queued audio; never dropped."""
+        self._audio.append(msg)
+        self.max_audio_depth = max(self.max_audio_depth, len(self._audio))
+        self._ready.set()
+    
+    def put_video(self, msg):
+        """Offer a video frame; replaces any frame that has not been sent yet."""
+        if self._video is not None:
+            self.video_dropped += 1
+        self._video = msg
+        self._ready.set()
+    
+    async def get(self):
+        """Wait for the next message to send, audio first."""
+        while True:
+            if self._audio:
+                self.audio_sent += 1
+                return self._audio.popleft()
+            if self._video is not None:
+                msg, self._video = self._video, None
+                self.video_sent += 1
+                return msg
+            self._ready.clear()
+            await self._ready.wait()
+    
+    def stats(self):
+        return {
+            "audio_depth": len(self._audio),
+            "audio_max_depth": self.max_audio_depth,
+            "audio_sent": self.audio_sent,
+            "audio_dropped": self.audio_dropped,
+            "video_pending": self._video is not None,
+            "video_sent": self.video_sent,
+            "video_dropped": self.video_dropped,
+        }
+
 
-For "Copy this text":
-1. press_key_combination(keys=["cmd", "c"])
+# Mic capture. MIC_CHUNK_SIZE frames are delivered per PortAudio callback;
+# when the event loop falls behind, queued chunks are merged into one uplink
+# message carrying at most MIC_LATENCY_TARGET_MS of audio. MIC_RING_CHUNKS
+# bounds the capture backlog before the oldest chunk is overwritten.
+MIC_CHUNK_SIZE = int(os.getenv("MIC_CHUNK_SIZE", str(CHUNK_SIZE)))
+MIC_LATENCY_TARGET_MS = float(os.getenv("MIC_LATENCY_TARGET_MS", "128"))
+MIC_RING_CHUNKS = 64
 
-=== VALIDATION ===
 
-Before executing any action:
-- Confirm you have all required information
-- Verify coordinates are within screen bounds
-- Check that the previous step succeeded
+class MicCapture:
+    """
+    Microphone capture using PyAudio callback mode.
+    
+    PortAudio calls _callback on its own thread for every chunk. Chunks go
+    into a ring buffer (a bounded deque; append/popleft are atomic, so the
+    audio thread never takes a lock) and the event loop is woken with
+    loop.call_soon_threadsafe, at most once per batch. This replaces one
+    asyncio.to_thread hop per 64ms chunk.
+    
+    Overruns are counted instead of silently ignored:
+    - input_overflows: PortAudio reported paInputOverflow (device-side loss)
+    - ring_overruns: the ring was full and the oldest chunk was discarded
+    """
+    
+    def __init__(self, loop, chunk_size=MIC_CHUNK_SIZE,
+                 latency_target_ms=MIC_LATENCY_TARGET_MS, ring_chunks=MIC_RING_CHUNKS):
+        """
+        Args:
+            loop: Event loop that consumes the audio
+            chunk_size: Frames per PortAudio callback
+            latency_target_ms: Maximum audio merged into one read() result
+            ring_chunks: Ring buffer capacity in chunks
+        """
+        self.loop = loop
+        self.chunk_size = chunk_size
+        self.ring_chunks = ring_chunks
+        chunk_ms = chunk_size * 1000.0 / SEND_SAMPLE_RATE
+        self.max_batch = max(1, int(latency_target_ms // chunk_ms))
+        self.stream = None
+        self.chunks_captured = 0
+        self.input_overflows = 0
+        self.ring_overruns = 0
+        self._ring = deque()
+        self._available = asyncio.Event()
+        self._wakeup_pending = False
+    
+    def open(self, pa, device_index=None):
+        """Open and start the callback-mode input stream (blocking; run in a thread)."""
+        self.stream = pa.open(
+            format=FORMAT,
+            channels=CHANNELS,
+            rate=SEND_SAMPLE_RATE,
+            input=True,
+            input_device_index=device_index,
+            frames_per_buffer=self.chunk_size,
+            stream_callback=self._callback,
+        )
+        return self.stream
+    
+    def _callback(self, in_data, frame_count, time_info, status_flags):
+        # Runs on the PortAudio thread: no locks, no allocation beyond the chunk
+        if status_flags & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        if len(self._ring) >= self.ring_chunks:
+            self._ring.popleft()
+            self.ring_overruns += 1
+        self._ring.append(in_data)
+        self.chunks_captured += 1
+        
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            try:
+                self.loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # Event loop already closed during shutdown
+                return (None, pyaudio.paComplete)
+        return (None, pyaudio.paContinue)
+    
+    def _wake(self):
+        self._wakeup_pending = False
+        self._available.set()
+    
+    async def read(self):
+        """
+        Wait for captured audio.
+        
+        Returns:
+            bytes with one or more chunks (at most max_batch) of PCM audio
+        """
+        while not self._ring:
+            self._available.clear()
+            await self._available.wait()
+        
+        chunks = [self._ring.popleft()]
+        while self._ring and len(chunks) < self.max_batch:
+            chunks.append(self._ring.popleft())
+        return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+    
+    def stats(self):
+        return {
+            "chunks_captured": self.chunks_captured,
+            "ring_depth": len(self._ring),
+            "input_overflows": self.input_overflows,
+            "ring_overruns": self.ring_overruns,
+        }
+    
+    def close(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop_stream()
+                self.stream.close()
+            except Exception:
+                pass
+            self.stream = None
+
+
+# Playback. Model audio is buffered in a preallocated ring and pulled by the
+# PortAudio output callback. Playback of a turn starts once
+# PLAYBACK_TARGET_MS of audio is buffered (or the turn ends), which absorbs
+# network jitter without adding more delay than necessary.
+# PLAYBACK_BUFFER_SECONDS bounds the ring; on overrun the oldest audio is
+# dropped so latency stays bounded.
+PLAYBACK_TARGET_MS = float(os.getenv("PLAYBACK_TARGET_MS", "120"))
+PLAYBACK_BUFFER_SECONDS = float(os.getenv("PLAYBACK_BUFFER_SECONDS", "30"))
+PLAYBACK_CHUNK_SIZE = int(os.getenv("PLAYBACK_CHUNK_SIZE", "480"))  # 20ms at 24kHz
+PLAYBACK_STATS_INTERVAL = 30.0  # seconds between PLAYBACK log lines
+SAMPLE_WIDTH = 2  # bytes per paInt16 sample
+
+
+class PlaybackEngine:
+    """
+    Jitter-buffered, callback-driven audio output.
+    
+    The event loop write()s PCM into a fixed bytearray ring; PortAudio's
+    callback thread copies out exactly the frames it needs. Both sides hold
+    the lock only for a memcpy, so playback timing no longer depends on
+    executor scheduling.
+    
+    Metrics (see stats()):
+    - underruns: the buffer ran dry mid-turn and silence was inserted
+    - overruns: the ring was full and the oldest audio was dropped
+    - output_underflows: PortAudio itself reported paOutputUnderflow
+    - latency_ms: arrival-to-speaker time per chunk (buffer wait plus the
+      device output latency)
+    """
+    
+    def __init__(self, rate=RECEIVE_SAMPLE_RATE, target_ms=PLAYBACK_TARGET_MS,
+                 buffer_seconds=PLAYBACK_BUFFER_SECONDS, chunk_size=PLAYBACK_CHUNK_SIZE):
+        """
+        Args:
+            rate: Output sample rate
+            target_ms: Buffered audio required before a turn starts playing
+            buffer_seconds: Ring capacity
+            chunk_size: Frames per PortAudio callback
+        """
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.bytes_per_ms = rate * SAMPLE_WIDTH * CHANNELS / 1000.0
+        self.target_bytes = int(target_ms * self.bytes_per_ms) // SAMPLE_WIDTH * SAMPLE_WIDTH
+        self.capacity = int(buffer_seconds * 1000 * self.bytes_per_ms) // SAMPLE_WIDTH * SAMPLE_WIDTH
+        self.target_bytes = min(self.target_bytes, self.capacity // 2)
+        
+        self._ring = bytearray(self.capacity)
+        self._silence = bytes(chunk_size * SAMPLE_WIDTH * CHANNELS)
+        self._lock = threading.Lock()
+        self._read = 0   # absolute byte offsets; ring index is offset % capacity
+        self._write = 0
+        self._primed = False
+        self._turn_ended = False
+        self._arrivals = deque()  # (end offset, arrival time) per written chunk
+        
+        self.stream = None
+        self.output_latency = 0.0
+        self.underruns = 0
+        self.overruns = 0
+        self.output_underflows = 0
+        self.flushes = 0
+        self.interruptions = 0
+        self.last_interrupt_ms = 0.0
+        self.max_interrupt_ms = 0.0
+        self.bytes_played = 0
+        self._latency_count = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+    
+    def open(self, pa):
+        """Open and start the callback-mode output stream (blocking; run in a thread)."""
+        self.stream = pa.open(
+            format=FORMAT,
+            channels=CHANNELS,
+            rate=self.rate,
+            output=True,
+            frames_per_buffer=self.chunk_size,
+            stream_callback=self._callback,
+        )
+        try:
+            self.output_latency = self.stream.get_output_latency()
+        except Exception:
+            self.output_latency = 0.0
+        return self.stream
+    
+    @property
+    def buffered_ms(self):
+        return (self._write - self._read) / self.bytes_per_ms
+    
+    def write(self, data):
+        """Append received PCM to the jitter buffer."""
+        n = len(data)
+        if n == 0:
+            return
+        with self._lock:
+            if n > self.capacity:
+                data = data[-self.capacity:]
+                self.overruns += 1
+                n = self.capacity
+            overflow = (self._write - self._read) + n - self.capacity
+            if overflow > 0:
+                self._read += overflow
+                self.overruns += 1
+            
+            start = self._write % self.capacity
+            first = min(n, self.capacity - start)
+            self._ring[start:start + first] = data[:first]
+            if first < n:
+                self._ring[:n - first] = data[first:]
+            self._write += n
+            self._arrivals.append((self._write, time.monotonic()))
+            self._turn_ended = False
+            
+            if not self._primed and self._write - self._read >= self.target_bytes:
+                self._primed = True
+    
+    def end_turn(self):
+        """Mark the end of the model's turn so any short tail plays without waiting for the target depth."""
+        with self._lock:
+            self._turn_ended = True
+            if self._write > self._read:
+                self._primed = True
+    
+    def flush(self):
+        """
+        Drop all buffered audio immediately.
+        
+        Returns:
+            Milliseconds of audio discarded
+        """
+        with self._lock:
+            dropped = self._write - self._read
+            self._read = self._write
+            self._arrivals.clear()
+            self._primed = False
+            self._turn_ended = False
+            self.flushes += 1
+        return dropped / self.bytes_per_ms
+    
+    def abort_output(self):
+        """
+        Discard audio already queued inside PortAudio and the device, then
+        restart the stream. Blocking (waits for a running callback); run in
+        a thread.
+        
+        Returns:
+            time.perf_counter() when the output went silent, or None without a stream
+        """
+        if self.stream is None:
+            return None
+        try:
+            self.stream.abort_stream()
+            silent_at = time.perf_counter()
+            self.stream.start_stream()
+            return silent_at
+        except Exception as e:
+            logger.log_error(
+                error_type="PlaybackAbortError",
+                error_message=str(e),
+                context={"stage": "abort_output"}
+            )
+            return None
+    
+    def record_interruption(self, latency_ms):
+        self.interruptions += 1
+        self.last_interrupt_ms = latency_ms
+        if latency_ms > self.max_interrupt_ms:
+            self.max_interrupt_ms = latency_ms
+    
+    def _callback(self, in_data, frame_count, time_info, status_flags):
+        # Runs on the PortAudio thread
+        if status_flags & pyaudio.paOutputUnderflow:
+            self.output_underflows += 1
+        want = frame_count * SAMPLE_WIDTH * CHANNELS
+        
+        with self._lock:
+            available = self._write - self._read
+            if not self._primed or available == 0:
+                if self._primed and not self._turn_ended:
+                    # Ran dry mid-turn: re-buffer up to the target depth
+                    self.underruns += 1
+                self._primed = False
+                return (self._silence[:want] if want <= len(self._silence) else bytes(want),
+                        pyaudio.paContinue)
+            
+            n = min(want, available)
+            start = self._read % self.capacity
+            first = min(n, self.capacity - start)
+            out = bytes(self._ring[start:start + first])
+            if first < n:
+                out += bytes(self._ring[:n - first])
+            self._read += n
+            self.bytes_played += n
+            
+            now = time.monotonic()
+            while self._arrivals and self._arrivals[0][0] <= self._read:
+                _, arrived = self._arrivals.popleft()
+                latency = now - arrived + self.output_latency
+                self._latency_count += 1
+                self._latency_total += latency
+                if latency > self._latency_max:
+                    self._latency_max = latency
+        
+        if n < want:
+            if not self._turn_ended:
+                self.underruns += 1
+            out += bytes(want - n)
+        return (out, pyaudio.paContinue)
+    
+    def stats(self):
+        avg = self._latency_total / self._latency_count if self._latency_count else 0.0
+        return {
+            "buffered_ms": round(self.buffered_ms, 1),
+            "played_s": round(self.bytes_played / self.bytes_per_ms / 1000, 1),
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "output_underflows": self.output_underflows,
+            "flushes": self.flushes,
+            "interruptions": self.interruptions,
+            "interrupt_to_silence_last_ms": round(self.last_interrupt_ms, 1),
+            "interrupt_to_silence_max_ms": round(self.max_interrupt_ms, 1),
+            "latency_avg_ms": round(avg * 1000, 1),
+            "latency_max_ms": round(self._latency_max * 1000, 1),
+        }
+    
+    def close(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop_stream()
+                self.stream.close()
+            except Exception:
+                pass
+            self.stream = None
+
+
+# Voice activity detection (optional, VAD_ENABLED=true or --vad). Mic audio
+# is only uplinked while speech is detected. A frame counts as speech when
+# its level is above VAD_THRESHOLD_DB (dBFS) and VAD_NOISE_MARGIN_DB above
+# the tracked noise floor. VAD_PRE_ROLL_MS of audio before an onset is sent
+# with it, and the gate stays open for VAD_HANGOVER_MS after speech ends.
+VAD_ENABLED = os.getenv("VAD_ENABLED", "false").lower() in ("1", "true", "yes")
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-50"))
+VAD_NOISE_MARGIN_DB = float(os.getenv("VAD_NOISE_MARGIN_DB", "10"))
+VAD_HANGOVER_MS = float(os.getenv("VAD_HANGOVER_MS", "600"))
+VAD_PRE_ROLL_MS = float(os.getenv("VAD_PRE_ROLL_MS", "300"))
+VAD_NOISE_WINDOW_MS = float(os.getenv("VAD_NOISE_WINDOW_MS", "3000"))
+VAD_NOISE_RISE_DB_PER_S = float(os.getenv("VAD_NOISE_RISE_DB_PER_S", "3"))
+VAD_FRAME_MS = 20
+VAD_STATS_EVERY = 20  # log VAD counters every N speech segments
+
+
+class VoiceActivityGate:
+    """
+    Energy-based voice activity gate between mic capture and the uplink.
+    
+    Each chunk is split into VAD_FRAME_MS frames and their RMS levels are
+    computed in one vectorized NumPy pass. While closed, chunks are held in a
+    short pre-roll buffer so the start of a word is not clipped; on onset the
+    pre-roll is released ahead of the current chunk. After the last speech
+    frame the gate stays open for the hangover period to keep trailing
+    consonants and short pauses.
+    
+    The noise floor follows non-speech audio. It also follows a minimum
+    statistic: speech always has quieter frames between words, so if even
+    the quietest frame of the last noise_window_ms is above the floor, the
+    background itself got louder (fan, HVAC, another room). The floor then
+    rises toward that minimum at rise_db_per_s, so the gate closes again
+    instead of staying open forever.
+    """
+    
+    def __init__(self, rate=SEND_SAMPLE_RATE, threshold_db=VAD_THRESHOLD_DB,
+                 margin_db=VAD_NOISE_MARGIN_DB, hangover_ms=VAD_HANGOVER_MS,
+                 pre_roll_ms=VAD_PRE_ROLL_MS, frame_ms=VAD_FRAME_MS,
+                 noise_window_ms=VAD_NOISE_WINDOW_MS, rise_db_per_s=VAD_NOISE_RISE_DB_PER_S):
+        """
+        Args:
+            rate: Sample rate of the mic audio
+            threshold_db: Absolute speech threshold in dBFS
+            margin_db: Required level above the noise floor
+            hangover_ms: How long the gate stays open after speech
+            pre_roll_ms: Audio kept from before a speech onset
+            frame_ms: Analysis frame length
+            noise_window_ms: Window of the minimum statistic used to detect a louder background
+            rise_db_per_s: Fastest rate at which the floor follows that minimum
+        """
+        self.rate = rate
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.frame_len = int(rate * frame_ms / 1000)
+        self.bytes_per_ms = rate * SAMPLE_WIDTH * CHANNELS / 1000.0
+        self.hangover_bytes = int(hangover_ms * self.bytes_per_ms)
+        self.pre_roll_bytes = int(pre_roll_ms * self.bytes_per_ms)
+        self.noise_window_bytes = int(noise_window_ms * self.bytes_per_ms)
+        self.rise_db_per_s = rise_db_per_s
+        
+        self.noise_floor_db = threshold_db - margin_db
+        self._minima = deque()  # (bytes, quietest frame level) per chunk
+        self._minima_bytes = 0
+        self.is_open = False
+        self._since_speech = 0  # bytes of audio since the last speech frame
+        self._pre_roll = deque()
+        self._pre_roll_size = 0
+        
+        self.bytes_in = 0
+        self.bytes_sent = 0
+        self.segments = 0
+    
+    def _frame_levels(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = len(samples) // self.frame_len * self.frame_len
+        if n == 0:
+            frames = samples.reshape(1, -1)
+        else:
+            frames = samples[:n].reshape(-1, self.frame_len)
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        return 20.0 * np.log10(rms / 32768.0 + 1e-9)
+    
+    def process(self, data):
+        """
+        Gate one chunk of PCM.
+        
+        Args:
+            data: 16-bit mono PCM bytes
+        
+        Returns:
+            (chunks, ended): chunks to uplink now (possibly with pre-roll) and
+            whether the gate just closed, i.e. the speech segment ended
+        """
+        self.bytes_in += len(data)
+        levels = self._frame_levels(data)
+        threshold = max(self.threshold_db, self.noise_floor_db + self.margin_db)
+        speech = bool((levels > threshold).any())
+        
+        quietest = self._track_minimum(len(data), float(levels.min()))
+        if not speech:
+            # Slowly track the background level from non-speech audio
+            self.noise_floor_db += 0.05 * (float(np.median(levels)) - self.noise_floor_db)
+        elif quietest is not None and quietest > self.noise_floor_db:
+            # No quiet frame in the whole window: the background got louder
+            rise = self.rise_db_per_s * len(data) / (self.bytes_per_ms * 1000.0)
+            self.noise_floor_db = min(quietest, self.noise_floor_db + rise)
+        
+        if speech:
+            self._since_speech = 0
+            if not self.is_open:
+                self.is_open = True
+                self.segments += 1
+                chunks = list(self._pre_roll)
+                chunks.append(data)
+                self._pre_roll.clear()
+                self._pre_roll_size = 0
+                self.bytes_sent += sum(len(c) for c in chunks)
+                return chunks, False
+        elif self.is_open:
+            self._since_speech += len(data)
+            if self._since_speech > self.hangover_bytes:
+                self.is_open = False
+                self._hold(data)
+                return [], True
+        
+        if self.is_open:
+            self.bytes_sent += len(data)
+            return [data], False
+        
+        self._hold(data)
+        return [], False
+    
+    def _track_minimum(self, size, level):
+        """
+        Add a chunk to the minimum statistic window.
+        
+        Returns:
+            The quietest frame level over the last noise_window_ms, or None
+            until the window has filled
+        """
+        self._minima.append((size, level))
+        self._minima_bytes += size
+        while len(self._minima) > 1 and self._minima_bytes - self._minima[0][0] >= self.noise_window_bytes:
+            self._minima_bytes -= self._minima.popleft()[0]
+        if self._minima_bytes < self.noise_window_bytes:
+            return None
+        return min(level for _, level in self._minima)
+    
+    def _hold(self, data):
+        self._pre_roll.append(data)
+        self._pre_roll_size += len(data)
+        while len(self._pre_roll) > 1 and self._pre_roll_size - len(self._pre_roll[0]) >= self.pre_roll_bytes:
+            self._pre_roll_size -= len(self._pre_roll.popleft())
+    
+    def stats(self):
+        saved = self.bytes_in - self.bytes_sent
+        return {
+            "segments": self.segments,
+            "bytes_in": self.bytes_in,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved": saved,
+            "saved_pct": round(100.0 * saved / self.bytes_in, 1) if self.bytes_in else 0.0,
+            "noise_floor_db": round(self.noise_floor_db, 1),
+        }
 
-After executing any action:
-- Verify the action completed
-- Check for error messages in the response
-- Confirm the system state is as expected
 
-Remember: Accuracy is more important than speed. Take time to verify each step.
-"""
-}
+# Uplink marker telling the server the mic went quiet, so its own activity
+# detection can end the user's turn without waiting for more audio.
+AUDIO_STREAM_END = {"audio_stream_end": True}
 
-pya = pyaudio.PyAudio()
 
 class AudioLoop:
-    def __init__(self, video_mode=DEFAULT_MODE):
+    def __init__(self, video_mode=DEFAULT_MODE, vad=VAD_ENABLED):
         self.video_mode = video_mode
+        self.vad = VoiceActivityGate() if vad else None
 
-        self.audio_in_queue = None
-        self.out_queue = None
+        self.playback = None
+        self.uplink = None
+        self.mic = None
 
         self.session = None
 
@@ -1870,6 +4349,9 @@ class AudioLoop:
         self.receive_audio_task = None
         self.play_audio_task = None
 
+        self.screen_change_detector = FrameChangeDetector()
+        self.screen_stream_stats = ScreenStreamStats()
+
     async def send_text(self):
         while True:
             text = await asyncio.to_thread(
@@ -1918,26 +4400,39 @@ class AudioLoop:
 
             await asyncio.sleep(0.1)
 
-            await self.out_queue.put(frame)
+            self.uplink.put_video(frame)
 
         # Release the VideoCapture object
         cap.release()
 
 
 
-    def _get_screen(self):
-        """Capture screen and draw a custom visible cursor overlay."""
-        with mss.mss() as sct:
-            monitor = sct.monitors[0]
-
-            # Grab the screen
-            screenshot = sct.grab(monitor)
+    def _get_screen(self, only_if_changed=False):
+        """
+        Capture screen and draw a custom visible cursor overlay.
+        
+        Args:
+            only_if_changed: If True, return None without encoding when the
+                             screen and cursor have not changed since the
+                             last returned frame
+        """
+        # Grab the whole virtual desktop; the frame is also kept as the
+        # capture service's latest frame for other consumers
+        frame = screen_capture.grab(VIRTUAL_DESKTOP)
+        # Cursor position is in global logical points; draw it in capture
+        # pixels of the monitor it is on (None: between monitors, no overlay)
+        cursor = screen_geometry.current().global_to_desktop_capture(
+            *pyautogui.position(), frame.width, frame.height
+        )
+        changed = self.screen_change_detector.has_changed(frame.bgra, cursor)
+        if only_if_changed and not changed:
+            return None
 
-            # Convert to a Pillow image
-            img = PIL.Image.frombytes("RGB", screenshot.size, screenshot.rgb)
+        img = PIL.Image.fromarray(frame.rgb())
 
-            # === Draw the cursor overlay ===
-            mx, my = pyautogui.position()
+        # === Draw the cursor overlay ===
+        if cursor is not None:
+            mx, my = cursor
             draw = ImageDraw.Draw(img)
 
             # Choose cursor style
@@ -1963,50 +4458,85 @@ class AudioLoop:
             draw.line((mx - 6, my, mx + 6, my), fill=(255, 200, 0), width=2)
             draw.line((mx, my - 6, mx, my + 6), fill=(255, 200, 0), width=2)
 
-            # === Optimize for streaming ===
-            image_io = io.BytesIO()
-            img.save(image_io, format="JPEG", quality=85)
-            image_io.seek(0)
+        # === Optimize for streaming ===
+        image_io = io.BytesIO()
+        img.save(image_io, format="JPEG", quality=85)
+        image_io.seek(0)
 
-            return {
-                "mime_type": "image/jpeg",
-                "data": base64.b64encode(image_io.read()).decode(),
-            }
+        return {
+            "mime_type": "image/jpeg",
+            "data": base64.b64encode(image_io.read()).decode(),
+        }
 
     async def get_screen(self):
+        """
+        Stream the screen adaptively.
+        
+        Polls quickly while the screen is changing and backs off
+        exponentially while it is idle; unchanged frames are skipped before
+        encoding. Counters are kept in self.screen_stream_stats.
+        """
+        stats = self.screen_stream_stats
+        stats.interval = SCREEN_STREAM_MIN_INTERVAL
 
         while True:
-            frame = await asyncio.to_thread(self._get_screen)
+            frame = await asyncio.to_thread(self._get_screen, True)
+
             if frame is None:
-                break
+                stats.record_skipped()
+                stats.interval = min(stats.interval * SCREEN_STREAM_BACKOFF, SCREEN_STREAM_MAX_INTERVAL)
+            else:
+                stats.record_sent(len(frame["data"]))
+                stats.interval = SCREEN_STREAM_MIN_INTERVAL
+                self.uplink.put_video(frame)
 
-            await asyncio.sleep(2.0)
+            if stats.polls % SCREEN_STREAM_STATS_EVERY == 0:
+                logger.logger.info(f"SCREEN_STREAM: {json.dumps(stats.summary())}")
 
-            await self.out_queue.put(frame)
+            await asyncio.sleep(stats.interval)
 
     async def send_realtime(self):
+        sent = 0
         while True:
-            msg = await self.out_queue.get()
-            await self.session.send_realtime_input(media=msg)
+            msg = await self.uplink.get()
+            if msg is AUDIO_STREAM_END:
+                await self.session.send_realtime_input(audio_stream_end=True)
+            else:
+                await self.session.send_realtime_input(media=msg)
+
+            sent += 1
+            if sent % UPLINK_STATS_EVERY == 0:
+                logger.logger.info(f"UPLINK: {json.dumps(self.uplink.stats())}")
 
     async def listen_audio(self):
         mic_info = pya.get_default_input_device_info()
-        self.audio_stream = await asyncio.to_thread(
-            pya.open,
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=SEND_SAMPLE_RATE,
-            input=True,
-            input_device_index=mic_info["index"],
-            frames_per_buffer=CHUNK_SIZE,
-        )
-        if __debug__:
-            kwargs = {"exception_on_overflow": False}
-        else:
-            kwargs = {}
-        while True:
-            data = await asyncio.to_thread(self.audio_stream.read, CHUNK_SIZE, **kwargs)
-            await self.out_queue.put({"data": data, "mime_type": "audio/pcm"})
+        self.mic = MicCapture(asyncio.get_running_loop())
+        self.audio_stream = await asyncio.to_thread(self.mic.open, pya, mic_info["index"])
+
+        reported_losses = 0
+        try:
+            while True:
+                data = await self.mic.read()
+                if self.vad is None:
+                    self.uplink.put_audio({"data": data, "mime_type": "audio/pcm"})
+                else:
+                    chunks, ended = self.vad.process(data)
+                    for chunk in chunks:
+                        self.uplink.put_audio({"data": chunk, "mime_type": "audio/pcm"})
+                    if ended:
+                        self.uplink.put_control(AUDIO_STREAM_END)
+                        if self.vad.segments % VAD_STATS_EVERY == 0:
+                            logger.logger.info(f"VAD: {json.dumps(self.vad.stats())}")
+
+                # Report capture losses as they happen instead of hiding them
+                losses = self.mic.input_overflows + self.mic.ring_overruns
+                if losses != reported_losses:
+                    reported_losses = losses
+                    logger.logger.warning(f"⚠️  MIC_OVERRUN: {json.dumps(self.mic.stats())}")
+        finally:
+            self.mic.close()
+            if self.vad is not None and self.vad.bytes_in:
+                logger.logger.info(f"VAD: {json.dumps(self.vad.stats())}")
 
     async def receive_audio(self,tg: asyncio.TaskGroup,session):
         "Background task to reads from the websocket and write pcm chunks to the output queue"
@@ -2029,10 +4559,21 @@ class AudioLoop:
                 except Exception as e:
                     print(f"⚠️  Failed to create Opik trace: {e}")
             
+            interrupted = False
             try:
                 async for response in turn:
+                    server_content = response.server_content
+                    if server_content is not None and server_content.interrupted:
+                        # Barge-in: silence the speaker before anything else
+                        print(response)
+                        if not interrupted:
+                            interrupted = True
+                            self.interrupt_playback(time.perf_counter(), tg)
+                        continue
                     if data := response.data:
-                        self.audio_in_queue.put_nowait(data)
+                        # Audio generated before the interruption landed is stale
+                        if not interrupted:
+                            self.playback.write(data)
                         continue
                     elif text := response.text:
                         print(text, end="")
@@ -2058,8 +4599,6 @@ class AudioLoop:
                                 print(f"⚠️  Failed to update Opik trace: {e}")
                     elif generation_complete := response.server_content.generation_complete:
                         print(response)
-                    elif response_complete := response.server_content.interrupted:
-                        print(response)
                     elif len(response.server_content.model_turn.parts) > 0:
                         print(response)
                     
@@ -2085,26 +4624,80 @@ class AudioLoop:
                     except Exception as e:
                         print(f"⚠️  Failed to end Opik trace: {e}")
                         
-            while not self.audio_in_queue.empty():
-                self.audio_in_queue.get_nowait()
+            # Let the tail of the answer play out (an interrupted turn was
+            # already flushed when the interruption arrived)
+            if not interrupted:
+                self.playback.end_turn()
+
+    def interrupt_playback(self, received_at, tg):
+        """
+        Stop model speech as soon as the server reports an interruption.
+        
+        The jitter buffer is emptied right away (instant, no await) so the
+        output callback only produces silence from its next call. Aborting
+        and restarting the stream, which discards audio PortAudio and the
+        device had already been handed, runs as a separate task, so
+        receive_audio keeps reading the next turn's audio and tool calls
+        meanwhile.
+        
+        Args:
+            received_at: time.perf_counter() when the interrupted message arrived
+            tg: TaskGroup to run the stream abort in
+        """
+        dropped_ms = self.playback.flush()
+        flushed_at = time.perf_counter()
+        tg.create_task(self._abort_playback(received_at, flushed_at, dropped_ms))
+    
+    async def _abort_playback(self, received_at, flushed_at, dropped_ms):
+        """Abort/restart the output stream in a worker thread and record the barge-in metrics."""
+        silent_at = await asyncio.to_thread(self.playback.abort_output)
+        if silent_at is None:
+            silent_at = flushed_at
+        
+        latency_ms = (silent_at - received_at) * 1000
+        self.playback.record_interruption(latency_ms)
+        metrics = {
+            "buffer_dropped_ms": round(dropped_ms, 1),
+            "flush_ms": round((flushed_at - received_at) * 1000, 2),
+            "interrupt_to_silence_ms": round(latency_ms, 2),
+        }
+        logger.logger.info(f"⏹️  BARGE_IN: {json.dumps(metrics)}")
 
     async def play_audio(self):
-        stream = await asyncio.to_thread(
-            pya.open,
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=RECEIVE_SAMPLE_RATE,
-            output=True,
-        )
-        while True:
-            bytestream = await self.audio_in_queue.get()
-            await asyncio.to_thread(stream.write, bytestream)
+        await asyncio.to_thread(self.playback.open, pya)
+        try:
+            while True:
+                await asyncio.sleep(PLAYBACK_STATS_INTERVAL)
+                if self.playback.bytes_played:
+                    logger.logger.info(f"PLAYBACK: {json.dumps(self.playback.stats())}")
+        finally:
+            self.playback.close()
 
         
+    async def run_tool(self, name, args):
+        """
+        Execute a tool without stalling the event loop.
+        
+        Coroutine tools are awaited, tools listed in BLOCKING_TOOLS run on the
+        bounded tool_executor, and everything else is called inline.
+        """
+        func = func_names_dict[name]
+        if inspect.iscoroutinefunction(func):
+            return await func(**args)
+        if name in BLOCKING_TOOLS:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(tool_executor, partial(func, **args))
+        return func(**args)
+
     async def handle_tool_call(self, session, tool_call, trace=None):
         """
         Handle tool calls from the AI with comprehensive logging.
         
+        The batch is split into stages by plan_tool_batch: consecutive
+        side-effect-free calls run concurrently, input-device calls run one at
+        a time in the order the model issued them. Responses are sent back in
+        the original order as soon as the whole batch has resolved.
+        
         Logs:
         - All tool calls with parameters and results
         - Errors with full context
@@ -2113,153 +4706,188 @@ class AudioLoop:
         - Opik tracing for observability
         """
         print("Tool call: ", tool_call)
-        function_responses = []
+        function_calls = list(tool_call.function_calls)
+        function_responses = [None] * len(function_calls)
+        
+        for stage in plan_tool_batch([fc.name for fc in function_calls]):
+            responses = await asyncio.gather(*(
+                self.execute_function_call(function_calls[i], trace) for i in stage
+            ))
+            for i, response in zip(stage, responses):
+                function_responses[i] = response
+        
+        # Send all function responses back to the session
+        await session.send_tool_response(function_responses=function_responses)
+
+    async def execute_function_call(self, fc, trace=None):
+        """
+        Execute a single function call and build its FunctionResponse.
+        
+        Never raises: tool failures are logged and returned as an error response.
+        """
+        # Record start time for execution duration tracking
+        start_time = time.time()
+        
+        # Create an Opik span for this tool call
+        span = None
+        if trace:
+            span = trace.span(
+                name=f"Tool: {fc.name}",
+                input={"function": fc.name, "arguments": fc.args},
+                type="tool"
+            )
         
-        for fc in tool_call.function_calls:
-            # Record start time for execution duration tracking
-            start_time = time.time()
+        try:
+            # Execute the tool function (blocking tools run off the event loop)
+            result = await self.run_tool(fc.name, fc.args or {})
             
-            # Create an Opik span for this tool call
-            span = None
-            if trace:
-                span = trace.span(
-                    name=f"Tool: {fc.name}",
-                    input={"function": fc.name, "arguments": fc.args},
-                    type="tool"
+            # Calculate execution time
+            execution_time = time.time() - start_time
+            
+            # Log to Opik span
+            if span:
+                span.update(
+                    output={"result": result},
+                    metadata={
+                        "execution_time_seconds": execution_time,
+                        "success": "error" not in result if isinstance(result, dict) else True
+                    }
                 )
             
-            try:
-                # Execute the tool function
-                result = func_names_dict[fc.name](**fc.args)
-                
-                # Calculate execution time
-                execution_time = time.time() - start_time
-                
-                # Log to Opik span
-                if span:
-                    span.update(
-                        output={"result": result},
-                        metadata={
-                            "execution_time_seconds": execution_time,
-                            "success": "error" not in result if isinstance(result, dict) else True
-                        }
+            # Log the successful tool call
+            logger.log_tool_call(
+                tool_name=fc.name,
+                args=fc.args,
+                result=result
+            )
+            
+            # Special logging for specific tool types
+            
+            # Log coordinate detection with screenshot path
+            if fc.name in ["smart_detect_screen_coordinates", "smart_detect_screen_coordinates_with_retry"]:
+                screenshot_path = result.get("screenshot_dir", "unknown")
+                if "error" in result:
+                    logger.log_coordinate_detection(
+                        prompt=fc.args.get("prompt", ""),
+                        coordinates={"error": result["error"]},
+                        screenshot_path=screenshot_path
                     )
-                
-                # Log the successful tool call
-                logger.log_tool_call(
-                    tool_name=fc.name,
-                    args=fc.args,
-                    result=result
-                )
-                
-                # Special logging for specific tool types
-                
-                # Log coordinate detection with screenshot path
-                if fc.name in ["smart_detect_screen_coordinates", "smart_detect_screen_coordinates_with_retry"]:
-                    screenshot_path = result.get("screenshot_dir", "unknown")
-                    if "error" in result:
-                        logger.log_coordinate_detection(
-                            prompt=fc.args.get("prompt", ""),
-                            coordinates={"error": result["error"]},
-                            screenshot_path=screenshot_path
-                        )
-                        if span:
-                            span.update(metadata={"screenshot_path": screenshot_path, "detection_failed": True})
-                    else:
-                        logger.log_coordinate_detection(
-                            prompt=fc.args.get("prompt", ""),
-                            coordinates={"x": result.get("x"), "y": result.get("y")},
-                            screenshot_path=screenshot_path
-                        )
-                        if span:
-                            span.update(metadata={
-                                "screenshot_path": screenshot_path,
-                                "coordinates": {"x": result.get("x"), "y": result.get("y")}
-                            })
-                
-                # Log mouse movements with verification
-                elif fc.name in ["move_mouse_absolute", "move_mouse_absolute_validated"]:
-                    target = (fc.args.get("x"), fc.args.get("y"))
-                    actual = result.get("actual", target)
-                    success = result.get("success", True)
-                    
-                    logger.log_mouse_movement(
-                        target=target,
-                        actual=actual,
-                        success=success
+                    if span:
+                        span.update(metadata={"screenshot_path": screenshot_path, "detection_failed": True})
+                else:
+                    logger.log_coordinate_detection(
+                        prompt=fc.args.get("prompt", ""),
+                        coordinates={"x": result.get("x"), "y": result.get("y")},
+                        screenshot_path=screenshot_path
                     )
-                    
                     if span:
                         span.update(metadata={
-                            "target_position": target,
-                            "actual_position": actual,
-                            "movement_success": success,
-                            "error_distance": result.get("error_distance", 0)
+                            "screenshot_path": screenshot_path,
+                            "coordinates": {"x": result.get("x"), "y": result.get("y")}
                         })
-                
-                # Log execution time for performance monitoring
-                if logger.debug_mode:
-                    logger.logger.debug(
-                        f"Tool '{fc.name}' executed in {execution_time:.3f}s"
+            
+            # Log the combined detect + move + click workflow
+            elif fc.name == "locate_and_click":
+                screenshot_path = result.get("screenshot_dir", "unknown")
+                coordinates = (
+                    {"x": result["x"], "y": result["y"]} if "x" in result
+                    else {"error": result.get("error", "")}
+                )
+                logger.log_coordinate_detection(
+                    prompt=fc.args.get("prompt", ""),
+                    coordinates=coordinates,
+                    screenshot_path=screenshot_path
+                )
+                if result.get("actual") is not None:
+                    logger.log_mouse_movement(
+                        target=(result["x"], result["y"]),
+                        actual=result["actual"],
+                        success=result.get("stage") != "move"
                     )
-                
-                # End the span successfully
                 if span:
-                    span.end()
-                
-                # Create function response
-                function_responses.append(types.FunctionResponse(
-                    id=fc.id,
-                    name=fc.name,
-                    response=result,
-                ))
+                    span.update(metadata={
+                        "stage": result.get("stage"),
+                        "clicked": result.get("clicked", False),
+                        "timings": result.get("timings", {})
+                    })
+            
+            # Log mouse movements with verification
+            elif fc.name in ["move_mouse_absolute", "move_mouse_absolute_validated"]:
+                target = (fc.args.get("x"), fc.args.get("y"))
+                actual = result.get("actual", target)
+                success = result.get("success", True)
                 
-            except Exception as e:
-                # Calculate execution time even for failures
-                execution_time = time.time() - start_time
+                logger.log_mouse_movement(
+                    target=target,
+                    actual=actual,
+                    success=success
+                )
                 
-                # Log to Opik span
                 if span:
-                    span.update(
-                        output={"error": str(e)},
-                        metadata={
-                            "execution_time_seconds": execution_time,
-                            "error_type": type(e).__name__,
-                            "success": False
-                        }
-                    )
-                    span.end()
-                
-                # Log the error with full context
-                logger.log_error(
-                    error_type=f"tool_execution_failed_{fc.name}",
-                    error_message=str(e),
-                    context={
-                        "tool_name": fc.name,
-                        "arguments": fc.args,
-                        "execution_time": execution_time,
+                    span.update(metadata={
+                        "target_position": target,
+                        "actual_position": actual,
+                        "movement_success": success,
+                        "error_distance": result.get("error_distance", 0)
+                    })
+            
+            # Log execution time for performance monitoring
+            if logger.debug_mode:
+                logger.logger.debug(
+                    f"Tool '{fc.name}' executed in {execution_time:.3f}s"
+                )
+            
+            # End the span successfully
+            if span:
+                span.end()
+            
+            # Create function response
+            return types.FunctionResponse(
+                id=fc.id,
+                name=fc.name,
+                response=result,
+            )
+            
+        except Exception as e:
+            # Calculate execution time even for failures
+            execution_time = time.time() - start_time
+            
+            # Log to Opik span
+            if span:
+                span.update(
+                    output={"error": str(e)},
+                    metadata={
+                        "execution_time_seconds": execution_time,
                         "error_type": type(e).__name__,
-                        "traceback": traceback.format_exc()
+                        "success": False
                     }
                 )
-                
-                # Print error to console for immediate visibility
-                print(f"❌ Tool {fc.name} failed: {e}")
-                
-                # Create error response
-                error_result = {"error": str(e)}
-                function_responses.append(types.FunctionResponse(
-                    id=fc.id,
-                    name=fc.name,
-                    response=error_result,
-                ))
-        
-        # Send all function responses back to the session
-        await session.send_tool_response(function_responses=function_responses)
-        
-        # Small delay to prevent race conditions
-        await asyncio.sleep(0.05)
-        # await session.send_client_event(event_type="turn_complete")
+                span.end()
+            
+            # Log the error with full context
+            logger.log_error(
+                error_type=f"tool_execution_failed_{fc.name}",
+                error_message=str(e),
+                context={
+                    "tool_name": fc.name,
+                    "arguments": fc.args,
+                    "execution_time": execution_time,
+                    "error_type": type(e).__name__,
+                    "traceback": traceback.format_exc()
+                }
+            )
+            
+            # Print error to console for immediate visibility
+            print(f"❌ Tool {fc.name} failed: {e}")
+            
+            # Create error response
+            error_result = {"error": str(e)}
+            return types.FunctionResponse(
+                id=fc.id,
+                name=fc.name,
+                response=error_result,
+            )
+
     async def run(self):
         try:
             async with (
@@ -2268,8 +4896,8 @@ class AudioLoop:
             ):
                 self.session = session
 
-                self.audio_in_queue = asyncio.Queue()
-                self.out_queue = asyncio.Queue(maxsize=5)
+                self.playback = PlaybackEngine()
+                self.uplink = UplinkScheduler()
 
                 send_text_task = tg.create_task(self.send_text())
                 tg.create_task(self.send_realtime())
@@ -2288,7 +4916,8 @@ class AudioLoop:
         except asyncio.CancelledError:
             pass
         except ExceptionGroup as EG:
-            self.audio_stream.close()
+            if self.mic is not None:
+                self.mic.close()
             traceback.print_exception(EG)
 
 
@@ -2301,6 +4930,24 @@ if __name__ == "__main__":
         help="pixels to stream from",
         choices=["camera", "screen", "none"],
     )
+    parser.add_argument(
+        "--save-screenshots",
+        action="store_true",
+        help="write detection/quiz screenshots to disk for debugging",
+    )
+    parser.add_argument(
+        "--vad",
+        action="store_true",
+        default=VAD_ENABLED,
+        help="only send mic audio while speech is detected",
+    )
     args = parser.parse_args()
-    main = AudioLoop(video_mode=args.mode)
-    asyncio.run(main.run())
\ No newline at end of file
+    if args.save_screenshots:
+        debug_sink.enabled = True
+    main = AudioLoop(video_mode=args.mode, vad=args.vad)
+    try:
+        asyncio.run(main.run())
+    finally:
+        tool_executor.shutdown(wait=False, cancel_futures=True)
+        hedge_executor.shutdown(wait=False, cancel_futures=True)
+        screen_capture.close()
\ No newline at end of file